@@ -0,0 +1,145 @@
+"""
+Controle adaptativo de lote e backpressure do consumidor.
+
+Observa a latência ponta a ponta das mensagens (poll -> persistido), a
+saturação do pool do banco (DATABASE_POOL_SIZE + DATABASE_MAX_OVERFLOW) e
+o RSS do processo. Com isso:
+
+- ajusta o max_records do poll (AIMD: cresce devagar, cai pela metade);
+- pausa as partições quando o banco/memória saturam e retoma com histerese.
+
+Quando o TimescaleDB fica lento (compressão, refresh de CAGG), o worker
+recua suavemente em vez de estourar sessões e provocar rebalance: com as
+partições pausadas o poll continua (heartbeat/max.poll.interval em dia),
+só que sem trazer mensagens novas.
+"""
+import os
+import resource
+from typing import Optional
+
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger(__name__)
+
+ACTION_PAUSE = "pause"
+ACTION_RESUME = "resume"
+
+
+def current_rss_bytes() -> int:
+    """RSS atual do processo (Linux via /proc; fallback para o pico do getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss em KB no Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def pool_saturation() -> float:
+    """Fração das conexões do pool (size + overflow) em uso."""
+    from app.core.database import engine
+
+    capacity = settings.DATABASE_POOL_SIZE + settings.DATABASE_MAX_OVERFLOW
+    if capacity <= 0:
+        return 0.0
+    try:
+        return engine.pool.checkedout() / capacity
+    except AttributeError:
+        return 0.0
+
+
+class BackpressureController:
+    """Ajusta o tamanho do poll e decide pausar/retomar partições."""
+
+    def __init__(
+        self,
+        min_records: Optional[int] = None,
+        max_records: Optional[int] = None,
+        target_latency_ms: Optional[int] = None,
+    ):
+        self.max_records = max(1, max_records or settings.KAFKA_BATCH_SIZE)
+        self.min_records = max(1, min(min_records or settings.BACKPRESSURE_MIN_POLL_RECORDS, self.max_records))
+        self.target_latency = (target_latency_ms or settings.BACKPRESSURE_TARGET_LATENCY_MS) / 1000
+        self.poll_records = self.max_records
+        self.latency_ewma: Optional[float] = None
+        self.paused = False
+        self._alpha = 0.2
+        self._observed = False
+
+    def observe_latency(self, seconds: float) -> None:
+        """Registra a latência ponta a ponta de uma mensagem concluída."""
+        if self.latency_ewma is None:
+            self.latency_ewma = seconds
+        else:
+            self.latency_ewma = self._alpha * seconds + (1 - self._alpha) * self.latency_ewma
+        self._observed = True
+
+    def evaluate(self) -> Optional[str]:
+        """
+        Reavalia o tamanho do poll e o estado de pausa.
+
+        Returns:
+            'pause', 'resume' ou None (sem mudança de estado)
+        """
+        if not self._observed and self.latency_ewma:
+            # Nada concluiu desde a última avaliação (ex.: pausado): a latência
+            # antiga não reflete mais o banco, deixa ela decair
+            self.latency_ewma *= 0.5
+        self._observed = False
+
+        saturation = pool_saturation()
+        rss_mb = current_rss_bytes() / (1024 * 1024)
+        max_rss = settings.BACKPRESSURE_MAX_RSS_MB
+        latency = self.latency_ewma or 0.0
+
+        overloaded = (
+            saturation >= settings.BACKPRESSURE_POOL_HIGH
+            or (max_rss and rss_mb >= max_rss)
+            or latency >= self.target_latency * settings.BACKPRESSURE_PAUSE_FACTOR
+        )
+        relieved = (
+            saturation <= settings.BACKPRESSURE_POOL_LOW
+            and (not max_rss or rss_mb <= max_rss * 0.9)
+            and latency <= self.target_latency
+        )
+
+        previous = self.poll_records
+        if overloaded or latency > self.target_latency:
+            # Multiplicative decrease
+            self.poll_records = max(self.min_records, self.poll_records // 2)
+        elif latency < self.target_latency * 0.5 and saturation < settings.BACKPRESSURE_POOL_LOW:
+            # Additive increase (~10% do máximo por ciclo)
+            step = max(1, self.max_records // 10)
+            self.poll_records = min(self.max_records, self.poll_records + step)
+
+        if self.poll_records != previous:
+            logger.info(
+                "Tamanho do poll ajustado",
+                poll_records=self.poll_records,
+                latency_ms=int(latency * 1000),
+                pool_saturation=round(saturation, 2),
+                rss_mb=int(rss_mb),
+            )
+
+        if overloaded and not self.paused:
+            self.paused = True
+            logger.warn(
+                "Backpressure: pausando partições",
+                latency_ms=int(latency * 1000),
+                pool_saturation=round(saturation, 2),
+                rss_mb=int(rss_mb),
+            )
+            return ACTION_PAUSE
+        if self.paused and relieved:
+            self.paused = False
+            logger.info(
+                "Backpressure: retomando partições",
+                latency_ms=int(latency * 1000),
+                pool_saturation=round(saturation, 2),
+                rss_mb=int(rss_mb),
+            )
+            return ACTION_RESUME
+        return None
@@ -0,0 +1,88 @@
+"""
+Detecção de uploads duplicados (idempotência por conteúdo).
+
+O cliente HA (EasySmartClient.sync_queue) reenvia a fila inteira quando a
+resposta estoura o timeout, mesmo que o gateway já tenha aceitado o envio;
+entre uma tentativa e outra a fila ainda pode ganhar itens novos. Por isso
+o digest é calculado por item (snapshot de um equipamento), não pelo
+arquivo: itens já persistidos são descartados e os novos seguem.
+
+Os digests ficam em telemetry_upload_dedup (16 bytes por item, chave
+tenant + digest) e expiram após DEDUP_TTL_HOURS.
+"""
+import hashlib
+import json
+import time
+from typing import Any, Dict, Iterable, List, Set
+
+from sqlalchemy import text
+
+from app.core.config import settings
+
+_last_expire = 0.0
+
+
+def _canonical(item: Dict[str, Any]) -> bytes:
+    # Usar orjson se disponível (mais rápido)
+    try:
+        import orjson
+        return orjson.dumps(item, option=orjson.OPT_SORT_KEYS)
+    except ImportError:
+        return json.dumps(item, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def item_digests(
+    items: List[Dict[str, Any]],
+    organization_id: int,
+    workspace_id: int,
+) -> List[bytes]:
+    """Digest (BLAKE2b, 16 bytes) de cada item, no escopo org/workspace."""
+    scope = f"{organization_id}:{workspace_id}:".encode()
+    return [
+        hashlib.blake2b(scope + _canonical(item), digest_size=16).digest()
+        for item in items
+    ]
+
+
+async def find_seen(db, tenant_id: int, digests: Iterable[bytes]) -> Set[bytes]:
+    """Retorna os digests que já foram persistidos para o tenant."""
+    digests = list(digests)
+    if not digests:
+        return set()
+    result = await db.execute(text("""
+        SELECT digest FROM telemetry_upload_dedup
+        WHERE tenant_id = :tenant_id AND digest = ANY(:digests)
+    """), {"tenant_id": tenant_id, "digests": digests})
+    return {bytes(row[0]) for row in result.fetchall()}
+
+
+async def remember(db, tenant_id: int, digests: Iterable[bytes]) -> None:
+    """Registra digests persistidos (não faz commit)."""
+    digests = list(set(digests))
+    if not digests:
+        return
+    await db.execute(text("""
+        INSERT INTO telemetry_upload_dedup (tenant_id, digest)
+        SELECT :tenant_id, d FROM unnest(CAST(:digests AS BYTEA[])) AS d
+        ON CONFLICT (tenant_id, digest) DO NOTHING
+    """), {"tenant_id": tenant_id, "digests": digests})
+
+
+async def expire_if_due(db) -> int:
+    """
+    Remove digests mais antigos que DEDUP_TTL_HOURS (no máximo a cada 10 min).
+
+    Returns:
+        Quantidade de digests removidos
+    """
+    global _last_expire
+    now = time.monotonic()
+    if now - _last_expire < 600:
+        return 0
+    _last_expire = now
+    result = await db.execute(text("""
+        DELETE FROM telemetry_upload_dedup
+        WHERE created_at < NOW() - make_interval(hours => :ttl)
+    """), {"ttl": settings.DEDUP_TTL_HOURS})
+    await db.commit()
+    return result.rowcount or 0
@@ -8,12 +8,23 @@ import json
 import logging
 import signal
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
-from kafka import KafkaConsumer
+from kafka import KafkaConsumer, ConsumerRebalanceListener
 from kafka.errors import KafkaError
 
+from app.consumers import dedup, retry_store
+from app.consumers.backpressure import BackpressureController, ACTION_PAUSE, ACTION_RESUME
+from app.consumers.micro_batcher import MicroBatcher
+from app.consumers.offset_tracker import OffsetTracker
+from app.consumers.pipeline import StagedPipeline
+from app.processors import late_data
+from app.processors.entity_cache import entity_cache, run_invalidation_listener
+from app.processors.late_data import late_data_tracker
 from app.processors.telemetry_processor import TelemetryProcessor
 from app.storage.storage_client import storage_client
+from app.storage.deleter import DeferredDeleter
 from app.core.database import AsyncSessionLocal
 from app.core.config import settings
 from app.core.logging import setup_logging, get_logger
@@ -23,6 +34,28 @@ setup_logging()
 logger = get_logger(__name__)
 
 
+class _CommitOnRevokeListener(ConsumerRebalanceListener):
+    """Commita o progresso das partições revogadas antes do rebalance."""
+    
+    def __init__(self, owner: "TelemetryKafkaConsumer"):
+        self.owner = owner
+    
+    def on_partitions_revoked(self, revoked):
+        # Roda dentro do poll (thread de poll): pode usar o consumidor direto
+        tracker = self.owner.offset_tracker
+        offsets = tracker.committable(revoked)
+        if offsets and not settings.KAFKA_AUTO_COMMIT:
+            try:
+                self.owner.consumer.commit(offsets)
+            except Exception as e:
+                logger.warn("Erro ao commitar offsets no rebalance", error=str(e))
+        tracker.forget(revoked)
+        logger.info("Partições revogadas", partitions=[tp.partition for tp in revoked])
+    
+    def on_partitions_assigned(self, assigned):
+        logger.info("Partições atribuídas", partitions=[tp.partition for tp in assigned])
+
+
 class TelemetryKafkaConsumer:
     """Consumidor Kafka para dados de telemetria."""
     
@@ -31,6 +64,32 @@ class TelemetryKafkaConsumer:
         self.consumer = None
         self.processor = TelemetryProcessor()
         self.running = False
+        # KafkaConsumer não é thread-safe: poll, commit e close passam todos
+        # pela mesma thread dedicada quando KAFKA_ASYNC_POLL está ativo.
+        self._poll_executor = None
+        self._batch_queue = None
+        self._poll_task = None
+        self.offset_tracker = OffsetTracker()
+        self._commit_task = None
+        self._commit_wakeup = None
+        self._retry_task = None
+        self._pipeline = None
+        self.backpressure = BackpressureController() if settings.BACKPRESSURE_ENABLED else None
+        self._backpressure_task = None
+        self._micro_batcher = None
+        self._cache_listener_task = None
+        self._deleter = None
+        self._late_data_task = None
+        # Contadores acumulados (lidos pelo supervisor multi-processo)
+        self.stats = {
+            'batches': 0,
+            'messages': 0,
+            'failed': 0,
+            'items': 0,
+            'inserted': 0,
+            'duplicates': 0,
+            'duplicate_readings': 0,
+        }
         self._setup_consumer()
         logger.info(
             f"Consumidor Kafka inicializado. Tópico: {settings.KAFKA_TOPIC}, "
@@ -42,7 +101,6 @@ class TelemetryKafkaConsumer:
         brokers = settings.KAFKA_BROKERS.split(',')
         
         self.consumer = KafkaConsumer(
-            settings.KAFKA_TOPIC,
             bootstrap_servers=brokers,
             group_id=settings.KAFKA_GROUP_ID,
             value_deserializer=lambda m: json.loads(m.decode('utf-8')),
@@ -54,6 +112,10 @@ class TelemetryKafkaConsumer:
             session_timeout_ms=30000,
             heartbeat_interval_ms=10000,
         )
+        self.consumer.subscribe(
+            [settings.KAFKA_TOPIC],
+            listener=_CommitOnRevokeListener(self),
+        )
     
     async def consume(self):
         """
@@ -62,15 +124,67 @@ class TelemetryKafkaConsumer:
         Processa mensagens em lotes para melhor performance.
         """
         self.running = True
-        logger.info("Iniciando consumo de telemetria do Kafka...")
+        logger.info(
+            "Iniciando consumo de telemetria do Kafka...",
+            async_poll=settings.KAFKA_ASYNC_POLL,
+        )
         
         try:
+            if settings.KAFKA_ASYNC_POLL:
+                self._poll_executor = ThreadPoolExecutor(
+                    max_workers=1,
+                    thread_name_prefix="kafka-poll",
+                )
+                self._batch_queue = asyncio.Queue(
+                    maxsize=max(1, settings.KAFKA_PREFETCH_BATCHES)
+                )
+                self._poll_task = asyncio.create_task(self._poll_loop())
+            
+            self._commit_wakeup = asyncio.Event()
+            self._commit_task = asyncio.create_task(self._commit_loop())
+            
+            if settings.RETRY_ENABLED:
+                self._retry_task = asyncio.create_task(self._retry_loop())
+            
+            if settings.ENTITY_CACHE_ENABLED:
+                self._cache_listener_task = asyncio.create_task(
+                    run_invalidation_listener(entity_cache)
+                )
+            
+            if settings.LATE_DATA_REFRESH_ENABLED:
+                self._late_data_task = asyncio.create_task(
+                    late_data.run_refresh_loop(late_data_tracker)
+                )
+            
+            if settings.DELETE_FILE_AFTER_PROCESSING and settings.STORAGE_DELETE_BATCH_ENABLED:
+                self._deleter = DeferredDeleter(storage_client)
+                self._deleter.start()
+            
+            if self.backpressure is not None:
+                self._backpressure_task = asyncio.create_task(self._backpressure_loop())
+            
+            if settings.MICRO_BATCH_ENABLED:
+                self._micro_batcher = MicroBatcher(
+                    self._persist_micro_batch,
+                    max_items=settings.MICRO_BATCH_MAX_ITEMS,
+                    max_wait_ms=settings.MICRO_BATCH_MAX_WAIT_MS,
+                )
+                self._micro_batcher.start()
+            
+            if settings.WORKER_PIPELINE_ENABLED:
+                self._pipeline = StagedPipeline(
+                    [self._fetch_stage, self._decode_stage, self._persist_stage],
+                    on_error=self._on_message_error,
+                    queue_size=settings.WORKER_PIPELINE_QUEUE_SIZE,
+                )
+                self._pipeline.start()
+            
             while self.running:
-                # Buscar lote de mensagens (síncrono, mas não bloqueia muito)
-                message_batch = self.consumer.poll(timeout_ms=1000)
+                message_batch = await self._next_batch()
                 
                 if not message_batch:
-                    await asyncio.sleep(0.1)
+                    if not settings.KAFKA_ASYNC_POLL:
+                        await asyncio.sleep(0.1)
                     continue
                 
                 # Processar lote
@@ -81,150 +195,941 @@ class TelemetryKafkaConsumer:
         except Exception as e:
             logger.error(f"Erro no consumidor Kafka: {e}", exc_info=True)
         finally:
-            self._cleanup()
+            await self._cleanup()
+    
+    async def _call_consumer(self, fn, *args, **kwargs):
+        """
+        Executa uma chamada do KafkaConsumer.
+        
+        No modo assíncrono a chamada roda na thread de poll (única dona do
+        consumidor); no modo legado roda direto no event loop.
+        """
+        if self._poll_executor is None:
+            return fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._poll_executor,
+            lambda: fn(*args, **kwargs),
+        )
+    
+    async def _poll_loop(self):
+        """Busca lotes na thread de poll e os entrega na fila asyncio."""
+        try:
+            while self.running:
+                try:
+                    message_batch = await self._call_consumer(self._poll_and_track)
+                except KafkaError as e:
+                    logger.error("Erro no poll do Kafka", error=str(e))
+                    await asyncio.sleep(1)
+                    continue
+                
+                if message_batch:
+                    # Fila limitada: segura o poll enquanto o processamento não acompanha
+                    await self._batch_queue.put(message_batch)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Erro na thread de poll do Kafka: {e}", exc_info=True)
+            self.running = False
+    
+    def _poll_and_track(self) -> Dict:
+        """
+        Faz o poll e registra os offsets recebidos.
+        
+        Roda na mesma thread que o rebalance listener, então uma partição
+        revogada nunca volta a ser registrada por um lote antigo.
+        
+        Returns:
+            Dicionário de partição -> (geração da atribuição, mensagens)
+        """
+        max_records = self.backpressure.poll_records if self.backpressure else None
+        message_batch = self.consumer.poll(
+            timeout_ms=settings.KAFKA_POLL_TIMEOUT_MS,
+            max_records=max_records,
+        )
+        tracked = {}
+        for topic_partition, messages in message_batch.items():
+            generation = None
+            for message in messages:
+                generation = self.offset_tracker.track(topic_partition, message.offset)
+            tracked[topic_partition] = (generation, messages)
+        return tracked
+    
+    async def _next_batch(self) -> Dict:
+        """Retorna o próximo lote de mensagens (ou vazio se não houver)."""
+        if self._batch_queue is None:
+            return self._poll_and_track()
+        
+        try:
+            return await asyncio.wait_for(
+                self._batch_queue.get(),
+                timeout=settings.KAFKA_POLL_TIMEOUT_MS / 1000,
+            )
+        except asyncio.TimeoutError:
+            return {}
     
     async def _process_batch(self, message_batch: Dict):
         """
         Processa um lote de mensagens.
         
         Args:
-            message_batch: Dicionário de partição -> lista de mensagens
+            message_batch: Dicionário de partição -> (geração, mensagens)
         """
         all_messages = []
-        partitions_to_commit = []
+        received_at = time.monotonic()
         
         # Coletar todas as mensagens do lote
-        for topic_partition, messages in message_batch.items():
+        for topic_partition, (generation, messages) in message_batch.items():
+            if self.offset_tracker.generation(topic_partition) != generation:
+                # Partição revogada (ou reatribuída) enquanto o lote aguardava na fila
+                logger.info(
+                    "Descartando mensagens de partição revogada",
+                    partition=topic_partition.partition,
+                    count=len(messages),
+                )
+                continue
             for message in messages:
                 all_messages.append({
                     'key': message.key,
                     'value': message.value,
+                    'topic': topic_partition.topic,
+                    'topic_partition': topic_partition,
+                    'generation': generation,
                     'partition': topic_partition.partition,
                     'offset': message.offset,
+                    'received_at': received_at,
                 })
-            partitions_to_commit.append(topic_partition)
         
         if not all_messages:
             return
         
-        logger.info(f"Processando lote de {len(all_messages)} mensagens")
+        self.stats['batches'] += 1
+        logger.info(
+            f"Processando lote de {len(all_messages)} mensagens",
+            concurrency=settings.WORKER_CONCURRENCY,
+            pipeline=settings.WORKER_PIPELINE_ENABLED,
+        )
         
         try:
-            # Processar cada mensagem (Claim Check Pattern)
-            for msg in all_messages:
-                user_id = msg['key'] or 'unknown'
-                message_data = msg['value']
-                
+            if self._pipeline is not None:
+                # Não espera o lote terminar: a fila limitada do primeiro estágio
+                # segura o consumo e os offsets são marcados pelo estágio persist.
+                for msg in all_messages:
+                    await self._pipeline.submit(self._parse_message(msg))
+            elif settings.WORKER_CONCURRENCY > 1:
+                await self._process_concurrently(all_messages)
+            else:
+                # Processar cada mensagem (Claim Check Pattern)
+                for msg in all_messages:
+                    await self._process_message(msg)
+            
+        except Exception as e:
+            logger.error(f"Erro ao processar lote: {e}", exc_info=True)
+            # Mensagens com erro já foram para a fila de retry/DLQ em _process_message;
+            # o que não foi concluído aqui é reentregue após restart/rebalance.
+    
+    def _mark_done(self, ctx: Dict[str, Any]):
+        """Marca a mensagem como concluída; o commit é feito pelo _commit_loop."""
+        self.offset_tracker.mark_done(
+            ctx['topic_partition'], ctx['offset'], ctx.get('generation'),
+        )
+        if self.backpressure is not None:
+            self.backpressure.observe_latency(time.monotonic() - ctx['received_at'])
+        if (
+            self._commit_wakeup is not None
+            and self.offset_tracker.done_since_commit >= settings.KAFKA_COMMIT_EVERY
+        ):
+            self._commit_wakeup.set()
+    
+    async def _commit_loop(self):
+        """Commita offsets concluídos a cada intervalo ou limite de mensagens."""
+        interval = settings.KAFKA_COMMIT_INTERVAL_MS / 1000
+        try:
+            while self.running:
+                try:
+                    await asyncio.wait_for(self._commit_wakeup.wait(), timeout=interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._commit_wakeup.clear()
+                await self._commit_offsets()
+        except asyncio.CancelledError:
+            pass
+    
+    async def _backpressure_loop(self):
+        """Reavalia periodicamente o tamanho do poll e pausa/retoma partições."""
+        try:
+            while self.running:
+                await asyncio.sleep(settings.BACKPRESSURE_INTERVAL_SECONDS)
+                action = self.backpressure.evaluate()
                 try:
-                    # Verificar se é Claim Check (novo formato) ou payload completo (compatibilidade)
-                    is_claim_check = (
-                        isinstance(message_data, dict) and 
-                        'claim_check' in message_data
-                    )
-                    tenant_id = None
-                    
-                    if is_claim_check:
-                        # CLAIM CHECK PATTERN: Baixar arquivo do storage
-                        claim_check = message_data['claim_check']
-                        storage_type = message_data.get('storage_type', 'minio')
-                        metadata = message_data.get('metadata') or {}
-                        tenant_id = metadata.get('tenantId') or message_data.get('tenant_id')
-                        organization_id = metadata.get('organizationId') or message_data.get('organization_id')
-                        workspace_id = metadata.get('workspaceId') or message_data.get('workspace_id')
-                        items_count = metadata.get('itemsCount') or 0
-                        sensors_count = metadata.get('totalSensors') or 0
-                        bytes_ingested = metadata.get('fileSize') or message_data.get('file_size') or 0
-                        
-                        logger.info(
-                            "Processando Claim Check",
-                            claim_check=claim_check,
-                            user_id=user_id,
-                            tenant_id=tenant_id,
-                            file_size=message_data.get('file_size', 0),
+                    if action == ACTION_PAUSE or (action is None and self.backpressure.paused):
+                        # Repete enquanto pausado: partições novas de um rebalance
+                        # chegam despausadas
+                        await self._call_consumer(
+                            lambda: self.consumer.pause(*self.consumer.assignment())
+                        )
+                    elif action == ACTION_RESUME:
+                        await self._call_consumer(
+                            lambda: self.consumer.resume(*self.consumer.paused())
                         )
-                        
-                        # Baixar arquivo do storage
-                        telemetry_data = await storage_client.download_file(claim_check)
-                        
-                        # Garantir que é array
-                        if not isinstance(telemetry_data, list):
-                            telemetry_data = [telemetry_data]
-                        
-                    else:
-                        # Formato antigo (compatibilidade): payload completo
-                        logger.warn("Recebido payload completo (formato antigo). Migre para Claim Check Pattern.")
-                        
-                        if isinstance(message_data, dict) and 'data' in message_data:
-                            telemetry_data = message_data['data']
-                        else:
-                            telemetry_data = [message_data] if not isinstance(message_data, list) else message_data
-                    
-                    # Processar telemetria
-                    async with AsyncSessionLocal() as db:
-                        result = await self.processor.process_bulk(
-                            int(tenant_id) if tenant_id and str(tenant_id).isdigit() else 0,
-                            int(organization_id) if organization_id and str(organization_id).isdigit() else 0,
-                            int(workspace_id) if workspace_id and str(workspace_id).isdigit() else 0,
-                            telemetry_data,
+                except Exception as e:
+                    logger.warn("Erro ao pausar/retomar partições", error=str(e))
+        except asyncio.CancelledError:
+            pass
+    
+    async def _commit_offsets(self):
+        """Commita o maior offset contíguo concluído de cada partição."""
+        offsets = self.offset_tracker.committable()
+        if not offsets or settings.KAFKA_AUTO_COMMIT:
+            # Com auto commit o Kafka cuida do commit; aqui só drena o tracker
+            return
+        
+        try:
+            await self._call_consumer(self.consumer.commit, offsets)
+            logger.debug(
+                f"Offset commitado para {len(offsets)} partições",
+                offsets={tp.partition: meta.offset for tp, meta in offsets.items()},
+                pending=self.offset_tracker.pending_count,
+            )
+        except Exception as e:
+            # Offsets não commitados serão reentregues após restart/rebalance
+            logger.warn("Erro ao commitar offsets", error=str(e))
+    
+    async def _process_concurrently(self, all_messages: List[Dict[str, Any]]):
+        """
+        Processa mensagens em paralelo, limitado por WORKER_CONCURRENCY.
+        
+        Mensagens da mesma partição (ou da mesma chave dentro da partição,
+        conforme WORKER_ORDERING) formam uma fila processada em ordem; filas
+        diferentes avançam em paralelo, cada mensagem com sua própria sessão.
+        """
+        lanes: Dict[tuple, List[Dict[str, Any]]] = {}
+        for msg in all_messages:
+            if settings.WORKER_ORDERING == 'partition':
+                lane_key = (msg['partition'],)
+            else:
+                lane_key = (msg['partition'], msg['key'])
+            lanes.setdefault(lane_key, []).append(msg)
+        
+        semaphore = asyncio.Semaphore(settings.WORKER_CONCURRENCY)
+        
+        async def run_lane(lane_messages: List[Dict[str, Any]]):
+            for msg in lane_messages:
+                async with semaphore:
+                    await self._process_message(msg)
+        
+        await asyncio.gather(*(run_lane(lane) for lane in lanes.values()))
+    
+    async def _process_message(self, msg: Dict[str, Any]) -> bool:
+        """
+        Processa uma mensagem: carrega a telemetria, persiste e remove o arquivo.
+        
+        Returns:
+            True se a mensagem foi processada com sucesso
+        """
+        ctx = self._parse_message(msg)
+        
+        try:
+            if self._use_streaming(ctx):
+                await self._stream_message(ctx)
+                await self._finalize_message(ctx)
+                self._mark_done(ctx)
+                return True
+            telemetry_data = await self._load_telemetry(ctx)
+            await self._complete_message(ctx, telemetry_data)
+            return True
+        
+        except Exception as e:
+            await self._on_message_error(ctx, e)
+            return False
+    
+    async def _on_message_error(self, ctx: Dict[str, Any], exc: Exception):
+        """Registra o erro da mensagem e a encaminha para retry/DLQ."""
+        self.stats['failed'] += 1
+        logger.error(
+            "Erro ao processar mensagem",
+            user_id=ctx['user_id'],
+            partition=ctx['partition'],
+            offset=ctx['offset'],
+            error=str(exc),
+            exc_info=True,
+        )
+        await self._handle_failure(ctx, exc)
+    
+    async def _fetch_stage(self, ctx: Dict[str, Any]):
+        """Estágio 1 do pipeline: baixa o claim check (comprimido)."""
+        if self._use_streaming(ctx):
+            # Arquivo grande: lido em blocos direto no estágio de persistência
+            return
+        if ctx['is_claim_check']:
+            logger.info(
+                "Processando Claim Check",
+                claim_check=ctx['claim_check'],
+                user_id=ctx['user_id'],
+                tenant_id=ctx['tenant_id'],
+                file_size=ctx['file_size'],
+            )
+            cached, ctx['etag'] = await storage_client.lookup_cache(ctx['claim_check'])
+            if cached is not None:
+                ctx['telemetry_data'] = cached
+                return
+            ctx['compressed'], ctx['etag'] = await storage_client.fetch_file(
+                ctx['claim_check'],
+                ctx['file_size'],
+            )
+    
+    async def _decode_stage(self, ctx: Dict[str, Any]):
+        """Estágio 2 do pipeline: gzip/JSON em thread, fora do event loop."""
+        if self._use_streaming(ctx) or 'telemetry_data' in ctx:
+            # Streaming ou já lido do cache local no estágio 1
+            return
+        if ctx['is_claim_check']:
+            compressed = ctx.pop('compressed')
+            telemetry_data = await asyncio.to_thread(
+                storage_client.decode_payload,
+                compressed,
+                ctx['claim_check'],
+                ctx.pop('etag', None),
+            )
+            if not isinstance(telemetry_data, list):
+                telemetry_data = [telemetry_data]
+            ctx['telemetry_data'] = telemetry_data
+        else:
+            ctx['telemetry_data'] = await self._load_telemetry(ctx)
+    
+    async def _persist_stage(self, ctx: Dict[str, Any]):
+        """Estágio 3 do pipeline: grava no banco, remove o arquivo e marca o offset."""
+        if self._use_streaming(ctx):
+            await self._stream_message(ctx)
+            await self._finalize_message(ctx)
+            self._mark_done(ctx)
+            return
+        await self._complete_message(ctx, ctx.pop('telemetry_data'))
+    
+    async def _complete_message(self, ctx: Dict[str, Any], telemetry_data: List[Dict[str, Any]]):
+        """
+        Persiste a telemetria de uma mensagem do fluxo principal.
+        
+        Com micro-batching a mensagem entra no buffer do seu escopo e o
+        offset só é marcado quando o grupo for persistido.
+        """
+        telemetry_data = await self._drop_duplicates(ctx, telemetry_data)
+        if not telemetry_data:
+            # Reenvio de algo já persistido: só conclui a mensagem
+            await self._finalize_message(ctx)
+            self._mark_done(ctx)
+            return
+        
+        if self._micro_batcher is not None:
+            scope = (ctx['tenant_id'], ctx['organization_id'], ctx['workspace_id'])
+            await self._micro_batcher.add(scope, ctx, telemetry_data)
+            return
+        
+        await self._persist_telemetry(ctx, telemetry_data)
+        await self._finalize_message(ctx)
+        self._mark_done(ctx)
+    
+    async def _persist_micro_batch(self, scope: tuple, entries: List[tuple]):
+        """
+        Persiste em uma única passada a telemetria de várias mensagens do mesmo escopo.
+        
+        Se o grupo falhar, cada mensagem é persistida individualmente para
+        que só as problemáticas sigam para retry/DLQ.
+        """
+        tenant_id, organization_id, workspace_id = scope
+        merged = [item for _, telemetry_data in entries for item in telemetry_data]
+        
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await self.processor.process_bulk(
+                    tenant_id,
+                    organization_id,
+                    workspace_id,
+                    merged,
+                    db,
+                )
+                await self._remember_digests(
+                    db,
+                    tenant_id,
+                    [
+                        digest
+                        for ctx, telemetry_data in entries
+                        for digest in self._written_digests(ctx, telemetry_data, result)
+                    ],
+                )
+                
+                if settings.BILLING_USAGE_ENABLED and tenant_id:
+                    try:
+                        await self._record_usage(
                             db,
+                            tenant_id,
+                            organization_id,
+                            workspace_id,
+                            sum(ctx['items_count'] for ctx, _ in entries),
+                            sum(ctx['sensors_count'] for ctx, _ in entries),
+                            sum(ctx['bytes_ingested'] for ctx, _ in entries),
                         )
+                    except Exception as e:
+                        # Telemetria já gravada: não reprocessar por causa do billing
+                        logger.error("Erro ao registrar uso do micro-batch", error=str(e))
+        except Exception as e:
+            logger.warn(
+                "Falha no micro-batch, persistindo mensagens individualmente",
+                tenant_id=tenant_id,
+                messages=len(entries),
+                error=str(e),
+            )
+            for ctx, telemetry_data in entries:
+                try:
+                    await self._persist_telemetry(ctx, telemetry_data)
+                    await self._finalize_message(ctx)
+                    self._mark_done(ctx)
+                except Exception as exc:
+                    await self._on_message_error(ctx, exc)
+            return
+        
+        self.stats['messages'] += len(entries)
+        self.stats['items'] += result['processed']
+        self.stats['inserted'] += result.get('inserted', 0)
+        self.stats['duplicate_readings'] += result.get('duplicate_readings', 0)
+        logger.info(
+            "Micro-batch de telemetria processado",
+            tenant_id=tenant_id,
+            organization_id=organization_id,
+            workspace_id=workspace_id,
+            messages=len(entries),
+            processed=result['processed'],
+            inserted=result.get('inserted', 0),
+            errors=len(result.get('errors') or []),
+        )
+        
+        for ctx, _ in entries:
+            await self._finalize_message(ctx)
+            self._mark_done(ctx)
+    
+    async def _run_message(self, ctx: Dict[str, Any]):
+        """Carrega, persiste e finaliza uma mensagem já interpretada (sem micro-batch)."""
+        if self._use_streaming(ctx):
+            await self._stream_message(ctx)
+            await self._finalize_message(ctx)
+            return
+        telemetry_data = await self._load_telemetry(ctx)
+        telemetry_data = await self._drop_duplicates(ctx, telemetry_data)
+        if telemetry_data:
+            await self._persist_telemetry(ctx, telemetry_data)
+        await self._finalize_message(ctx)
+    
+    @staticmethod
+    def _use_streaming(ctx: Dict[str, Any]) -> bool:
+        """Claim checks grandes são lidos/persistidos em blocos (memória limitada)."""
+        return (
+            settings.STORAGE_STREAMING_ENABLED
+            and ctx['is_claim_check']
+            and ctx['file_size'] >= settings.STORAGE_STREAMING_MIN_BYTES
+        )
+    
+    async def _stream_message(self, ctx: Dict[str, Any]):
+        """
+        Processa um claim check em blocos de STORAGE_STREAM_CHUNK_ITEMS itens.
+        
+        Cada bloco é deduplicado e persistido antes do próximo ser lido. Se a
+        mensagem falhar no meio, o retry reprocessa o arquivo e a deduplicação
+        descarta os blocos já gravados. O uso é registrado uma vez, no fim.
+        """
+        logger.info(
+            "Processando Claim Check (streaming)",
+            claim_check=ctx['claim_check'],
+            user_id=ctx['user_id'],
+            tenant_id=ctx['tenant_id'],
+            file_size=ctx['file_size'],
+        )
+        total = 0
+        kept = 0
+        processed = 0
+        inserted = 0
+        errors = 0
+        async for chunk in storage_client.iter_payload_chunks(
+            ctx['claim_check'],
+            settings.STORAGE_STREAM_CHUNK_ITEMS,
+            ctx['file_size'],
+        ):
+            total += len(chunk)
+            chunk = await self._drop_duplicates(ctx, chunk, scale_usage=False)
+            kept += len(chunk)
+            if not chunk:
+                continue
+            result = await self._persist_telemetry(ctx, chunk, final=False)
+            processed += result['processed']
+            inserted += result.get('inserted', 0)
+            errors += len(result.get('errors') or [])
+        
+        self._scale_usage(ctx, kept, total)
+        if kept and settings.BILLING_USAGE_ENABLED and ctx['tenant_id']:
+            async with AsyncSessionLocal() as db:
+                await self._record_usage(
+                    db,
+                    ctx['tenant_id'],
+                    ctx['organization_id'],
+                    ctx['workspace_id'],
+                    ctx['items_count'],
+                    ctx['sensors_count'],
+                    ctx['bytes_ingested'],
+                )
+        
+        self.stats['messages'] += 1
+        logger.info(
+            "Telemetria processada",
+            user_id=ctx['user_id'],
+            tenant_id=ctx['tenant_id'],
+            items=total,
+            processed=processed,
+            inserted=inserted,
+            errors=errors,
+        )
+    
+    async def _drop_duplicates(
+        self,
+        ctx: Dict[str, Any],
+        telemetry_data: List[Dict[str, Any]],
+        scale_usage: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Descarta itens já persistidos (reenvio do cliente HA) ou repetidos no payload.
+        
+        Os digests dos itens restantes ficam no ctx e são registrados após a
+        persistência (só os dos equipamentos gravados). O uso (billing) da mensagem é reduzido na mesma proporção
+        (com scale_usage=False o chamador faz isso, ex.: streaming por blocos).
+        Se a consulta falhar, segue sem descartar nada.
+        """
+        if not settings.DEDUP_ENABLED or not ctx['tenant_id'] or not telemetry_data:
+            return telemetry_data
+        
+        digests = dedup.item_digests(telemetry_data, ctx['organization_id'], ctx['workspace_id'])
+        try:
+            async with AsyncSessionLocal() as db:
+                seen = await dedup.find_seen(db, ctx['tenant_id'], digests)
+                await dedup.expire_if_due(db)
+        except Exception as e:
+            logger.warn("Erro ao consultar deduplicação, seguindo sem descartar", error=str(e))
+            ctx['dedup_digests'] = digests
+            return telemetry_data
+        
+        fresh = []
+        fresh_digests = []
+        for item, digest in zip(telemetry_data, digests):
+            if digest in seen:
+                continue
+            seen.add(digest)
+            fresh.append(item)
+            fresh_digests.append(digest)
+        ctx['dedup_digests'] = fresh_digests
+        
+        skipped = len(telemetry_data) - len(fresh)
+        if skipped:
+            if scale_usage:
+                self._scale_usage(ctx, len(fresh), len(telemetry_data))
+            self.stats['duplicates'] += skipped
+            logger.info(
+                "Itens duplicados descartados",
+                claim_check=ctx['claim_check'],
+                tenant_id=ctx['tenant_id'],
+                duplicates=skipped,
+                remaining=len(fresh),
+            )
+        return fresh
+    
+    @staticmethod
+    def _scale_usage(ctx: Dict[str, Any], kept: int, total: int):
+        """Reduz o uso da mensagem à fração de itens efetivamente persistidos."""
+        if total <= 0 or kept >= total:
+            return
+        ratio = kept / total
+        ctx['items_count'] = round(ctx['items_count'] * ratio)
+        ctx['sensors_count'] = round(ctx['sensors_count'] * ratio)
+        ctx['bytes_ingested'] = round(ctx['bytes_ingested'] * ratio)
+    
+    @staticmethod
+    def _written_digests(
+        ctx: Dict[str, Any],
+        telemetry_data: List[Dict[str, Any]],
+        result: Dict[str, Any],
+    ) -> List[bytes]:
+        """
+        Digests dos itens cujo equipamento foi gravado pelo process_bulk.
+        
+        Itens de equipamentos com erro (ou não resolvidos) ficam de fora, para
+        que um retry/reenvio deles não seja descartado como duplicata.
+        """
+        digests = ctx.get('dedup_digests') or []
+        written = result.get('written_equipments') or ()
+        return [
+            digest
+            for item, digest in zip(telemetry_data, digests)
+            if item.get('equip_uuid') in written
+        ]
+    
+    async def _remember_digests(self, db, tenant_id: int, digests: List[bytes]):
+        """Registra os digests persistidos (falha aqui não desfaz a telemetria)."""
+        if not settings.DEDUP_ENABLED or not tenant_id or not digests:
+            return
+        try:
+            await dedup.remember(db, tenant_id, digests)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.warn("Erro ao registrar digests de deduplicação", error=str(e))
+    
+    async def _handle_failure(self, ctx: Dict[str, Any], exc: Exception):
+        """
+        Tira a mensagem com erro do caminho principal.
+        
+        A mensagem vai para a fila de retry (ou direto para a DLQ se o erro
+        for permanente) e o offset é marcado como concluído, então as
+        mensagens seguintes da partição não ficam esperando por ela.
+        Se nem a fila de retry estiver acessível, o offset não é marcado:
+        o commit da partição para antes desta mensagem e ela é reentregue
+        após restart/rebalance. Arquivo permanece no storage para reprocessamento.
 
-                        if settings.BILLING_USAGE_ENABLED and tenant_id:
-                            await self._record_usage(
-                                db,
-                                int(tenant_id),
-                                int(organization_id) if organization_id and str(organization_id).isdigit() else 0,
-                                int(workspace_id) if workspace_id and str(workspace_id).isdigit() else 0,
-                                int(items_count) if str(items_count).isdigit() else 0,
-                                int(sensors_count) if str(sensors_count).isdigit() else 0,
-                                int(bytes_ingested) if str(bytes_ingested).isdigit() else 0,
-                            )
-                        
-                        logger.info(
-                            "Telemetria processada",
-                            user_id=user_id,
-                            tenant_id=tenant_id,
-                            processed=result['processed'],
-                            inserted=result.get('inserted', 0),
-                            errors=len(result.get('errors', [])),
-                        )
-                        
-                        # Deletar arquivo após processamento bem-sucedido (se Claim Check)
-                        if is_claim_check and settings.DELETE_FILE_AFTER_PROCESSING:
-                            try:
-                                await storage_client.delete_file(claim_check)
-                                logger.debug("Arquivo removido após processamento", claim_check=claim_check)
-                            except Exception as e:
-                                logger.warn("Erro ao remover arquivo", claim_check=claim_check, error=str(e))
-                
+        Com RETRY_ENABLED=false a mensagem é descartada (só o log do erro) e o
+        offset é marcado, como no commit em lote: senão o commit da partição
+        ficaria parado nela até o fim do processo.
+        """
+        if not settings.RETRY_ENABLED:
+            self._mark_done(ctx)
+            logger.warn(
+                "Mensagem descartada (retry desativado)",
+                partition=ctx['partition'],
+                offset=ctx['offset'],
+                claim_check=ctx['claim_check'],
+                error_type=type(exc).__name__,
+            )
+            return
+        
+        try:
+            async with AsyncSessionLocal() as db:
+                status = await retry_store.schedule_retry(db, ctx, exc)
+            self._mark_done(ctx)
+            logger.warn(
+                "Mensagem enviada para retry" if status == retry_store.STATUS_RETRY
+                else "Mensagem enviada para DLQ",
+                partition=ctx['partition'],
+                offset=ctx['offset'],
+                claim_check=ctx['claim_check'],
+                error_type=type(exc).__name__,
+            )
+        except Exception as e:
+            logger.error(
+                "Erro ao registrar mensagem na fila de retry",
+                partition=ctx['partition'],
+                offset=ctx['offset'],
+                error=str(e),
+            )
+    
+    async def _retry_loop(self):
+        """Reprocessa entradas vencidas da fila de retry, fora do caminho principal."""
+        try:
+            while self.running:
+                try:
+                    processed = await self._process_due_retries()
                 except Exception as e:
-                    logger.error(
-                        "Erro ao processar mensagem",
-                        user_id=user_id,
-                        error=str(e),
-                        exc_info=True
-                    )
-                    # Em caso de erro, não commita (permite reprocessamento)
-                    # Arquivo permanece no storage para reprocessamento
+                    logger.error("Erro no loop de retry", error=str(e))
+                    processed = 0
+                if not processed:
+                    await asyncio.sleep(settings.RETRY_POLL_SECONDS)
+        except asyncio.CancelledError:
+            pass
+    
+    async def _process_due_retries(self) -> int:
+        """
+        Reprocessa um lote de entradas vencidas.
+        
+        Returns:
+            Quantidade de entradas reservadas
+        """
+        async with AsyncSessionLocal() as db:
+            entries = await retry_store.claim_due(db, settings.RETRY_BATCH_SIZE)
+        
+        for entry in entries:
+            if not self.running:
+                break
+            payload = entry['payload']
+            if isinstance(payload, str):
+                payload = json.loads(payload)
+            ctx = self._parse_message({
+                'key': entry['message_key'],
+                'value': payload,
+                'topic': entry['topic'],
+                'topic_partition': None,
+                'generation': None,
+                'partition': entry['partition'],
+                'offset': entry['offset'],
+            })
+            try:
+                await self._run_message(ctx)
+                async with AsyncSessionLocal() as db:
+                    await retry_store.resolve(db, entry['id'])
+                logger.info(
+                    "Retry processado com sucesso",
+                    retry_id=entry['id'],
+                    attempts=entry['attempts'],
+                    claim_check=ctx['claim_check'],
+                )
+            except Exception as e:
+                async with AsyncSessionLocal() as db:
+                    status = await retry_store.record_failure(db, entry, e)
+                logger.warn(
+                    "Retry falhou",
+                    retry_id=entry['id'],
+                    attempts=entry['attempts'] + 1,
+                    status=status,
+                    error=str(e),
+                )
+        return len(entries)
+    
+    def _parse_message(self, msg: Dict[str, Any]) -> Dict[str, Any]:
+        """Extrai claim check e escopo (tenant/org/workspace) da mensagem."""
+        message_data = msg['value']
+        
+        # Verificar se é Claim Check (novo formato) ou payload completo (compatibilidade)
+        is_claim_check = (
+            isinstance(message_data, dict) and 
+            'claim_check' in message_data
+        )
+        source = message_data if isinstance(message_data, dict) else {}
+        metadata = source.get('metadata') or {}
+        tenant_id = metadata.get('tenantId') or source.get('tenant_id')
+        organization_id = metadata.get('organizationId') or source.get('organization_id')
+        workspace_id = metadata.get('workspaceId') or source.get('workspace_id')
+        items_count = metadata.get('itemsCount') or 0
+        sensors_count = metadata.get('totalSensors') or 0
+        bytes_ingested = metadata.get('fileSize') or source.get('file_size') or 0
+        
+        return {
+            **msg,
+            'user_id': msg['key'] or 'unknown',
+            'is_claim_check': is_claim_check,
+            'claim_check': source.get('claim_check') if is_claim_check else None,
+            'file_size': source.get('file_size', 0),
+            'tenant_id': self._to_int(tenant_id),
+            'organization_id': self._to_int(organization_id),
+            'workspace_id': self._to_int(workspace_id),
+            'items_count': self._to_int(items_count),
+            'sensors_count': self._to_int(sensors_count),
+            'bytes_ingested': self._to_int(bytes_ingested),
+        }
+    
+    async def _load_telemetry(self, ctx: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Obtém a lista de telemetria (download do claim check ou payload inline)."""
+        message_data = ctx['value']
+        
+        if ctx['is_claim_check']:
+            # CLAIM CHECK PATTERN: Baixar arquivo do storage
+            logger.info(
+                "Processando Claim Check",
+                claim_check=ctx['claim_check'],
+                user_id=ctx['user_id'],
+                tenant_id=ctx['tenant_id'],
+                file_size=ctx['file_size'],
+            )
             
-            # Commit do offset (sucesso)
-            if not settings.KAFKA_AUTO_COMMIT:
-                self.consumer.commit()
-            logger.debug(f"Offset commitado para {len(partitions_to_commit)} partições")
+            # Baixar arquivo do storage
+            telemetry_data = await storage_client.download_file(ctx['claim_check'], ctx['file_size'])
             
-        except Exception as e:
-            logger.error(f"Erro ao processar lote: {e}", exc_info=True)
-            # Em caso de erro, não commita (permite reprocessamento)
-            # TODO: Implementar dead letter queue para mensagens com erro persistente
+            # Garantir que é array
+            if not isinstance(telemetry_data, list):
+                telemetry_data = [telemetry_data]
+            return telemetry_data
+        
+        # Formato antigo (compatibilidade): payload completo
+        logger.warn("Recebido payload completo (formato antigo). Migre para Claim Check Pattern.")
+        
+        if isinstance(message_data, dict) and 'data' in message_data:
+            return message_data['data']
+        return [message_data] if not isinstance(message_data, list) else message_data
+    
+    async def _persist_telemetry(
+        self,
+        ctx: Dict[str, Any],
+        telemetry_data: List[Dict[str, Any]],
+        final: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Persiste a telemetria em uma sessão própria e registra o uso.
+        
+        Com final=False (bloco de um arquivo em streaming) só grava os itens;
+        uso e contagem da mensagem ficam para o fim do arquivo.
+        """
+        async with AsyncSessionLocal() as db:
+            result = await self.processor.process_bulk(
+                ctx['tenant_id'],
+                ctx['organization_id'],
+                ctx['workspace_id'],
+                telemetry_data,
+                db,
+            )
+            await self._remember_digests(
+                db,
+                ctx['tenant_id'],
+                self._written_digests(ctx, telemetry_data, result),
+            )
+
+            if final and settings.BILLING_USAGE_ENABLED and ctx['tenant_id']:
+                await self._record_usage(
+                    db,
+                    ctx['tenant_id'],
+                    ctx['organization_id'],
+                    ctx['workspace_id'],
+                    ctx['items_count'],
+                    ctx['sensors_count'],
+                    ctx['bytes_ingested'],
+                )
+        
+        self.stats['items'] += result['processed']
+        self.stats['inserted'] += result.get('inserted', 0)
+        self.stats['duplicate_readings'] += result.get('duplicate_readings', 0)
+        if not final:
+            return result
+        self.stats['messages'] += 1
+        logger.info(
+            "Telemetria processada",
+            user_id=ctx['user_id'],
+            tenant_id=ctx['tenant_id'],
+            processed=result['processed'],
+            inserted=result.get('inserted', 0),
+            errors=len(result.get('errors') or []),
+        )
+        return result
     
-    def _cleanup(self):
+    async def _finalize_message(self, ctx: Dict[str, Any]):
+        """Remove o arquivo após processamento bem-sucedido (se Claim Check)."""
+        if ctx['is_claim_check'] and settings.DELETE_FILE_AFTER_PROCESSING:
+            if self._deleter is not None:
+                # Remoção em lote em background (registrada no journal)
+                self._deleter.enqueue(ctx['claim_check'])
+                return
+            try:
+                await storage_client.delete_file(ctx['claim_check'])
+                logger.debug("Arquivo removido após processamento", claim_check=ctx['claim_check'])
+            except Exception as e:
+                logger.warn("Erro ao remover arquivo", claim_check=ctx['claim_check'], error=str(e))
+    
+    @staticmethod
+    def _to_int(value: Any) -> int:
+        """Converte IDs vindos da mensagem (str/int) para int; inválido vira 0."""
+        return int(value) if value and str(value).isdigit() else 0
+    
+    async def _cleanup(self):
         """Limpa recursos."""
+        self.running = False
+        if self._poll_task:
+            # O poll em andamento termina em até KAFKA_POLL_TIMEOUT_MS
+            self._poll_task.cancel()
+            try:
+                await self._poll_task
+            except asyncio.CancelledError:
+                pass
+            self._poll_task = None
+        
+        if self._pipeline:
+            # Conclui o que já entrou no pipeline antes do commit final
+            await self._pipeline.stop(timeout=settings.WORKER_SHUTDOWN_TIMEOUT)
+            self._pipeline = None
+        
+        if self._micro_batcher:
+            await self._micro_batcher.stop()
+            self._micro_batcher = None
+        
+        if self._backpressure_task:
+            self._backpressure_task.cancel()
+            try:
+                await self._backpressure_task
+            except asyncio.CancelledError:
+                pass
+            self._backpressure_task = None
+        
+        if self._cache_listener_task:
+            self._cache_listener_task.cancel()
+            try:
+                await self._cache_listener_task
+            except asyncio.CancelledError:
+                pass
+            self._cache_listener_task = None
+            logger.info("Estatísticas do cache de entidades", **entity_cache.stats())
+        
+        if self._retry_task:
+            self._retry_task.cancel()
+            try:
+                await self._retry_task
+            except asyncio.CancelledError:
+                pass
+            self._retry_task = None
+        
+        try:
+            await self.processor.close()
+        except Exception as e:
+            logger.error("Erro ao fechar sinks de telemetria", error=str(e))
+        
+        if self._late_data_task:
+            self._late_data_task.cancel()
+            try:
+                await self._late_data_task
+            except asyncio.CancelledError:
+                pass
+            self._late_data_task = None
+            try:
+                # Janelas ainda pendentes (o pipeline já foi drenado)
+                await late_data.refresh_late_aggregates(late_data_tracker)
+            except Exception as e:
+                logger.warn("Erro no refresh final de dados atrasados", error=str(e))
+            await late_data.close()
+        
+        if self._commit_task:
+            self._commit_task.cancel()
+            try:
+                await self._commit_task
+            except asyncio.CancelledError:
+                pass
+            self._commit_task = None
+            # Último commit com o que foi concluído até aqui
+            await self._commit_offsets()
+        
         if self.consumer:
             try:
-                self.consumer.close()
+                await self._call_consumer(self.consumer.close)
                 logger.info("Consumidor Kafka encerrado")
             except Exception as e:
                 logger.error(f"Erro ao fechar consumidor: {e}")
+        
+        if self._poll_executor:
+            self._poll_executor.shutdown(wait=True)
+            self._poll_executor = None
+        
+        if self._deleter:
+            # Último lote; o que falhar fica no journal para o próximo processo
+            await self._deleter.stop()
+            logger.info(
+                "Remoções em lote encerradas",
+                deleted=self._deleter.deleted,
+                failed=self._deleter.failed,
+                pending=self._deleter.pending,
+            )
+            self._deleter = None
+        
+        storage_client.close()
+
+    def stats_snapshot(self) -> Dict[str, int]:
+        """Contadores do consumidor, do cache de entidades e do sink (enviados ao supervisor)."""
+        snapshot = {
+            **self.stats,
+            **entity_cache.stats(),
+            **self.processor.sink.stats(),
+        }
+        if self._late_data_task is not None:
+            snapshot['late_refreshes'] = late_data_tracker.refreshes
+        if self._deleter is not None:
+            snapshot['files_deleted'] = self._deleter.deleted
+            snapshot['files_delete_pending'] = self._deleter.pending
+        return snapshot
 
     async def _record_usage(
         self,
@@ -305,10 +1210,8 @@ class TelemetryKafkaConsumer:
         logger.info("Solicitação de parada recebida")
 
 
-async def main():
-    """Função principal para executar o consumidor."""
-    consumer = TelemetryKafkaConsumer()
-    
+def install_signal_handlers(consumer: TelemetryKafkaConsumer):
+    """Para o consumidor graciosamente em SIGINT/SIGTERM."""
     # Handler para graceful shutdown
     def signal_handler(sig, frame):
         logger.info(f"Sinal {sig} recebido, encerrando...")
@@ -316,7 +1219,12 @@ async def main():
     
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
-    
+
+
+async def main():
+    """Função principal para executar o consumidor."""
+    consumer = TelemetryKafkaConsumer()
+    install_signal_handlers(consumer)
     await consumer.consume()
 
 
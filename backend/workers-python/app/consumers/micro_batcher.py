@@ -0,0 +1,134 @@
+"""
+Micro-batching de telemetria entre mensagens.
+
+Agrupa a telemetria decodificada de vários claim checks pelo escopo
+(tenant, organization, workspace) e persiste tudo em uma única passada
+quando o grupo atinge MICRO_BATCH_MAX_ITEMS ou MICRO_BATCH_MAX_WAIT_MS.
+Instâncias HA enviam filas pequenas a cada 60-120 s: sem o agrupamento,
+a maior parte dos round-trips ao banco é overhead fixo por mensagem.
+
+Se o flush_handler falhar (ou for cancelado), as entradas voltam para o
+buffer do escopo e são tentadas de novo no próximo ciclo do timer: os
+offsets dessas mensagens só são marcados quando o handler conclui.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+Scope = Tuple[int, int, int]
+Entry = Tuple[Dict[str, Any], List[Dict[str, Any]]]
+FlushHandler = Callable[[Scope, List[Entry]], Awaitable[None]]
+
+
+class MicroBatcher:
+    """Acumula mensagens por escopo e dispara a persistência em grupo."""
+
+    def __init__(self, flush_handler: FlushHandler, max_items: int, max_wait_ms: int):
+        """
+        Args:
+            flush_handler: Persiste as entradas (ctx, telemetria) de um escopo
+            max_items: Itens de telemetria que disparam o flush do escopo
+            max_wait_ms: Tempo máximo que uma mensagem espera no buffer
+        """
+        self.flush_handler = flush_handler
+        self.max_items = max(1, max_items)
+        self.max_wait = max_wait_ms / 1000
+        self._buffers: Dict[Scope, Dict[str, Any]] = {}
+        self._locks: Dict[Scope, asyncio.Lock] = {}
+        self._timer_task = None
+        self._stopping = asyncio.Event()
+
+    def start(self) -> None:
+        """Inicia o timer que descarrega buffers antigos."""
+        self._stopping.clear()
+        self._timer_task = asyncio.create_task(self._timer_loop())
+
+    async def stop(self) -> None:
+        """
+        Para o timer e descarrega tudo o que estiver pendente.
+
+        O timer não é cancelado: termina o flush em andamento antes de sair.
+        """
+        self._stopping.set()
+        if self._timer_task:
+            await self._timer_task
+            self._timer_task = None
+        await self.flush_all()
+
+    @property
+    def pending_messages(self) -> int:
+        """Mensagens aguardando flush."""
+        return sum(len(buffer["entries"]) for buffer in self._buffers.values())
+
+    async def add(self, scope: Scope, ctx: Dict[str, Any], telemetry_data: List[Dict[str, Any]]) -> None:
+        """Adiciona a telemetria de uma mensagem ao buffer do escopo."""
+        buffer = self._buffers.get(scope)
+        if buffer is None:
+            buffer = {"entries": [], "items": 0, "created_at": time.monotonic()}
+            self._buffers[scope] = buffer
+        buffer["entries"].append((ctx, telemetry_data))
+        buffer["items"] += len(telemetry_data)
+
+        if buffer["items"] >= self.max_items:
+            # A mensagem já está no buffer: em erro fica para o timer
+            await self._flush_logged(scope)
+
+    async def flush(self, scope: Scope) -> None:
+        """Persiste o buffer de um escopo (flushes do mesmo escopo são serializados)."""
+        lock = self._locks.setdefault(scope, asyncio.Lock())
+        async with lock:
+            buffer = self._buffers.pop(scope, None)
+            if not buffer or not buffer["entries"]:
+                return
+            logger.debug(
+                "Flush de micro-batch",
+                tenant_id=scope[0],
+                organization_id=scope[1],
+                workspace_id=scope[2],
+                messages=len(buffer["entries"]),
+                items=buffer["items"],
+            )
+            try:
+                await self.flush_handler(scope, buffer["entries"])
+            except BaseException:
+                self._restore(scope, buffer)
+                raise
+
+    def _restore(self, scope: Scope, buffer: Dict[str, Any]) -> None:
+        """Devolve um buffer não persistido, antes do que chegou durante o flush."""
+        current = self._buffers.get(scope)
+        if current is not None:
+            buffer["entries"].extend(current["entries"])
+            buffer["items"] += current["items"]
+        self._buffers[scope] = buffer
+
+    async def _flush_logged(self, scope: Scope) -> None:
+        try:
+            await self.flush(scope)
+        except Exception as e:
+            logger.error("Erro no flush de micro-batch", error=str(e), exc_info=True)
+
+    async def flush_all(self) -> None:
+        """Persiste todos os buffers pendentes."""
+        for scope in list(self._buffers):
+            await self.flush(scope)
+
+    async def _timer_loop(self) -> None:
+        interval = max(0.05, self.max_wait / 2)
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            now = time.monotonic()
+            expired = [
+                scope for scope, buffer in self._buffers.items()
+                if now - buffer["created_at"] >= self.max_wait
+            ]
+            for scope in expired:
+                await self._flush_logged(scope)
@@ -0,0 +1,116 @@
+"""
+Controle de offsets por mensagem.
+
+Registra cada (partição, offset) recebido e quais já foram concluídos.
+O commit avança somente até o maior offset contíguo concluído de cada
+partição: uma mensagem com erro segura o commit da sua partição sem
+impedir o processamento das seguintes.
+
+Cada atribuição de uma partição recebe uma geração nova. Uma mensagem
+concluída depois que sua partição foi revogada (e talvez reatribuída)
+carrega a geração antiga e é ignorada, em vez de marcar como concluído
+um offset que a nova atribuição ainda vai reprocessar.
+"""
+import itertools
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional, Set
+
+from kafka import OffsetAndMetadata, TopicPartition
+
+
+class OffsetTracker:
+    """Rastreia offsets pendentes/concluídos por partição (thread-safe)."""
+
+    def __init__(self):
+        # O poll (e o rebalance listener) roda na thread de poll; a conclusão
+        # das mensagens roda no event loop.
+        self._lock = threading.Lock()
+        self._pending: Dict[TopicPartition, Deque[int]] = {}
+        self._done: Dict[TopicPartition, Set[int]] = {}
+        self._generations: Dict[TopicPartition, int] = {}
+        self._generation_counter = itertools.count(1)
+        self._done_since_commit = 0
+
+    def track(self, tp: TopicPartition, offset: int) -> int:
+        """
+        Registra um offset recebido (em ordem crescente por partição).
+
+        Returns:
+            Geração da atribuição atual da partição
+        """
+        with self._lock:
+            if tp not in self._pending:
+                self._pending[tp] = deque()
+                self._done[tp] = set()
+                self._generations[tp] = next(self._generation_counter)
+            self._pending[tp].append(offset)
+            return self._generations[tp]
+
+    def generation(self, tp: TopicPartition) -> Optional[int]:
+        """Geração atual da partição (None se não pertence a este consumidor)."""
+        with self._lock:
+            return self._generations.get(tp)
+
+    def mark_done(self, tp: TopicPartition, offset: int, generation: int) -> None:
+        """
+        Marca um offset como concluído.
+
+        Ignorado se a partição foi revogada ou se o offset pertence a uma
+        atribuição anterior (generation diferente da atual).
+        """
+        with self._lock:
+            current = self._generations.get(tp)
+            if current is None or current != generation:
+                return
+            self._done[tp].add(offset)
+            self._done_since_commit += 1
+
+    @property
+    def done_since_commit(self) -> int:
+        """Mensagens concluídas desde o último commit."""
+        return self._done_since_commit
+
+    @property
+    def pending_count(self) -> int:
+        """Total de offsets ainda não commitáveis."""
+        with self._lock:
+            return sum(len(offsets) for offsets in self._pending.values())
+
+    def committable(
+        self,
+        partitions: Iterable[TopicPartition] = None,
+    ) -> Dict[TopicPartition, OffsetAndMetadata]:
+        """
+        Avança as partições até o maior offset contíguo concluído.
+
+        Returns:
+            Offsets a commitar (próximo offset a ler) por partição
+        """
+        offsets = {}
+        with self._lock:
+            targets = list(partitions) if partitions is not None else list(self._pending)
+            for tp in targets:
+                pending = self._pending.get(tp)
+                done = self._done.get(tp)
+                if not pending:
+                    continue
+
+                last_done = None
+                while pending and pending[0] in done:
+                    last_done = pending.popleft()
+                    done.discard(last_done)
+
+                if last_done is not None:
+                    offsets[tp] = OffsetAndMetadata(last_done + 1, None)
+
+            self._done_since_commit = 0
+        return offsets
+
+    def forget(self, partitions: Iterable[TopicPartition]) -> None:
+        """Descarta o estado de partições revogadas no rebalance."""
+        with self._lock:
+            for tp in partitions:
+                self._pending.pop(tp, None)
+                self._done.pop(tp, None)
+                self._generations.pop(tp, None)
@@ -0,0 +1,99 @@
+"""
+Pipeline em estágios para processamento de claim checks.
+
+fetch (download) -> decode (gzip/JSON) -> persist (TimescaleDB), com filas
+limitadas entre os estágios. Enquanto o claim check N é gravado no banco,
+o N+1 já está sendo baixado e descomprimido: a latência do storage e a do
+banco se sobrepõem em vez de se somarem.
+
+Cada estágio é uma única task consumindo sua fila em ordem (FIFO), então a
+ordem de chegada das mensagens é preservada até a persistência.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+Stage = Callable[[Dict[str, Any]], Awaitable[None]]
+ErrorHandler = Callable[[Dict[str, Any], Exception], Awaitable[None]]
+
+
+class StagedPipeline:
+    """Encadeia estágios assíncronos ligados por filas limitadas."""
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        on_error: ErrorHandler,
+        queue_size: int = 4,
+    ):
+        """
+        Args:
+            stages: Funções async aplicadas em sequência ao contexto da mensagem
+            on_error: Chamado quando um estágio falha (a mensagem sai do pipeline)
+            queue_size: Capacidade de cada fila entre estágios
+        """
+        self.stages = stages
+        self.on_error = on_error
+        self.queues: List[asyncio.Queue] = [
+            asyncio.Queue(maxsize=max(1, queue_size)) for _ in stages
+        ]
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        """Cria uma task por estágio."""
+        for index, stage in enumerate(self.stages):
+            self._tasks.append(asyncio.create_task(self._run_stage(index, stage)))
+
+    async def submit(self, ctx: Dict[str, Any]) -> None:
+        """Entra no primeiro estágio; aguarda se a fila estiver cheia (backpressure)."""
+        await self.queues[0].put(ctx)
+
+    async def drain(self, timeout: Optional[float] = None) -> None:
+        """Aguarda todas as mensagens já submetidas saírem do último estágio."""
+        async def _join_all():
+            for queue in self.queues:
+                await queue.join()
+
+        await asyncio.wait_for(_join_all(), timeout=timeout)
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        """Drena o pipeline e encerra as tasks dos estágios."""
+        try:
+            await self.drain(timeout)
+        except asyncio.TimeoutError:
+            logger.warn(
+                "Pipeline encerrado com mensagens pendentes",
+                pending=[queue.qsize() for queue in self.queues],
+            )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def depth(self) -> List[int]:
+        """Mensagens aguardando em cada fila."""
+        return [queue.qsize() for queue in self.queues]
+
+    async def _run_stage(self, index: int, stage: Stage) -> None:
+        in_queue = self.queues[index]
+        out_queue = self.queues[index + 1] if index + 1 < len(self.queues) else None
+
+        while True:
+            ctx = await in_queue.get()
+            try:
+                await stage(ctx)
+                if out_queue is not None:
+                    await out_queue.put(ctx)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                try:
+                    await self.on_error(ctx, e)
+                except Exception as handler_error:
+                    logger.error("Erro no tratamento de falha do pipeline", error=str(handler_error))
+            finally:
+                in_queue.task_done()
@@ -0,0 +1,203 @@
+"""
+Fila de retry e dead-letter (DLQ) de mensagens de telemetria.
+
+Mensagens que falham saem do caminho principal: são gravadas em
+telemetry_retry_queue e o offset segue em frente. Um loop de retry
+reprocessa as entradas vencidas com backoff exponencial; depois de
+MAX_RETRIES tentativas (ou em erro permanente) a entrada vira 'dead'
+e só volta a ser processada via re-drive (app.workers.dlq_redrive).
+"""
+import gzip
+import json
+import zlib
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.core.config import settings
+
+STATUS_RETRY = "retry"
+STATUS_DEAD = "dead"
+
+
+def is_permanent_error(exc: Exception) -> bool:
+    """
+    Indica se o erro não se resolve com nova tentativa.
+
+    Claim check inexistente, arquivo corrompido (gzip/JSON) ou payload
+    inválido vão direto para a DLQ em vez de consumir tentativas.
+    """
+    if isinstance(exc, (FileNotFoundError, gzip.BadGzipFile, zlib.error, EOFError, ValueError)):
+        return True
+    try:
+        from minio.error import S3Error
+    except ImportError:
+        return False
+    return isinstance(exc, S3Error) and exc.code in ("NoSuchKey", "NoSuchBucket")
+
+
+def backoff_seconds(attempts: int) -> int:
+    """Atraso até a próxima tentativa: RETRY_DELAY * 2^(tentativas-1), com teto."""
+    delay = settings.RETRY_DELAY * (2 ** max(0, attempts - 1))
+    return min(delay, settings.RETRY_MAX_DELAY)
+
+
+async def schedule_retry(db, ctx: Dict[str, Any], exc: Exception) -> str:
+    """
+    Registra a primeira falha de uma mensagem.
+
+    Returns:
+        Status da entrada ('retry' ou 'dead')
+    """
+    permanent = is_permanent_error(exc)
+    status = STATUS_DEAD if permanent or settings.MAX_RETRIES <= 1 else STATUS_RETRY
+    await db.execute(text("""
+        INSERT INTO telemetry_retry_queue (
+            topic, partition, "offset", message_key, payload, claim_check, tenant_id,
+            status, attempts, error_type, last_error, next_retry_at
+        ) VALUES (
+            :topic, :partition, :offset, :message_key, CAST(:payload AS JSONB), :claim_check, :tenant_id,
+            :status, 1, :error_type, :last_error,
+            NOW() + make_interval(secs => :delay)
+        )
+        ON CONFLICT (topic, partition, "offset") DO NOTHING;
+    """), {
+        "topic": ctx['topic'],
+        "partition": ctx['partition'],
+        "offset": ctx['offset'],
+        "message_key": ctx['key'],
+        "payload": json.dumps(ctx['value']),
+        "claim_check": ctx.get('claim_check'),
+        "tenant_id": ctx.get('tenant_id') or None,
+        "status": status,
+        "error_type": type(exc).__name__,
+        "last_error": str(exc)[:4000],
+        "delay": float(backoff_seconds(1)),
+    })
+    await db.commit()
+    return status
+
+
+async def claim_due(db, limit: int) -> List[Dict[str, Any]]:
+    """
+    Reserva entradas vencidas para reprocessamento.
+
+    O next_retry_at é empurrado para frente (lease) para que outra réplica
+    não pegue a mesma entrada enquanto esta a processa.
+    """
+    result = await db.execute(text("""
+        UPDATE telemetry_retry_queue
+        SET next_retry_at = NOW() + make_interval(secs => :lease), updated_at = NOW()
+        WHERE id IN (
+            SELECT id FROM telemetry_retry_queue
+            WHERE status = 'retry' AND next_retry_at <= NOW()
+            ORDER BY next_retry_at
+            LIMIT :limit
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, topic, partition, "offset", message_key, payload, attempts;
+    """), {"limit": limit, "lease": float(settings.RETRY_LEASE_SECONDS)})
+    rows = [dict(r._mapping) for r in result.fetchall()]
+    await db.commit()
+    return rows
+
+
+async def resolve(db, entry_id: int) -> None:
+    """Remove a entrada após reprocessamento bem-sucedido."""
+    await db.execute(
+        text("DELETE FROM telemetry_retry_queue WHERE id = :id"),
+        {"id": entry_id},
+    )
+    await db.commit()
+
+
+async def record_failure(db, entry: Dict[str, Any], exc: Exception) -> str:
+    """
+    Registra nova falha de uma entrada e agenda o próximo retry (ou DLQ).
+
+    Returns:
+        Novo status da entrada
+    """
+    attempts = int(entry['attempts']) + 1
+    if is_permanent_error(exc) or attempts >= settings.MAX_RETRIES:
+        status = STATUS_DEAD
+    else:
+        status = STATUS_RETRY
+    await db.execute(text("""
+        UPDATE telemetry_retry_queue
+        SET status = :status,
+            attempts = :attempts,
+            error_type = :error_type,
+            last_error = :last_error,
+            next_retry_at = NOW() + make_interval(secs => :delay),
+            updated_at = NOW()
+        WHERE id = :id
+    """), {
+        "id": entry['id'],
+        "status": status,
+        "attempts": attempts,
+        "error_type": type(exc).__name__,
+        "last_error": str(exc)[:4000],
+        "delay": float(backoff_seconds(attempts)),
+    })
+    await db.commit()
+    return status
+
+
+async def list_dead(db, limit: int = 50, error_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Lista entradas da DLQ (mais recentes primeiro)."""
+    params: Dict[str, Any] = {"limit": limit}
+    where = "status = 'dead'"
+    if error_type:
+        where += " AND error_type = :error_type"
+        params["error_type"] = error_type
+    result = await db.execute(text(f"""
+        SELECT id, topic, partition, "offset", claim_check, tenant_id,
+               attempts, error_type, last_error, updated_at
+        FROM telemetry_retry_queue
+        WHERE {where}
+        ORDER BY updated_at DESC
+        LIMIT :limit
+    """), params)
+    return [dict(r._mapping) for r in result.fetchall()]
+
+
+async def redrive(
+    db,
+    ids: Optional[List[int]] = None,
+    error_type: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> int:
+    """
+    Devolve entradas da DLQ para a fila de retry (tentativas zeradas).
+
+    Returns:
+        Quantidade de entradas re-enfileiradas
+    """
+    params: Dict[str, Any] = {}
+    where = "status = 'dead'"
+    if ids:
+        where += " AND id = ANY(:ids)"
+        params["ids"] = ids
+    if error_type:
+        where += " AND error_type = :error_type"
+        params["error_type"] = error_type
+    limit_sql = ""
+    if limit:
+        limit_sql = "LIMIT :limit"
+        params["limit"] = limit
+
+    result = await db.execute(text(f"""
+        UPDATE telemetry_retry_queue
+        SET status = 'retry', attempts = 0, next_retry_at = NOW(), updated_at = NOW()
+        WHERE id IN (
+            SELECT id FROM telemetry_retry_queue
+            WHERE {where}
+            ORDER BY id
+            {limit_sql}
+        )
+        RETURNING id;
+    """), params)
+    count = len(result.fetchall())
+    await db.commit()
+    return count
@@ -0,0 +1,249 @@
+"""
+Supervisor multi-processo dos consumidores de telemetria.
+
+Sobe WORKER_PROCESSES processos de app.consumers.kafka_consumer no mesmo
+consumer group, para que uma réplica use todos os núcleos do container.
+
+- Health check: cada filho envia heartbeat + estatísticas a cada
+  WORKER_HEARTBEAT_INTERVAL; sem heartbeat por WORKER_HEARTBEAT_TIMEOUT
+  (event loop travado) o filho é morto e recriado.
+- Filhos que terminam são reiniciados (com intervalo mínimo entre restarts).
+- SIGTERM/SIGINT é repassado aos filhos, que drenam o trabalho em andamento
+  e commitam offsets; após WORKER_SHUTDOWN_TIMEOUT + SHUTDOWN_MARGIN_SECONDS
+  os restantes são mortos. O stop_grace_period do container precisa ser
+  maior que isso (docker-compose: 60s), senão o SIGKILL corta a drenagem.
+- Estatísticas agregadas são logadas (e opcionalmente gravadas em
+  WORKER_HEALTH_FILE) a cada WORKER_STATS_INTERVAL.
+
+Uso:
+    python -m app.consumers.supervisor
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import time
+from typing import Any, Dict, Optional, Set
+
+from app.core.config import settings
+from app.core.logging import setup_logging, get_logger
+
+setup_logging()
+logger = get_logger(__name__)
+
+# Intervalo mínimo entre restarts do mesmo filho (evita crash loop acelerado)
+RESTART_BACKOFF_SECONDS = 5
+
+# Margem para o poll em andamento e o commit final após a drenagem
+SHUTDOWN_MARGIN_SECONDS = 10
+
+
+def _child_entrypoint(index: int, stats_queue) -> None:
+    """Ponto de entrada do processo filho (contexto spawn)."""
+    try:
+        asyncio.run(_run_child(index, stats_queue))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _run_child(index: int, stats_queue) -> None:
+    # Import tardio: engine, storage e Kafka são criados dentro do filho
+    from app.consumers.kafka_consumer import TelemetryKafkaConsumer, install_signal_handlers
+
+    consumer = TelemetryKafkaConsumer()
+    install_signal_handlers(consumer)
+
+    async def report_stats():
+        while True:
+            try:
+                stats_queue.put_nowait((index, os.getpid(), time.time(), consumer.stats_snapshot()))
+            except Exception:
+                pass
+            await asyncio.sleep(settings.WORKER_HEARTBEAT_INTERVAL)
+
+    reporter = asyncio.create_task(report_stats())
+    try:
+        await consumer.consume()
+    finally:
+        reporter.cancel()
+
+
+class WorkerSupervisor:
+    """Mantém N processos consumidores vivos e saudáveis."""
+
+    def __init__(self, processes: int):
+        self.processes = processes
+        self.ctx = multiprocessing.get_context("spawn")
+        self.stats_queue = self.ctx.Queue()
+        self.children: Dict[int, Any] = {}
+        self.last_heartbeat: Dict[int, float] = {}
+        self.last_start: Dict[int, float] = {}
+        self.child_stats: Dict[int, Dict[str, int]] = {}
+        # Pids cuja saída já foi logada (o restart pode esperar alguns ciclos)
+        self.reported_exits: Set[int] = set()
+        self.restarts = 0
+        self.stopping = False
+
+    def _start_child(self, index: int) -> None:
+        process = self.ctx.Process(
+            target=_child_entrypoint,
+            args=(index, self.stats_queue),
+            name=f"telemetry-consumer-{index}",
+        )
+        process.start()
+        now = time.time()
+        self.children[index] = process
+        self.last_heartbeat[index] = now
+        self.last_start[index] = now
+        logger.info("Consumidor iniciado", worker=index, pid=process.pid)
+
+    def _drain_stats(self) -> None:
+        while True:
+            try:
+                index, pid, timestamp, stats = self.stats_queue.get_nowait()
+            except queue.Empty:
+                return
+            child = self.children.get(index)
+            if child is not None and child.pid == pid:
+                self.last_heartbeat[index] = timestamp
+                self.child_stats[index] = stats
+
+    def _check_children(self) -> None:
+        now = time.time()
+        for index, process in list(self.children.items()):
+            if process.is_alive():
+                if now - self.last_heartbeat[index] <= settings.WORKER_HEARTBEAT_TIMEOUT:
+                    continue
+                logger.error(
+                    "Consumidor sem heartbeat, reiniciando",
+                    worker=index,
+                    pid=process.pid,
+                    silent_for=round(now - self.last_heartbeat[index], 1),
+                )
+                process.kill()
+                process.join(5)
+                self.reported_exits.add(process.pid)
+            elif process.pid not in self.reported_exits:
+                logger.warn(
+                    "Consumidor encerrado inesperadamente",
+                    worker=index,
+                    pid=process.pid,
+                    exitcode=process.exitcode,
+                )
+                self.reported_exits.add(process.pid)
+
+            if now - self.last_start[index] < RESTART_BACKOFF_SECONDS:
+                # Reinicia no próximo ciclo
+                continue
+            # Estatísticas do processo antigo continuam no agregado
+            self._retire_stats(index)
+            self.reported_exits.discard(process.pid)
+            self.restarts += 1
+            self._start_child(index)
+
+    def _retire_stats(self, index: int) -> None:
+        stats = self.child_stats.pop(index, None)
+        if not stats:
+            return
+        # Tamanhos (cache, fila de remoção) não são cumulativos: morrem com o
+        # processo (remoções pendentes seguem no journal)
+        stats.pop("cache_size", None)
+        stats.pop("files_delete_pending", None)
+        retired = self.child_stats.setdefault(-1, {})
+        for key, value in stats.items():
+            retired[key] = retired.get(key, 0) + value
+
+    def aggregate_stats(self) -> Dict[str, Any]:
+        """Soma as estatísticas de todos os filhos (vivos e anteriores)."""
+        totals: Dict[str, int] = {}
+        for stats in self.child_stats.values():
+            for key, value in stats.items():
+                totals[key] = totals.get(key, 0) + value
+        now = time.time()
+        healthy = sum(
+            1 for index, process in self.children.items()
+            if process.is_alive()
+            and now - self.last_heartbeat[index] <= settings.WORKER_HEARTBEAT_TIMEOUT
+        )
+        return {
+            **totals,
+            "processes": self.processes,
+            "healthy": healthy,
+            "restarts": self.restarts,
+            "timestamp": int(now),
+        }
+
+    def _report(self) -> None:
+        stats = self.aggregate_stats()
+        logger.info("Estatísticas dos consumidores", **stats)
+        if settings.WORKER_HEALTH_FILE:
+            tmp_path = f"{settings.WORKER_HEALTH_FILE}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(stats, f)
+                os.replace(tmp_path, settings.WORKER_HEALTH_FILE)
+            except OSError as e:
+                logger.warn("Erro ao gravar arquivo de health", error=str(e))
+
+    def _request_stop(self, sig, frame) -> None:
+        logger.info(f"Sinal {sig} recebido, encerrando consumidores...")
+        self.stopping = True
+
+    def _shutdown(self) -> None:
+        """Repassa SIGTERM aos filhos e aguarda a drenagem coordenada."""
+        for process in self.children.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+        deadline = time.time() + settings.WORKER_SHUTDOWN_TIMEOUT + SHUTDOWN_MARGIN_SECONDS
+        for index, process in self.children.items():
+            process.join(max(0.0, deadline - time.time()))
+            if process.is_alive():
+                logger.warn("Consumidor não encerrou a tempo, forçando", worker=index, pid=process.pid)
+                process.kill()
+                process.join(5)
+
+        self._drain_stats()
+        self._report()
+        logger.info("Supervisor encerrado")
+
+    def run(self) -> None:
+        """Loop principal do supervisor."""
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        logger.info("Supervisor de consumidores iniciado", processes=self.processes)
+        for index in range(self.processes):
+            self._start_child(index)
+
+        last_report = time.time()
+        while not self.stopping:
+            time.sleep(1)
+            self._drain_stats()
+            if self.stopping:
+                break
+            self._check_children()
+            if time.time() - last_report >= settings.WORKER_STATS_INTERVAL:
+                self._report()
+                last_report = time.time()
+
+        self._shutdown()
+
+
+def _resolve_process_count(value: Optional[int]) -> int:
+    if value and value > 0:
+        return value
+    return os.cpu_count() or 1
+
+
+def main() -> None:
+    supervisor = WorkerSupervisor(_resolve_process_count(settings.WORKER_PROCESSES))
+    supervisor.run()
+
+
+if __name__ == '__main__':
+    main()
+    sys.exit(0)
@@ -2,7 +2,7 @@
 Configurações dos workers Python.
 """
 import os
-from typing import List
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
@@ -38,11 +38,184 @@ class Settings(BaseSettings):
     KAFKA_GROUP_ID: str = Field(default="telemetry-workers", description="Group ID do consumidor")
     KAFKA_BATCH_SIZE: int = Field(default=100, description="Tamanho do batch para processamento")
     KAFKA_AUTO_COMMIT: bool = Field(default=False, description="Auto commit de offsets")
+    KAFKA_ASYNC_POLL: bool = Field(
+        default=True,
+        description="Executa poll/commit do Kafka em thread dedicada (não bloqueia o event loop)"
+    )
+    KAFKA_POLL_TIMEOUT_MS: int = Field(default=1000, description="Timeout do poll do Kafka (ms)")
+    KAFKA_COMMIT_INTERVAL_MS: int = Field(
+        default=5000,
+        description="Intervalo de commit dos offsets concluídos (ms)"
+    )
+    KAFKA_COMMIT_EVERY: int = Field(
+        default=500,
+        description="Força commit após N mensagens concluídas"
+    )
+    KAFKA_PREFETCH_BATCHES: int = Field(
+        default=1,
+        description="Lotes buscados antecipadamente pela thread de poll (fila asyncio)"
+    )
     
     # Processamento
     BULK_INSERT_BATCH_SIZE: int = Field(default=1000, description="Tamanho do batch para inserts")
+    TELEMETRY_COPY_ENABLED: bool = Field(
+        default=True,
+        description="Insere telemetria via COPY (asyncpg); false usa o ORM (add_all)"
+    )
+    TELEMETRY_COLUMNAR_ENABLED: bool = Field(
+        default=True,
+        description="Normaliza leituras em colunas (NumPy se instalado) em vez de um dict por leitura"
+    )
+    TELEMETRY_COMMIT_MODE: str = Field(
+        default="equipment",
+        description="Granularidade do commit: equipment (um commit por equipamento) ou payload (uma transação, SAVEPOINT por equipamento)"
+    )
+    TELEMETRY_UNIQUE_READINGS: bool = Field(
+        default=False,
+        description="Descarta leituras repetidas (sensor_id, timestamp) no payload e grava com ON CONFLICT DO NOTHING (requer migration 037)"
+    )
+    TELEMETRY_BISECT_ENABLED: bool = Field(
+        default=True,
+        description="Em falha de gravação, divide o lote ao meio até isolar as leituras inválidas"
+    )
+    TELEMETRY_BISECT_MAX_FAILED: int = Field(
+        default=100,
+        description="Leituras inválidas por equipamento acima das quais o lote inteiro é descartado"
+    )
+    TELEMETRY_SINK: str = Field(
+        default="postgres",
+        description="Destino da telemetria: postgres, file ou null (só conta)"
+    )
+    TELEMETRY_SHADOW_SINK: Optional[str] = Field(
+        default=None,
+        description="Destino secundário (shadow) gravado após o principal; vazio desativa"
+    )
+    TELEMETRY_FILE_SINK_PATH: str = Field(
+        default="/tmp/telemetry-sink",
+        description="Diretório dos segmentos do sink de arquivo"
+    )
+    TELEMETRY_FILE_SINK_FORMAT: str = Field(default="csv", description="Formato dos segmentos: csv ou parquet")
+    TELEMETRY_FILE_SINK_SEGMENT_ROWS: int = Field(
+        default=100000,
+        description="Registros por segmento do sink de arquivo"
+    )
     MAX_RETRIES: int = Field(default=3, description="Número máximo de tentativas")
     RETRY_DELAY: int = Field(default=5, description="Delay entre tentativas (segundos)")
+    RETRY_ENABLED: bool = Field(
+        default=True,
+        description="Envia mensagens com erro para a fila de retry/DLQ (telemetry_retry_queue)"
+    )
+    RETRY_MAX_DELAY: int = Field(default=3600, description="Teto do backoff exponencial (segundos)")
+    RETRY_POLL_SECONDS: int = Field(default=5, description="Intervalo de busca de retries vencidos")
+    RETRY_BATCH_SIZE: int = Field(default=20, description="Retries reprocessados por ciclo")
+    RETRY_LEASE_SECONDS: int = Field(
+        default=300,
+        description="Reserva de um retry em processamento (evita duplicidade entre réplicas)"
+    )
+    WORKER_CONCURRENCY: int = Field(
+        default=1,
+        description="Mensagens processadas em paralelo por lote (1 = sequencial)"
+    )
+    WORKER_ORDERING: str = Field(
+        default="key",
+        description="Garantia de ordem no modo concorrente (partition, key)"
+    )
+    WORKER_PIPELINE_ENABLED: bool = Field(
+        default=False,
+        description="Pipeline em estágios (download -> decode -> persist) com filas limitadas"
+    )
+    WORKER_PIPELINE_QUEUE_SIZE: int = Field(
+        default=4,
+        description="Capacidade de cada fila entre estágios do pipeline"
+    )
+    WORKER_SHUTDOWN_TIMEOUT: int = Field(
+        default=30,
+        description="Tempo máximo para drenar mensagens em andamento no encerramento (segundos)"
+    )
+    
+    # Deduplicação de reenvios do cliente HA (app.consumers.dedup)
+    DEDUP_ENABLED: bool = Field(
+        default=False,
+        description="Descarta itens já persistidos (telemetry_upload_dedup) antes do process_bulk (requer migration 035)"
+    )
+    DEDUP_TTL_HOURS: int = Field(default=24, description="Tempo de retenção dos digests (horas)")
+    
+    # Cache de resolução de equipamentos/sensores (app.processors.entity_cache)
+    ENTITY_CACHE_ENABLED: bool = Field(
+        default=False,
+        description="Cache uuid -> id por processo, invalidado via LISTEN/NOTIFY (migration 036)"
+    )
+    ENTITY_CACHE_MAX_SIZE: int = Field(default=100000, description="Máximo de entradas (LRU)")
+    ENTITY_CACHE_TTL_SECONDS: int = Field(default=900, description="Validade de cada entrada (segundos)")
+    ENTITY_METADATA_REFRESH_ENABLED: bool = Field(
+        default=False,
+        description="Atualiza metadados de equipamentos/sensores quando o fingerprint do payload muda (requer migration 038)"
+    )
+    
+    # Dados atrasados: refresh dirigido dos continuous aggregates (app.processors.late_data)
+    LATE_DATA_REFRESH_ENABLED: bool = Field(
+        default=False,
+        description="Atualiza telemetry_hourly/daily nas janelas de leituras fora do alcance das políticas"
+    )
+    LATE_DATA_REFRESH_INTERVAL_SECONDS: float = Field(
+        default=60.0,
+        description="Intervalo entre refreshes (janelas acumuladas e agrupadas)"
+    )
+    LATE_DATA_HOURLY_HORIZON_HOURS: int = Field(
+        default=72,
+        description="start_offset da política de telemetry_hourly (migration 004)"
+    )
+    LATE_DATA_DAILY_HORIZON_DAYS: int = Field(
+        default=7,
+        description="start_offset da política de telemetry_daily (migration 004)"
+    )
+    LATE_DATA_RETENTION_DAYS: int = Field(
+        default=30,
+        description="drop_after da retenção de telemetry_data (migration 004); janelas mais antigas não são recalculadas (0 = sem retenção)"
+    )
+    
+    # Micro-batching entre mensagens (app.consumers.micro_batcher)
+    MICRO_BATCH_ENABLED: bool = Field(
+        default=False,
+        description="Agrupa telemetria de várias mensagens por tenant/org/workspace antes de persistir"
+    )
+    MICRO_BATCH_MAX_ITEMS: int = Field(default=2000, description="Itens que disparam o flush do grupo")
+    MICRO_BATCH_MAX_WAIT_MS: int = Field(default=500, description="Espera máxima de uma mensagem no grupo (ms)")
+    
+    # Backpressure / lote adaptativo (app.consumers.backpressure)
+    BACKPRESSURE_ENABLED: bool = Field(
+        default=False,
+        description="Ajusta o poll e pausa partições conforme latência, pool do banco e RSS"
+    )
+    BACKPRESSURE_INTERVAL_SECONDS: int = Field(default=2, description="Intervalo de reavaliação")
+    BACKPRESSURE_TARGET_LATENCY_MS: int = Field(
+        default=10000,
+        description="Latência alvo por mensagem (poll -> persistido), em ms"
+    )
+    BACKPRESSURE_PAUSE_FACTOR: float = Field(
+        default=3.0,
+        description="Pausa partições quando a latência passa de alvo * fator"
+    )
+    BACKPRESSURE_MIN_POLL_RECORDS: int = Field(default=5, description="Menor max_records do poll")
+    BACKPRESSURE_POOL_HIGH: float = Field(default=0.9, description="Saturação do pool que pausa o consumo")
+    BACKPRESSURE_POOL_LOW: float = Field(default=0.6, description="Saturação do pool que permite retomar")
+    BACKPRESSURE_MAX_RSS_MB: int = Field(default=0, description="RSS que pausa o consumo (0 = sem limite)")
+    
+    # Supervisor multi-processo (app.consumers.supervisor)
+    WORKER_PROCESSES: int = Field(
+        default=1,
+        description="Processos consumidores por container (0 = número de CPUs)"
+    )
+    WORKER_HEARTBEAT_INTERVAL: int = Field(default=5, description="Intervalo de heartbeat dos filhos (segundos)")
+    WORKER_HEARTBEAT_TIMEOUT: int = Field(
+        default=60,
+        description="Sem heartbeat por este tempo, o filho é reiniciado (segundos)"
+    )
+    WORKER_STATS_INTERVAL: int = Field(default=60, description="Intervalo do log de estatísticas agregadas")
+    WORKER_HEALTH_FILE: Optional[str] = Field(
+        default=None,
+        description="Arquivo JSON com estatísticas agregadas (para healthcheck do container)"
+    )
     
     # Storage (MinIO/S3)
     STORAGE_TYPE: str = Field(default="minio", description="Tipo de storage (minio, local, s3)")
@@ -52,11 +225,61 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str = Field(default="minioadmin", description="Secret key do MinIO")
     MINIO_BUCKET: str = Field(default="telemetry-raw", description="Bucket do MinIO")
     MINIO_USE_SSL: str = Field(default="false", description="Usar SSL no MinIO")
+    MINIO_REGION: Optional[str] = Field(default=None, description="Região do bucket (MinIO/S3)")
+    S3_ENDPOINT: str = Field(default="s3.amazonaws.com", description="Endpoint S3 (STORAGE_TYPE=s3)")
+    STORAGE_MAX_CONCURRENCY: int = Field(
+        default=16,
+        description="Threads/conexões para operações de storage (SDK bloqueante fora do event loop)"
+    )
+    STORAGE_CONNECT_TIMEOUT: float = Field(default=5.0, description="Timeout de conexão com o storage (segundos)")
+    STORAGE_READ_TIMEOUT: float = Field(default=60.0, description="Timeout de leitura do storage (segundos)")
+    STORAGE_MAX_RETRIES: int = Field(default=3, description="Retries HTTP do cliente de storage")
+    STORAGE_CACHE_DIR: Optional[str] = Field(
+        default=None,
+        description="Diretório do cache local de claim checks descomprimidos (vazio desativa)"
+    )
+    STORAGE_CACHE_MAX_BYTES: int = Field(
+        default=2 * 1024 * 1024 * 1024,
+        description="Tamanho máximo do cache local (remoção LRU)"
+    )
+    STORAGE_DELETE_BATCH_ENABLED: bool = Field(
+        default=True,
+        description="Remove claim checks processados em lote, fora do caminho crítico da mensagem"
+    )
+    STORAGE_DELETE_BATCH_SIZE: int = Field(default=500, description="Chaves pendentes que disparam a remoção em lote")
+    STORAGE_DELETE_INTERVAL_SECONDS: float = Field(default=5.0, description="Intervalo máximo entre remoções em lote")
+    STORAGE_DELETE_JOURNAL_DIR: str = Field(
+        default="/app/data/delete-journal",
+        description="Diretório do journal de remoções pendentes (volume persistente; recuperado após queda do processo)"
+    )
+    STORAGE_RANGED_GET_ENABLED: bool = Field(
+        default=True,
+        description="Baixa objetos grandes em byte-ranges paralelos (MinIO/S3), inclusive no streaming"
+    )
+    STORAGE_RANGED_GET_MIN_BYTES: int = Field(
+        default=4 * 1024 * 1024,
+        description="Tamanho a partir do qual o download usa ranges paralelos"
+    )
+    STORAGE_RANGED_GET_PART_SIZE: int = Field(default=1024 * 1024, description="Tamanho de cada range (bytes)")
+    STORAGE_RANGED_GET_CONCURRENCY: int = Field(default=4, description="Ranges simultâneos por arquivo")
     STORAGE_LOCAL_PATH: str = Field(default="/app/storage", description="Caminho para storage local")
+    STORAGE_STREAMING_ENABLED: bool = Field(
+        default=False,
+        description="Lê claim checks grandes em streaming (gunzip + JSON incremental), em blocos"
+    )
+    STORAGE_STREAMING_MIN_BYTES: int = Field(
+        default=2 * 1024 * 1024,
+        description="Tamanho (comprimido) a partir do qual o claim check é lido em streaming"
+    )
+    STORAGE_STREAM_CHUNK_ITEMS: int = Field(
+        default=500,
+        description="Itens (equipamentos) por bloco persistido no modo streaming"
+    )
     
     # Limpeza de arquivos
     DELETE_FILE_AFTER_PROCESSING: bool = Field(default=True, description="Deletar arquivo após processar")
     FILE_RETENTION_DAYS: int = Field(default=7, description="Dias para manter arquivos não processados")
+    CLEANUP_CONCURRENCY: int = Field(default=4, description="Prefixos de dia/diretórios removidos em paralelo na limpeza")
     
     # Logging
     LOG_LEVEL: str = Field(default="INFO", description="Nível de log")
@@ -0,0 +1,58 @@
+"""
+Migration 034: Fila de retry e dead-letter de mensagens de telemetria
+
+- telemetry_retry_queue: mensagens Kafka que falharam no processamento
+  (status 'retry' com backoff exponencial, 'dead' após MAX_RETRIES)
+"""
+from sqlalchemy import text
+from app.core.database import AsyncSessionLocal
+
+
+async def upgrade():
+    """Aplica a migration."""
+    async with AsyncSessionLocal() as db:
+        try:
+            await db.execute(text("""
+                CREATE TABLE IF NOT EXISTS telemetry_retry_queue (
+                    id BIGSERIAL PRIMARY KEY,
+                    topic VARCHAR(255) NOT NULL,
+                    partition INTEGER NOT NULL,
+                    "offset" BIGINT NOT NULL,
+                    message_key VARCHAR(255),
+                    payload JSONB NOT NULL,
+                    claim_check TEXT,
+                    tenant_id INTEGER,
+                    status VARCHAR(20) NOT NULL DEFAULT 'retry',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error_type VARCHAR(100),
+                    last_error TEXT,
+                    next_retry_at TIMESTAMP NULL,
+                    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+                );
+            """))
+            await db.commit()
+
+            await db.execute(text("""
+                CREATE UNIQUE INDEX IF NOT EXISTS uq_telemetry_retry_queue_message
+                ON telemetry_retry_queue (topic, partition, "offset");
+            """))
+            await db.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_telemetry_retry_queue_due
+                ON telemetry_retry_queue (status, next_retry_at);
+            """))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+
+async def downgrade():
+    """Reverte a migration."""
+    async with AsyncSessionLocal() as db:
+        try:
+            await db.execute(text("DROP TABLE IF EXISTS telemetry_retry_queue;"))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
@@ -0,0 +1,42 @@
+"""
+Migration 035: Deduplicação de uploads de telemetria
+
+- telemetry_upload_dedup: digest de cada item já persistido (por tenant),
+  usado para descartar reenvios do cliente HA. Entradas expiram após
+  DEDUP_TTL_HOURS (limpeza feita pelo próprio worker).
+"""
+from sqlalchemy import text
+from app.core.database import AsyncSessionLocal
+
+
+async def upgrade():
+    """Aplica a migration."""
+    async with AsyncSessionLocal() as db:
+        try:
+            await db.execute(text("""
+                CREATE TABLE IF NOT EXISTS telemetry_upload_dedup (
+                    tenant_id INTEGER NOT NULL,
+                    digest BYTEA NOT NULL,
+                    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                    PRIMARY KEY (tenant_id, digest)
+                );
+            """))
+            await db.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_telemetry_upload_dedup_created_at
+                ON telemetry_upload_dedup (created_at);
+            """))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+
+async def downgrade():
+    """Reverte a migration."""
+    async with AsyncSessionLocal() as db:
+        try:
+            await db.execute(text("DROP TABLE IF EXISTS telemetry_upload_dedup;"))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
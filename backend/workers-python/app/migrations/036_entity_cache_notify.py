@@ -0,0 +1,70 @@
+"""
+Migration 036: Notificação de alterações em equipments/sensors
+
+- Função notify_entity_cache(): envia NOTIFY no canal entity_cache com a
+  chave (tabela, uuid, tenant, org, workspace) da linha alterada/removida.
+- Triggers AFTER UPDATE OR DELETE em equipments e sensors.
+
+Os workers mantêm um cache de resolução uuid -> id por processo e escutam
+o canal para invalidar entradas quando o gateway altera ou remove entidades.
+"""
+from sqlalchemy import text
+from app.core.database import AsyncSessionLocal
+
+
+async def upgrade():
+    """Aplica a migration."""
+    async with AsyncSessionLocal() as db:
+        try:
+            await db.execute(text("""
+                CREATE OR REPLACE FUNCTION notify_entity_cache() RETURNS trigger AS $$
+                BEGIN
+                    PERFORM pg_notify('entity_cache', json_build_object(
+                        'table', TG_TABLE_NAME,
+                        'uuid', OLD.uuid,
+                        'tenant_id', OLD.tenant_id,
+                        'organization_id', OLD.organization_id,
+                        'workspace_id', OLD.workspace_id
+                    )::text);
+                    IF TG_OP = 'UPDATE' AND (
+                        NEW.uuid IS DISTINCT FROM OLD.uuid
+                        OR NEW.tenant_id IS DISTINCT FROM OLD.tenant_id
+                        OR NEW.organization_id IS DISTINCT FROM OLD.organization_id
+                        OR NEW.workspace_id IS DISTINCT FROM OLD.workspace_id
+                    ) THEN
+                        PERFORM pg_notify('entity_cache', json_build_object(
+                            'table', TG_TABLE_NAME,
+                            'uuid', NEW.uuid,
+                            'tenant_id', NEW.tenant_id,
+                            'organization_id', NEW.organization_id,
+                            'workspace_id', NEW.workspace_id
+                        )::text);
+                    END IF;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql;
+            """))
+            for table in ("equipments", "sensors"):
+                await db.execute(text(f"DROP TRIGGER IF EXISTS trg_{table}_entity_cache ON {table};"))
+                await db.execute(text(f"""
+                    CREATE TRIGGER trg_{table}_entity_cache
+                    AFTER UPDATE OR DELETE ON {table}
+                    FOR EACH ROW EXECUTE FUNCTION notify_entity_cache();
+                """))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+
+async def downgrade():
+    """Reverte a migration."""
+    async with AsyncSessionLocal() as db:
+        try:
+            for table in ("equipments", "sensors"):
+                await db.execute(text(f"DROP TRIGGER IF EXISTS trg_{table}_entity_cache ON {table};"))
+            await db.execute(text("DROP FUNCTION IF EXISTS notify_entity_cache();"))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
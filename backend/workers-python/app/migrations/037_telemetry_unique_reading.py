@@ -0,0 +1,56 @@
+"""
+Migration 037: Leitura única por sensor e instante
+
+- Remove leituras repetidas (mesmo sensor_id e timestamp), mantendo a de
+  menor id.
+- uq_telemetry_sensor_timestamp: índice único (sensor_id, timestamp); inclui
+  a coluna de particionamento, então é aceito pelo hypertable. O worker
+  grava com ON CONFLICT DO NOTHING (TELEMETRY_UNIQUE_READINGS).
+
+Buckets dos continuous aggregates que tinham duplicatas só são recalculados
+na próxima atualização que os alcançar.
+"""
+from sqlalchemy import text
+from app.core.database import AsyncSessionLocal
+
+
+async def upgrade():
+    """Aplica a migration."""
+    async with AsyncSessionLocal() as db:
+        try:
+            result = await db.execute(text("""
+                DELETE FROM telemetry_data t
+                USING (
+                    SELECT timestamp, id
+                    FROM (
+                        SELECT
+                            timestamp,
+                            id,
+                            ROW_NUMBER() OVER (PARTITION BY sensor_id, timestamp ORDER BY id) AS rn
+                        FROM telemetry_data
+                    ) ranked
+                    WHERE rn > 1
+                ) dup
+                WHERE t.timestamp = dup.timestamp AND t.id = dup.id;
+            """))
+            if result.rowcount:
+                print(f"🧹 {result.rowcount} leituras duplicadas removidas")
+            await db.execute(text("""
+                CREATE UNIQUE INDEX IF NOT EXISTS uq_telemetry_sensor_timestamp
+                ON telemetry_data (sensor_id, timestamp);
+            """))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+
+async def downgrade():
+    """Reverte a migration."""
+    async with AsyncSessionLocal() as db:
+        try:
+            await db.execute(text("DROP INDEX IF EXISTS uq_telemetry_sensor_timestamp;"))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
@@ -0,0 +1,69 @@
+"""
+Migration 038: Origem da alteração no NOTIFY de invalidação do cache
+
+- notify_entity_cache() inclui no payload o campo origin, lido de
+  easysmart.entity_cache_origin (set_config local à transação; NULL se
+  não definido).
+
+O worker atualiza nome/firmware/unidade etc. pelo fingerprint do payload
+(ENTITY_METADATA_REFRESH_ENABLED) marcando a transação com o id do próprio
+processo. Todos os listeners continuam recebendo a notificação (os outros
+processos precisam descartar metadados e fingerprints antigos); só o
+processo que fez o UPDATE a ignora, para não invalidar a entrada que
+acabou de preencher. Alterações do gateway chegam com origin NULL.
+"""
+from sqlalchemy import text
+from app.core.database import AsyncSessionLocal
+
+
+def _notify_function(extra_fields: str) -> str:
+    def payload(row: str) -> str:
+        return f"""json_build_object(
+                        'table', TG_TABLE_NAME,
+                        'uuid', {row}.uuid,
+                        'tenant_id', {row}.tenant_id,
+                        'organization_id', {row}.organization_id,
+                        'workspace_id', {row}.workspace_id{extra_fields}
+                    )::text"""
+
+    return f"""
+        CREATE OR REPLACE FUNCTION notify_entity_cache() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('entity_cache', {payload('OLD')});
+            IF TG_OP = 'UPDATE' AND (
+                NEW.uuid IS DISTINCT FROM OLD.uuid
+                OR NEW.tenant_id IS DISTINCT FROM OLD.tenant_id
+                OR NEW.organization_id IS DISTINCT FROM OLD.organization_id
+                OR NEW.workspace_id IS DISTINCT FROM OLD.workspace_id
+            ) THEN
+                PERFORM pg_notify('entity_cache', {payload('NEW')});
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """
+
+
+async def upgrade():
+    """Aplica a migration."""
+    async with AsyncSessionLocal() as db:
+        try:
+            await db.execute(text(_notify_function(
+                ",\n                        'origin', "
+                "NULLIF(current_setting('easysmart.entity_cache_origin', true), '')"
+            )))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+
+async def downgrade():
+    """Reverte a migration (função da 036)."""
+    async with AsyncSessionLocal() as db:
+        try:
+            await db.execute(text(_notify_function("")))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
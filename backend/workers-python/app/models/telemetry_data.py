@@ -3,13 +3,14 @@ Modelo de Dados de Telemetria.
 
 Armazena dados de telemetria coletados dos sensores.
 """
-from datetime import datetime
+import json
+from datetime import datetime, timezone
 from typing import Optional, List
 from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
 
 from app.core.database import Base
 
@@ -41,6 +42,8 @@ class TelemetryData(Base):
         Index("idx_equipment_timestamp", "equipment_id", "timestamp"),
         Index("idx_sensor_timestamp", "sensor_id", "timestamp"),
         Index("idx_timestamp", "timestamp"),
+        # Migration 037: uma leitura por sensor e instante
+        Index("uq_telemetry_sensor_timestamp", "sensor_id", "timestamp", unique=True),
     )
     
     def __repr__(self) -> str:
@@ -51,13 +54,189 @@ class TelemetryData(Base):
         cls,
         db: AsyncSession,
         data_list: List[dict],
+        skip_duplicates: bool = False,
     ) -> int:
-        """Insere múltiplos registros de telemetria em bulk."""
+        """
+        Insere múltiplos registros de telemetria em bulk.
+        
+        Com skip_duplicates, usa INSERT ... ON CONFLICT DO NOTHING e retorna
+        só as linhas realmente inseridas.
+        """
         if not data_list:
             return 0
         
+        if skip_duplicates:
+            now = datetime.utcnow()
+            result = await db.execute(
+                pg_insert(cls.__table__)
+                .values([
+                    {
+                        "sensor_id": data["sensor_id"],
+                        "equipment_id": data["equipment_id"],
+                        "tenant_id": data["tenant_id"],
+                        "organization_id": data["organization_id"],
+                        "workspace_id": data["workspace_id"],
+                        "value": data.get("value"),
+                        "status": data.get("status"),
+                        "timestamp": _naive_utc(data["timestamp"]),
+                        # Chave da coluna na tabela (o atributo ORM é extra_metadata)
+                        "metadata": data.get("extra_metadata"),
+                        "created_at": now,
+                    }
+                    for data in data_list
+                ])
+                .on_conflict_do_nothing()
+            )
+            return result.rowcount
+        
         telemetry_objects = [cls(**data) for data in data_list]
         db.add_all(telemetry_objects)
         # Não faz commit aqui, será feito pelo processador
         
         return len(telemetry_objects)
+    
+    # Tabela temporária (por conexão) usada para COPY + ON CONFLICT DO NOTHING
+    STAGING_TABLE = "telemetry_data_staging"
+    
+    # Colunas gravadas pelo COPY (id usa o default da sequence)
+    COPY_COLUMNS = (
+        "sensor_id",
+        "equipment_id",
+        "tenant_id",
+        "organization_id",
+        "workspace_id",
+        "value",
+        "status",
+        "timestamp",
+        "metadata",
+        "created_at",
+    )
+    
+    @classmethod
+    async def copy_insert(
+        cls,
+        db: AsyncSession,
+        data_list: List[dict],
+        skip_duplicates: bool = False,
+    ) -> int:
+        """
+        Insere registros via protocolo COPY (asyncpg copy_records_to_table).
+        
+        Envia tuplas simples, sem criar objetos ORM nem passar pelo flush da
+        unit-of-work. Os registros são ordenados por timestamp para concentrar
+        a escrita em poucos chunks do hypertable. Roda na transação da sessão
+        (o commit continua com o processador). Se o driver não for asyncpg,
+        usa bulk_insert.
+        
+        COPY não aceita ON CONFLICT: com skip_duplicates, os registros vão
+        para uma tabela temporária e seguem para telemetry_data com
+        INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+        """
+        if not data_list:
+            return 0
+        
+        driver = await cls._copy_driver(db)
+        if driver is None:
+            return await cls.bulk_insert(db, data_list, skip_duplicates)
+        
+        now = datetime.utcnow()
+        records = sorted(
+            (
+                (
+                    data["sensor_id"],
+                    data["equipment_id"],
+                    data["tenant_id"],
+                    data["organization_id"],
+                    data["workspace_id"],
+                    data.get("value"),
+                    data.get("status"),
+                    _naive_utc(data["timestamp"]),
+                    json.dumps(data["extra_metadata"]) if data.get("extra_metadata") else None,
+                    now,
+                )
+                for data in data_list
+            ),
+            key=lambda record: record[7],
+        )
+        return await cls._copy_records(driver, records, skip_duplicates)
+    
+    @classmethod
+    async def copy_batch(cls, db: AsyncSession, batch, skip_duplicates: bool = False) -> int:
+        """
+        Insere um TelemetryBatch (app.processors.columnar) via COPY.
+        
+        As tuplas saem direto das colunas do lote, já ordenadas por timestamp.
+        """
+        if not batch:
+            return 0
+        
+        driver = await cls._copy_driver(db)
+        if driver is None:
+            return await cls.bulk_insert(db, batch.to_dicts(), skip_duplicates)
+        
+        records = list(batch.records(datetime.utcnow()))
+        return await cls._copy_records(driver, records, skip_duplicates)
+    
+    @classmethod
+    async def _copy_records(cls, driver, records: List[tuple], skip_duplicates: bool) -> int:
+        """COPY direto na hypertable ou via tabela temporária + ON CONFLICT DO NOTHING."""
+        if not skip_duplicates:
+            await driver.copy_records_to_table(
+                cls.__tablename__,
+                records=records,
+                columns=cls.COPY_COLUMNS,
+            )
+            return len(records)
+        
+        # IF NOT EXISTS: a tabela some se o SAVEPOINT que a criou for desfeito
+        await driver.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS {cls.STAGING_TABLE} (
+                sensor_id INTEGER,
+                equipment_id INTEGER,
+                tenant_id INTEGER,
+                organization_id INTEGER,
+                workspace_id INTEGER,
+                value DOUBLE PRECISION,
+                status VARCHAR(50),
+                timestamp TIMESTAMP,
+                metadata JSONB,
+                created_at TIMESTAMP
+            ) ON COMMIT DELETE ROWS
+        """)
+        await driver.copy_records_to_table(
+            cls.STAGING_TABLE,
+            records=records,
+            columns=cls.COPY_COLUMNS,
+        )
+        columns = ", ".join(cls.COPY_COLUMNS)
+        status = await driver.execute(f"""
+            INSERT INTO {cls.__tablename__} ({columns})
+            SELECT {columns} FROM {cls.STAGING_TABLE}
+            ORDER BY timestamp
+            ON CONFLICT DO NOTHING
+        """)
+        await driver.execute(f"TRUNCATE {cls.STAGING_TABLE}")
+        # Status do asyncpg: "INSERT 0 <linhas>"
+        return int(status.rsplit(" ", 1)[-1])
+    
+    @staticmethod
+    async def _copy_driver(db: AsyncSession):
+        """Conexão asyncpg da sessão (None se o driver não suportar COPY)."""
+        conn = await db.connection()
+        raw = await conn.get_raw_connection()
+        driver = getattr(raw, "driver_connection", None)
+        if driver is None or not hasattr(driver, "copy_records_to_table"):
+            return None
+        
+        if not driver.is_in_transaction():
+            # O adaptador asyncpg do SQLAlchemy abre a transação só no primeiro
+            # comando; sem isso o COPY seria autocommit, fora do commit/rollback da sessão
+            await conn.exec_driver_sql("SELECT 1")
+        return driver
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """Coluna timestamp sem timezone: converte datetimes aware para UTC naive."""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
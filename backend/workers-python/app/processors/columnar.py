@@ -0,0 +1,284 @@
+"""
+Normalização colunar da telemetria de um equipamento.
+
+Em vez de montar um dict por leitura (_prepare_telemetry_data), as
+leituras viram colunas (sensor_id, timestamp, valor, status, bateria,
+RSSI, LQI, tensão da bateria) em uma única passada. Parsing de timestamps
+ISO e conversão do valor para float rodam em lote no NumPy quando ele está
+instalado; sem NumPy, as colunas usam o módulo array e o parsing é feito
+item a item. Os campos de metadata ficam como vieram no payload (gravados
+no JSON sem conversão). O lote alimenta direto o COPY (TelemetryData.copy_batch).
+"""
+import json
+import math
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from app.processors.entity_cache import CachedEquipment
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy é opcional
+    np = None
+
+NAN = float("nan")
+
+# Chave do sensor_data -> chave no metadata gravado
+METADATA_FIELDS = (
+    ("sensor_bateria_pct", "battery"),
+    ("sensor_sinal_rssi", "rssi"),
+    ("sensor_sinal_lqi", "lqi"),
+    ("sensor_voltagem_bateria", "battery_voltage"),
+)
+
+
+def _parse_one(value: Any, now: datetime) -> datetime:
+    """Parsing ISO de um timestamp (UTC naive); inválido/ausente vira now."""
+    if not value:
+        return now
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (ValueError, AttributeError, TypeError):
+        return now
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _has_offset(value: str) -> bool:
+    """Offset explícito após a parte de hora (ex.: ...T12:00:00-03:00)."""
+    separator = max(value.find("T"), value.find(" "))
+    if separator == -1:
+        return False
+    time_part = value[separator:]
+    return "+" in time_part or "-" in time_part
+
+
+def parse_timestamps(raw: Sequence[Any], now: datetime) -> Sequence[datetime]:
+    """
+    Converte timestamps ISO em lote (UTC naive).
+
+    Com NumPy, strings sem offset (ou com "Z") são convertidas de uma vez para
+    datetime64[us]; as que têm offset ou não parseiam caem no caminho item a item.
+    """
+    if np is None:
+        return [_parse_one(value, now) for value in raw]
+
+    now64 = np.datetime64(now, "us")
+    result = np.full(len(raw), now64, dtype="datetime64[us]")
+    fast_index: List[int] = []
+    fast_text: List[str] = []
+    slow_index: List[int] = []
+    for index, value in enumerate(raw):
+        if not value or not isinstance(value, str):
+            continue
+        if value.endswith("Z"):
+            fast_index.append(index)
+            fast_text.append(value[:-1])
+        elif _has_offset(value):
+            slow_index.append(index)
+        else:
+            fast_index.append(index)
+            fast_text.append(value)
+
+    if fast_index:
+        try:
+            result[fast_index] = np.array(fast_text, dtype="datetime64[us]")
+        except ValueError:
+            # Algum valor malformado: resolve o lote item a item
+            slow_index.extend(fast_index)
+    for index in slow_index:
+        result[index] = np.datetime64(_parse_one(raw[index], now), "us")
+    return result
+
+
+def _float_or_nan(value: Any) -> float:
+    if value is None or isinstance(value, (dict, list)):
+        return NAN
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def coerce_floats(raw: Sequence[Any]):
+    """Converte valores para float em lote; ausente/não numérico vira NaN."""
+    if np is not None:
+        try:
+            return np.array([NAN if value is None else value for value in raw], dtype=np.float64)
+        except (TypeError, ValueError):
+            return np.array([_float_or_nan(value) for value in raw], dtype=np.float64)
+    return array("d", (_float_or_nan(value) for value in raw))
+
+
+def _is_nan(value: float) -> bool:
+    return value != value
+
+
+class TelemetryBatch:
+    """Leituras de um equipamento em colunas."""
+
+    __slots__ = (
+        "equipment",
+        "sensor_ids",
+        "timestamps",
+        "values",
+        "statuses",
+        "battery",
+        "rssi",
+        "lqi",
+        "battery_voltage",
+    )
+
+    def __init__(self, equipment: CachedEquipment):
+        self.equipment = equipment
+        self.sensor_ids = array("q")
+        self.timestamps: Sequence[datetime] = []
+        self.values = array("d")
+        self.statuses: List[Optional[str]] = []
+        # Metadata: valores brutos do payload (None = ausente)
+        self.battery: List[Any] = []
+        self.rssi: List[Any] = []
+        self.lqi: List[Any] = []
+        self.battery_voltage: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self.sensor_ids)
+
+    def __bool__(self) -> bool:
+        return len(self.sensor_ids) > 0
+
+    @classmethod
+    def build(
+        cls,
+        equipment: CachedEquipment,
+        sensor_ids: Sequence[int],
+        readings: Sequence[Dict[str, Any]],
+    ) -> "TelemetryBatch":
+        """Monta o lote a partir dos sensor_data (mesma semântica de _prepare_telemetry_data)."""
+        batch = cls(equipment)
+        batch.sensor_ids = array("q", sensor_ids)
+
+        raw_timestamps = []
+        raw_values = []
+        direct = []
+        statuses = []
+        metadata_raw = [[] for _ in METADATA_FIELDS]
+        for sensor_data in readings:
+            raw_timestamps.append(
+                sensor_data.get("sensor_datahora_coleta") or sensor_data.get("timestamp")
+            )
+            valor = sensor_data.get("valor")
+            direct.append(valor is not None)
+            raw_values.append(valor if valor is not None else sensor_data.get("sensor_telemetria"))
+            statuses.append(sensor_data.get("status"))
+            for column, (key, _) in zip(metadata_raw, METADATA_FIELDS):
+                column.append(sensor_data.get(key))
+
+        batch.timestamps = parse_timestamps(raw_timestamps, datetime.utcnow())
+        batch.values = coerce_floats(raw_values)
+        # sensor_telemetria textual (ex.: "on") vai para o status
+        for index, value in enumerate(batch.values.tolist()):
+            if _is_nan(value) and not direct[index] and isinstance(raw_values[index], str):
+                statuses[index] = raw_values[index]
+        batch.statuses = statuses
+        batch.battery, batch.rssi, batch.lqi, batch.battery_voltage = metadata_raw
+        return batch
+
+    def dedupe(self) -> int:
+        """
+        Remove leituras repetidas (mesmo sensor_id e timestamp), mantendo a
+        primeira. Retorna quantas foram removidas.
+        """
+        timestamps = self.timestamps
+        if np is not None and isinstance(timestamps, np.ndarray):
+            timestamps = timestamps.tolist()
+        seen = set()
+        keep: List[int] = []
+        for index, key in enumerate(zip(self.sensor_ids.tolist(), timestamps)):
+            if key not in seen:
+                seen.add(key)
+                keep.append(index)
+        removed = len(self) - len(keep)
+        if removed:
+            self._take(keep)
+        return removed
+
+    def _take(self, indices: List[int]) -> None:
+        """Mantém só as leituras dos índices informados (em ordem)."""
+        def take(column):
+            if np is not None and isinstance(column, np.ndarray):
+                return column[indices]
+            if isinstance(column, array):
+                return array(column.typecode, (column[index] for index in indices))
+            return [column[index] for index in indices]
+
+        for name in self.__slots__[1:]:
+            setattr(self, name, take(getattr(self, name)))
+
+    def order(self) -> Sequence[int]:
+        """Índices das leituras em ordem de timestamp."""
+        if np is not None:
+            return np.argsort(np.asarray(self.timestamps), kind="stable").tolist()
+        return sorted(range(len(self)), key=self.timestamps.__getitem__)
+
+    def _columns(self):
+        timestamps = self.timestamps
+        if np is not None and isinstance(timestamps, np.ndarray):
+            timestamps = timestamps.tolist()
+        return (
+            self.sensor_ids.tolist(),
+            timestamps,
+            self.values.tolist(),
+            self.statuses,
+            (self.battery, self.rssi, self.lqi, self.battery_voltage),
+        )
+
+    @staticmethod
+    def _metadata(metadata_columns, index: int) -> Optional[Dict[str, Any]]:
+        metadata = {}
+        for column, (_, name) in zip(metadata_columns, METADATA_FIELDS):
+            value = column[index]
+            if value is not None:
+                metadata[name] = value
+        return metadata or None
+
+    def records(self, created_at: datetime) -> Iterator[tuple]:
+        """Tuplas na ordem de TelemetryData.COPY_COLUMNS, ordenadas por timestamp."""
+        sensor_ids, timestamps, values, statuses, metadata_columns = self._columns()
+        equipment = self.equipment
+        for index in self.order():
+            value = values[index]
+            metadata = self._metadata(metadata_columns, index)
+            yield (
+                sensor_ids[index],
+                equipment.id,
+                equipment.tenant_id,
+                equipment.organization_id,
+                equipment.workspace_id,
+                None if math.isnan(value) else value,
+                statuses[index],
+                timestamps[index],
+                json.dumps(metadata) if metadata else None,
+                created_at,
+            )
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Formato de _prepare_telemetry_data (ORM, sinks de arquivo)."""
+        sensor_ids, timestamps, values, statuses, metadata_columns = self._columns()
+        equipment = self.equipment
+        return [
+            {
+                "sensor_id": sensor_ids[index],
+                "equipment_id": equipment.id,
+                "tenant_id": equipment.tenant_id,
+                "organization_id": equipment.organization_id,
+                "workspace_id": equipment.workspace_id,
+                "value": None if math.isnan(values[index]) else values[index],
+                "status": statuses[index],
+                "timestamp": timestamps[index],
+                "extra_metadata": self._metadata(metadata_columns, index),
+            }
+            for index in range(len(sensor_ids))
+        ]
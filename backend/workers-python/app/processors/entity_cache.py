@@ -0,0 +1,198 @@
+"""
+Cache de resolução de equipamentos e sensores (uuid -> id).
+
+Compartilhado pelo processo inteiro: em regime, todo item de telemetria
+vem de um equipamento/sensor já visto milhares de vezes, então a
+resolução não precisa ir ao banco. O cache é limitado (LRU) e cada
+entrada expira após ENTITY_CACHE_TTL_SECONDS.
+
+Invalidação: a migration 036 cria triggers que enviam NOTIFY no canal
+entity_cache quando um equipamento/sensor é alterado ou removido; o
+listener (run_invalidation_listener) remove a chave correspondente. Se a
+conexão do listener cair, o cache é esvaziado (notificações podem ter
+sido perdidas). A atualização de metadados feita pelo worker marca a
+transação com NOTIFY_ORIGIN_SETTING = notify_origin() (migration 038): os
+outros processos invalidam a entrada normalmente, e o próprio processo
+ignora a notificação, que invalidaria a entrada que ele acabou de preencher.
+"""
+import asyncio
+import json
+import os
+import socket
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger(__name__)
+
+NOTIFY_CHANNEL = "entity_cache"
+# set_config local à transação com a origem (processo) do UPDATE notificado
+NOTIFY_ORIGIN_SETTING = "easysmart.entity_cache_origin"
+
+KIND_EQUIPMENT = "equipments"
+KIND_SENSOR = "sensors"
+
+
+@dataclass(frozen=True)
+class CachedEquipment:
+    """Campos do equipamento usados na ingestão."""
+
+    id: int
+    tenant_id: int
+    organization_id: int
+    workspace_id: int
+    # Hash dos metadados do payload já gravados (None: desconhecido/desatualizado)
+    fingerprint: Optional[bytes] = None
+
+
+@dataclass(frozen=True)
+class CachedSensor:
+    """Campos do sensor usados na ingestão."""
+
+    id: int
+    equipment_id: int
+    fingerprint: Optional[bytes] = None
+
+
+def notify_origin() -> str:
+    """Identifica este processo nas notificações (host + pid)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def entity_key(kind: str, uuid: str, tenant_id: int, organization_id: int, workspace_id: int) -> Tuple:
+    """Chave do cache: (tabela, uuid, tenant, org, workspace)."""
+    return (kind, uuid, tenant_id, organization_id, workspace_id)
+
+
+class EntityCache:
+    """LRU com TTL por entrada e contadores de hit/miss."""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.origin = notify_origin()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Retorna o valor em cache (ou None se ausente/expirado)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Insere/atualiza uma entrada, removendo a menos usada se lotado."""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """Remove uma entrada (se existir)."""
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        """Esvazia o cache (contadores são mantidos)."""
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores cumulativos (somáveis entre processos)."""
+        return {
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_evictions": self.evictions,
+            "cache_invalidations": self.invalidations,
+            "cache_size": len(self._entries),
+        }
+
+    def handle_notification(self, payload: str) -> None:
+        """Aplica uma notificação do canal entity_cache (ignora as deste processo)."""
+        try:
+            data = json.loads(payload)
+            if data.get("origin") == self.origin:
+                return
+            key = entity_key(
+                data["table"],
+                data["uuid"],
+                data["tenant_id"],
+                data["organization_id"],
+                data["workspace_id"],
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warn("Notificação de cache inválida, esvaziando cache", error=str(e))
+            self.clear()
+            return
+        self.invalidate(key)
+
+
+def _listener_dsn() -> str:
+    """DATABASE_URL no formato aceito pelo asyncpg."""
+    return settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+async def run_invalidation_listener(cache: "EntityCache") -> None:
+    """
+    Escuta o canal entity_cache e invalida entradas (roda até ser cancelada).
+
+    Usa uma conexão asyncpg dedicada, fora do pool do SQLAlchemy.
+    """
+    import asyncpg
+
+    delay = 1.0
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(_listener_dsn())
+            await conn.add_listener(
+                NOTIFY_CHANNEL,
+                lambda _conn, _pid, _channel, payload: cache.handle_notification(payload),
+            )
+            # Entradas resolvidas antes do LISTEN podem ter perdido notificações
+            cache.clear()
+            logger.info("Listener de invalidação do cache iniciado", channel=NOTIFY_CHANNEL)
+            delay = 1.0
+            while not conn.is_closed():
+                await asyncio.sleep(5)
+            logger.warn("Conexão do listener de cache encerrada, reconectando")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warn("Erro no listener de invalidação do cache", error=str(e), retry_in=delay)
+        finally:
+            if conn is not None and not conn.is_closed():
+                try:
+                    await conn.close()
+                except Exception:
+                    pass
+        cache.clear()
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 60.0)
+
+
+entity_cache = EntityCache(
+    max_size=settings.ENTITY_CACHE_MAX_SIZE,
+    ttl_seconds=settings.ENTITY_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,272 @@
+"""
+Refresh dirigido dos continuous aggregates para dados atrasados.
+
+As políticas da migration 004 só recalculam telemetry_hourly nos últimos
+3 dias e telemetry_daily nos últimos 7: leituras mais antigas (cliente HA
+que volta após uma queda longa) nunca seriam materializadas. O processador
+registra aqui o min/max dos timestamps gravados por chunk do hypertable
+(1 dia, migration 002) que estão fora dessas janelas; o loop de refresh
+junta dias contíguos em janelas e chama refresh_continuous_aggregate só
+para elas, a cada LATE_DATA_REFRESH_INTERVAL_SECONDS.
+
+Janelas anteriores à retenção de telemetry_data (30 dias, migration 004)
+não são recalculadas: os chunks brutos desses buckets já foram removidos e
+o refresh sobrescreveria o agregado histórico com só as leituras atrasadas.
+"""
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import structlog
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy é opcional
+    np = None
+
+logger = structlog.get_logger(__name__)
+
+CAGG_HOURLY = "telemetry_hourly"
+CAGG_DAILY = "telemetry_daily"
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _floor_day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _ceil_hour(value: datetime) -> datetime:
+    floor = _floor_hour(value)
+    return floor if floor == value else floor + HOUR
+
+
+def _ceil_day(value: datetime) -> datetime:
+    floor = _floor_day(value)
+    return floor if floor == value else floor + DAY
+
+
+class LateDataTracker:
+    """Min/max dos timestamps atrasados gravados, por chunk (dia)."""
+
+    def __init__(
+        self,
+        hourly_horizon: timedelta,
+        daily_horizon: timedelta,
+        retention: Optional[timedelta] = None,
+    ):
+        self.hourly_horizon = hourly_horizon
+        self.daily_horizon = daily_horizon
+        # Dados brutos mais antigos que isso já foram removidos (None = sem retenção)
+        self.retention = retention
+        self._chunks: Dict[date, Tuple[datetime, datetime]] = {}
+        self.refreshes = 0
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    @property
+    def horizon(self) -> timedelta:
+        """Menor janela das políticas: abaixo dela algum CAGG fica sem refresh."""
+        return min(self.hourly_horizon, self.daily_horizon)
+
+    def record(self, timestamps: Sequence[datetime]) -> None:
+        """
+        Registra os timestamps (UTC) de leituras já commitadas.
+
+        Caso comum (lote recente): só o mínimo do lote é comparado com o
+        horizonte. Colunas NumPy (TelemetryBatch) são agrupadas por dia
+        vetorizado, com um _add por dia atrasado em vez de um por leitura.
+        """
+        if not len(timestamps):
+            return
+        cutoff = datetime.utcnow() - self.horizon
+        if np is not None and isinstance(timestamps, np.ndarray):
+            self._record_array(timestamps, cutoff)
+            return
+        values = [_naive_utc(value) for value in timestamps]
+        if min(values) >= cutoff:
+            return
+        for value in values:
+            if value < cutoff:
+                self._add(value, value)
+
+    def _record_array(self, timestamps, cutoff: datetime) -> None:
+        timestamps = timestamps.astype("datetime64[us]", copy=False)
+        cutoff64 = np.datetime64(cutoff, "us")
+        if timestamps.min() >= cutoff64:
+            return
+        late = np.sort(timestamps[timestamps < cutoff64])
+        # Primeiro/último índice de cada dia no vetor ordenado
+        _, first = np.unique(late.astype("datetime64[D]"), return_index=True)
+        last = np.append(first[1:], len(late)) - 1
+        for start, end in zip(late[first].tolist(), late[last].tolist()):
+            self._add(start, end)
+
+    def _add(self, start: datetime, end: datetime) -> None:
+        day = start.date()
+        current = self._chunks.get(day)
+        if current is not None:
+            start = min(start, current[0])
+            end = max(end, current[1])
+        self._chunks[day] = (start, end)
+
+    def restore(self, windows: List[Tuple[datetime, datetime]]) -> None:
+        """Devolve janelas cujo refresh falhou (tentadas no próximo ciclo)."""
+        for start, end in windows:
+            day = start.date()
+            while day <= end.date():
+                day_start = datetime.combine(day, datetime.min.time())
+                self._add(max(start, day_start), min(end, day_start + DAY - timedelta(microseconds=1)))
+                day += timedelta(days=1)
+
+    def drain(self) -> List[Tuple[datetime, datetime]]:
+        """Retira as pendências, juntando dias contíguos em janelas (min, max)."""
+        windows: List[Tuple[datetime, datetime]] = []
+        for day in sorted(self._chunks):
+            start, end = self._chunks[day]
+            if windows and windows[-1][1].date() + timedelta(days=1) >= day:
+                windows[-1] = (windows[-1][0], end)
+            else:
+                windows.append((start, end))
+        self._chunks.clear()
+        return windows
+
+
+_autocommit_engine = None
+
+
+def _engine():
+    """Engine AUTOCOMMIT: refresh_continuous_aggregate não roda em transação."""
+    global _autocommit_engine
+    if _autocommit_engine is None:
+        _autocommit_engine = create_async_engine(
+            settings.DATABASE_URL,
+            isolation_level="AUTOCOMMIT",
+            pool_size=1,
+            max_overflow=0,
+            pool_pre_ping=True,
+        )
+    return _autocommit_engine
+
+
+def _refresh_plan(
+    tracker: LateDataTracker,
+    windows: List[Tuple[datetime, datetime]],
+) -> List[Tuple[str, datetime, datetime]]:
+    """
+    (CAGG, início, fim) alinhados aos buckets, só para o que as políticas não cobrem.
+
+    O início é limitado ao primeiro bucket inteiro dentro da retenção; janelas
+    totalmente anteriores a ela ficam de fora.
+    """
+    now = datetime.utcnow()
+    oldest = now - tracker.retention if tracker.retention is not None else None
+    plan = []
+    for start, end in windows:
+        if start < now - tracker.hourly_horizon:
+            first = _floor_hour(start)
+            if oldest is not None:
+                first = max(first, _ceil_hour(oldest))
+            last = _floor_hour(end) + HOUR
+            if first < last:
+                plan.append((CAGG_HOURLY, first, last))
+        if start < now - tracker.daily_horizon:
+            first = _floor_day(start)
+            if oldest is not None:
+                first = max(first, _ceil_day(oldest))
+            last = _floor_day(end) + DAY
+            if first < last:
+                plan.append((CAGG_DAILY, first, last))
+    return plan
+
+
+async def refresh_late_aggregates(tracker: LateDataTracker) -> int:
+    """Executa os refreshes pendentes. Retorna quantos foram feitos."""
+    windows = tracker.drain()
+    if not windows:
+        return 0
+    done = 0
+    failed: List[Tuple[datetime, datetime]] = []
+    pending = list(windows)
+    try:
+        async with _engine().connect() as conn:
+            while pending:
+                window = pending[0]
+                try:
+                    for cagg, start, end in _refresh_plan(tracker, [window]):
+                        await conn.execute(
+                            text(
+                                f"CALL refresh_continuous_aggregate('{cagg}', "
+                                "CAST(:start AS TIMESTAMP), CAST(:end AS TIMESTAMP))"
+                            ),
+                            {"start": start, "end": end},
+                        )
+                        done += 1
+                        logger.info(
+                            "Continuous aggregate atualizado para dados atrasados",
+                            cagg=cagg,
+                            start=start.isoformat(),
+                            end=end.isoformat(),
+                        )
+                except Exception as e:
+                    failed.append(window)
+                    logger.warn(
+                        "Erro no refresh de dados atrasados",
+                        start=window[0].isoformat(),
+                        end=window[1].isoformat(),
+                        error=str(e),
+                    )
+                pending.pop(0)
+    finally:
+        # Falhas e o que não chegou a rodar (conexão indisponível, cancelamento)
+        tracker.restore(failed + pending)
+    tracker.refreshes += done
+    return done
+
+
+async def run_refresh_loop(tracker: LateDataTracker, interval: Optional[float] = None) -> None:
+    """Loop de refresh (roda até ser cancelado)."""
+    interval = interval or settings.LATE_DATA_REFRESH_INTERVAL_SECONDS
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh_late_aggregates(tracker)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warn("Erro no loop de refresh de dados atrasados", error=str(e))
+
+
+
+async def close() -> None:
+    """Fecha a engine AUTOCOMMIT (se criada)."""
+    global _autocommit_engine
+    if _autocommit_engine is not None:
+        await _autocommit_engine.dispose()
+        _autocommit_engine = None
+
+
+late_data_tracker = LateDataTracker(
+    hourly_horizon=timedelta(hours=settings.LATE_DATA_HOURLY_HORIZON_HOURS),
+    daily_horizon=timedelta(days=settings.LATE_DATA_DAILY_HORIZON_DAYS),
+    retention=(
+        timedelta(days=settings.LATE_DATA_RETENTION_DAYS)
+        if settings.LATE_DATA_RETENTION_DAYS > 0 else None
+    ),
+)
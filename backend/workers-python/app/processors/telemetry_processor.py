@@ -3,22 +3,64 @@ Processador de telemetria.
 
 Processa dados de telemetria recebidos do Kafka e insere no banco de dados.
 """
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
+import hashlib
+from dataclasses import replace
+
 import structlog
 
-from app.models.equipment import Equipment
-from app.models.sensor import Sensor
-from app.models.telemetry_data import TelemetryData
+from app.processors.columnar import TelemetryBatch
+from app.processors.late_data import late_data_tracker
+from app.processors.entity_cache import (
+    KIND_EQUIPMENT,
+    KIND_SENSOR,
+    NOTIFY_ORIGIN_SETTING,
+    CachedEquipment,
+    CachedSensor,
+    entity_cache,
+    entity_key,
+)
+from app.sinks import TelemetrySink, create_sink, get_sink
 from app.core.config import settings
 
 logger = structlog.get_logger(__name__)
 
 
+class _BisectAborted(Exception):
+    """Falhas demais no isolamento de um lote: descarta o equipamento inteiro."""
+
+
 class TelemetryProcessor:
     """Processador de dados de telemetria."""
     
+    def __init__(
+        self,
+        sink: Optional[TelemetrySink] = None,
+        shadow_sink: Optional[TelemetrySink] = None,
+    ):
+        """
+        Args:
+            sink: Destino dos registros (padrão: TELEMETRY_SINK)
+            shadow_sink: Destino secundário, gravado (e commitado, se
+                transacional) após o commit do principal (padrão:
+                TELEMETRY_SHADOW_SINK); falhas nele só geram log
+        """
+        self.sink = sink or get_sink()
+        if shadow_sink is None and settings.TELEMETRY_SHADOW_SINK:
+            shadow_sink = create_sink(settings.TELEMETRY_SHADOW_SINK)
+        if shadow_sink is not None and shadow_sink.name == self.sink.name:
+            raise ValueError(f"Sink secundário igual ao principal: {shadow_sink.name}")
+        self.shadow_sink = shadow_sink
+    
+    async def close(self) -> None:
+        """Descarrega os sinks (segmentos de arquivo pendentes)."""
+        await self.sink.close()
+        if self.shadow_sink is not None:
+            await self.shadow_sink.close()
+    
     async def process_bulk(
         self,
         tenant_id: int,
@@ -36,7 +78,8 @@ class TelemetryProcessor:
             db: Sessão do banco de dados
             
         Returns:
-            Dicionário com resultado do processamento
+            Dicionário com resultado do processamento; written_equipments
+            traz os equip_uuid cujas leituras foram efetivamente gravadas
         """
         processed = 0
         inserted = 0
@@ -53,197 +96,850 @@ class TelemetryProcessor:
         equipment_map: Dict[str, Dict[str, Any]] = {}
         
         for item in telemetry_data:
-            try:
-                equip_uuid = item.get("equip_uuid")
-                if not equip_uuid:
-                    errors.append("Item sem equip_uuid")
+            equip_uuid = item.get("equip_uuid")
+            if not equip_uuid:
+                errors.append("Item sem equip_uuid")
+                continue
+            
+            # Inicializar estrutura do equipamento se não existir
+            if equip_uuid not in equipment_map:
+                equipment_map[equip_uuid] = {
+                    "item": item,  # Primeiro item: dados para criar o equipamento
+                    "items": 0,
+                    "sensors": {},  # sensor_uuid -> primeiro sensor_data
+                    "readings": [],
+                    "telemetry_data": [],
+                }
+            entry = equipment_map[equip_uuid]
+            entry["items"] += 1
+            
+            sensors_data = item.get("sensor", [])
+            if not isinstance(sensors_data, list):
+                sensors_data = [sensors_data]
+            
+            for sensor_data in sensors_data:
+                sensor_uuid = sensor_data.get("sensor_uuid")
+                if not sensor_uuid:
                     continue
-                
-                # Inicializar estrutura do equipamento se não existir
-                if equip_uuid not in equipment_map:
-                    equipment_map[equip_uuid] = {
-                        "equipment": None,
-                        "sensors": {},
-                        "telemetry_data": [],
-                    }
-                
-                # Processar equipamento
-                equipment = equipment_map[equip_uuid]["equipment"]
-                if equipment is None:
-                    equipment = await self._get_or_create_equipment(
-                        tenant_id,
-                        organization_id,
-                        workspace_id,
-                        item,
-                        db,
-                    )
-                    equipment_map[equip_uuid]["equipment"] = equipment
-                
-                # Processar sensores
-                sensors_data = item.get("sensor", [])
-                if not isinstance(sensors_data, list):
-                    sensors_data = [sensors_data]
-                
-                for sensor_data in sensors_data:
-                    sensor_uuid = sensor_data.get("sensor_uuid")
-                    if not sensor_uuid:
-                        continue
-                    
-                    if sensor_uuid not in equipment_map[equip_uuid]["sensors"]:
-                        sensor = await self._get_or_create_sensor(
-                            equipment,
-                            sensor_data,
-                            item,  # Passar item completo para pegar tipo se necessário
-                            db,
-                        )
-                        equipment_map[equip_uuid]["sensors"][sensor_uuid] = sensor
-                    else:
-                        sensor = equipment_map[equip_uuid]["sensors"][sensor_uuid]
-                    
-                    # Preparar dados de telemetria
-                    telemetry_item = self._prepare_telemetry_data(
-                        sensor.id,
-                        equipment,
-                        sensor_data,
+                entry["sensors"].setdefault(sensor_uuid, sensor_data)
+                entry["readings"].append((sensor_uuid, sensor_data))
+        
+        if not equipment_map:
+            return {
+                "processed": 0,
+                "inserted": 0,
+                "written_equipments": set(),
+                "errors": errors if errors else None,
+            }
+        
+        # Resolver equipamentos e sensores do payload inteiro (uma consulta
+        # por tabela) e commitar os criados antes de inserir a telemetria.
+        # Falha aqui (ex.: banco indisponível) sobe para o consumidor, que
+        # manda a mensagem inteira para retry/DLQ.
+        try:
+            equipments, sensors = await self._resolve_entities(
+                tenant_id,
+                organization_id,
+                workspace_id,
+                equipment_map,
+                db,
+                errors,
+            )
+        except Exception as e:
+            await db.rollback()
+            logger.error("Erro ao resolver equipamentos/sensores", error=str(e))
+            raise
+        
+        mismatched = set()
+        columnar = settings.TELEMETRY_COLUMNAR_ENABLED
+        unique_readings = settings.TELEMETRY_UNIQUE_READINGS
+        duplicate_readings = 0
+        for equip_uuid, data in equipment_map.items():
+            equipment = equipments.get(equip_uuid)
+            if equipment is None:
+                continue
+            processed += data["items"]
+            sensor_ids: List[int] = []
+            readings: List[Dict[str, Any]] = []
+            for sensor_uuid, sensor_data in data["readings"]:
+                sensor = sensors.get(sensor_uuid)
+                if sensor is None:
+                    continue
+                if sensor.equipment_id != equipment.id:
+                    if sensor_uuid not in mismatched:
+                        mismatched.add(sensor_uuid)
+                        errors.append(f"Sensor {sensor_uuid} não pertence ao equipamento")
+                    continue
+                if columnar:
+                    sensor_ids.append(sensor.id)
+                    readings.append(sensor_data)
+                else:
+                    data["telemetry_data"].append(
+                        self._prepare_telemetry_data(sensor.id, equipment, sensor_data)
                     )
-                    equipment_map[equip_uuid]["telemetry_data"].append(telemetry_item)
-                
-                processed += 1
-            
-            except Exception as e:
-                error_msg = f"Erro ao processar item: {str(e)}"
-                logger.error(error_msg, exc_info=e)
-                errors.append(error_msg)
+            if columnar and sensor_ids:
+                # Normalização em lote (uma passada, sem dict por leitura)
+                data["telemetry_data"] = TelemetryBatch.build(equipment, sensor_ids, readings)
+            if unique_readings and data["telemetry_data"]:
+                # Mesma leitura enviada duas vezes (mudança de estado + coleta periódica)
+                if columnar:
+                    duplicate_readings += data["telemetry_data"].dedupe()
+                else:
+                    data["telemetry_data"], removed = self._dedupe_records(data["telemetry_data"])
+                    duplicate_readings += removed
+        
+        if duplicate_readings:
+            logger.debug("Leituras duplicadas descartadas no payload", count=duplicate_readings)
         
         # Inserir dados de telemetria em bulk por equipamento
-        for equip_uuid, data in equipment_map.items():
-            if data["telemetry_data"]:
-                try:
-                    # Dividir em batches para otimizar
-                    batch_size = settings.BULK_INSERT_BATCH_SIZE
-                    for i in range(0, len(data["telemetry_data"]), batch_size):
-                        batch = data["telemetry_data"][i:i + batch_size]
-                        inserted_count = await TelemetryData.bulk_insert(db, batch)
-                        inserted += inserted_count
-                    
-                    # Commit após cada equipamento
-                    await db.commit()
-                except Exception as e:
-                    await db.rollback()
-                    error_msg = f"Erro ao inserir telemetria para {equip_uuid}: {str(e)}"
-                    logger.error(error_msg, exc_info=e)
-                    errors.append(error_msg)
+        if settings.TELEMETRY_COMMIT_MODE == "payload":
+            written = await self._write_payload(equipment_map, db, errors)
+        else:
+            written = await self._write_per_equipment(equipment_map, db, errors)
+        inserted = sum(count for _, _, count in written)
+        
+        if settings.LATE_DATA_REFRESH_ENABLED and self.sink.transactional:
+            # Já commitado: leituras antigas agendam refresh dos continuous aggregates
+            for _, records, count in written:
+                if count:
+                    late_data_tracker.record(
+                        records.timestamps if isinstance(records, TelemetryBatch)
+                        else [record["timestamp"] for record in records]
+                    )
+        
+        if self.shadow_sink is not None:
+            await self._write_shadow(written, db)
         
         return {
             "processed": processed,
             "inserted": inserted,
+            "duplicate_readings": duplicate_readings,
+            "written_equipments": {equip_uuid for equip_uuid, _, _ in written},
             "errors": errors if errors else None,
         }
     
-    async def _get_or_create_equipment(
+    async def _write_shadow(self, written: List[Tuple[str, Any, int]], db: AsyncSession) -> None:
+        """
+        Grava no sink secundário o que o principal gravou.
+        
+        O principal já commitou: um shadow transacional grava cada
+        equipamento em um SAVEPOINT e é commitado aqui.
+        """
+        transactional = self.shadow_sink.transactional
+        for equip_uuid, records, _ in written:
+            try:
+                if transactional:
+                    async with db.begin_nested():
+                        await self._write(self.shadow_sink, db, records)
+                else:
+                    await self._write(self.shadow_sink, db, records)
+            except Exception as e:
+                logger.warn(
+                    "Erro no sink secundário",
+                    sink=self.shadow_sink.name,
+                    equip_uuid=equip_uuid,
+                    error=str(e),
+                )
+        
+        if transactional:
+            try:
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                logger.warn("Erro no commit do sink secundário", sink=self.shadow_sink.name, error=str(e))
+    
+    @staticmethod
+    def _dedupe_records(records: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """Remove registros com o mesmo (sensor_id, timestamp), mantendo o primeiro."""
+        seen = set()
+        unique: List[Dict[str, Any]] = []
+        for record in records:
+            timestamp = record["timestamp"]
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+            key = (record["sensor_id"], timestamp)
+            if key not in seen:
+                seen.add(key)
+                unique.append(record)
+        return unique, len(records) - len(unique)
+    
+    async def _write_per_equipment(
+        self,
+        equipment_map: Dict[str, Dict[str, Any]],
+        db: AsyncSession,
+        errors: List[str],
+    ) -> List[Tuple[str, Any, int]]:
+        """Um commit por equipamento (TELEMETRY_COMMIT_MODE=equipment)."""
+        written: List[Tuple[str, Any, int]] = []
+        for equip_uuid, data in equipment_map.items():
+            if not data["telemetry_data"]:
+                continue
+            try:
+                count = await self._write(self.sink, db, data["telemetry_data"])
+                
+                # Commit após cada equipamento
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                recovered = await self._recover_failed_write(db, equip_uuid, data["telemetry_data"], e, errors)
+                if recovered is None:
+                    continue
+                try:
+                    await db.commit()
+                except Exception as exc:
+                    await db.rollback()
+                    errors.append(f"Erro ao inserir telemetria para {equip_uuid}: {str(exc)}")
+                    continue
+                written.append((equip_uuid, *recovered))
+                continue
+            written.append((equip_uuid, data["telemetry_data"], count))
+        return written
+    
+    async def _write_payload(
+        self,
+        equipment_map: Dict[str, Dict[str, Any]],
+        db: AsyncSession,
+        errors: List[str],
+    ) -> List[Tuple[str, Any, int]]:
+        """
+        Uma transação para o payload inteiro (TELEMETRY_COMMIT_MODE=payload).
+        
+        Cada equipamento roda em um SAVEPOINT: uma falha desfaz só aquele
+        equipamento. Se o commit final falhar, nada foi gravado e a exceção
+        sobe (a mensagem vai para retry inteira).
+        """
+        written: List[Tuple[str, Any, int]] = []
+        for equip_uuid, data in equipment_map.items():
+            if not data["telemetry_data"]:
+                continue
+            try:
+                async with db.begin_nested():
+                    count = await self._write(self.sink, db, data["telemetry_data"])
+            except Exception as e:
+                recovered = await self._recover_failed_write(db, equip_uuid, data["telemetry_data"], e, errors)
+                if recovered is not None:
+                    written.append((equip_uuid, *recovered))
+                continue
+            written.append((equip_uuid, data["telemetry_data"], count))
+        
+        try:
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        return written
+    
+    async def _recover_failed_write(
+        self,
+        db: AsyncSession,
+        equip_uuid: str,
+        telemetry_data,
+        error: Exception,
+        errors: List[str],
+    ) -> Optional[Tuple[List[Dict[str, Any]], int]]:
+        """
+        Isola as leituras que fizeram a gravação de um equipamento falhar.
+        
+        O lote é dividido ao meio recursivamente, cada metade em um SAVEPOINT,
+        até chegar às leituras problemáticas, que são reportadas em errors com
+        o motivo; as demais ficam gravadas na transação corrente (o commit
+        continua com quem chamou). Se mais de TELEMETRY_BISECT_MAX_FAILED
+        leituras falharem (erro sistêmico, ex.: banco indisponível), tudo o
+        que foi gravado na recuperação é desfeito.
+        
+        Returns:
+            (registros aceitos, linhas inseridas segundo o sink), ou None se o
+            equipamento inteiro foi descartado. Com TELEMETRY_UNIQUE_READINGS
+            as linhas inseridas podem ser menos que os registros aceitos.
+        """
+        error_msg = f"Erro ao inserir telemetria para {equip_uuid}: {str(error)}"
+        if not settings.TELEMETRY_BISECT_ENABLED or not self.sink.transactional:
+            logger.error(error_msg, exc_info=error)
+            errors.append(error_msg)
+            return None
+        
+        if isinstance(telemetry_data, TelemetryBatch):
+            records = telemetry_data.to_dicts()
+        else:
+            records = list(telemetry_data)
+        good: List[Dict[str, Any]] = []
+        bad: List[Tuple[Dict[str, Any], str]] = []
+        inserted = 0
+        try:
+            async with db.begin_nested():
+                # O lote inteiro já falhou: começa pelas metades
+                if len(records) == 1:
+                    bad.append((records[0], self._failure_reason(error)))
+                else:
+                    middle = len(records) // 2
+                    inserted += await self._bisect_write(db, records[:middle], good, bad)
+                    inserted += await self._bisect_write(db, records[middle:], good, bad)
+        except Exception as e:
+            # _BisectAborted ou falha da própria recuperação: descarta o equipamento
+            logger.error(error_msg, exc_info=error if isinstance(e, _BisectAborted) else e)
+            errors.append(error_msg)
+            return None
+        
+        for record, reason in bad:
+            errors.append(
+                f"Leitura descartada ({equip_uuid}, sensor_id={record.get('sensor_id')}, "
+                f"timestamp={record.get('timestamp')}): {reason}"
+            )
+        logger.warn(
+            "Leituras inválidas isoladas no lote",
+            equip_uuid=equip_uuid,
+            inserted=inserted,
+            rejected=len(bad),
+        )
+        return good, inserted
+    
+    async def _bisect_write(
+        self,
+        db: AsyncSession,
+        records: List[Dict[str, Any]],
+        good: List[Dict[str, Any]],
+        bad: List[Tuple[Dict[str, Any], str]],
+    ) -> int:
+        """Grava records ou suas metades; retorna as linhas inseridas."""
+        try:
+            async with db.begin_nested():
+                inserted = await self.sink.write(db, records)
+            good.extend(records)
+            return inserted
+        except Exception as e:
+            if len(records) == 1:
+                bad.append((records[0], self._failure_reason(e)))
+                if len(bad) > settings.TELEMETRY_BISECT_MAX_FAILED:
+                    raise _BisectAborted() from e
+                return 0
+        middle = len(records) // 2
+        inserted = await self._bisect_write(db, records[:middle], good, bad)
+        inserted += await self._bisect_write(db, records[middle:], good, bad)
+        return inserted
+    
+    @staticmethod
+    def _failure_reason(error: Exception) -> str:
+        """Primeira linha da mensagem do erro (ou o tipo, se vazia)."""
+        message = str(error).strip()
+        return message.splitlines()[0] if message else type(error).__name__
+    
+    @staticmethod
+    async def _write(sink: TelemetrySink, db: AsyncSession, telemetry_data) -> int:
+        if isinstance(telemetry_data, TelemetryBatch):
+            return await sink.write_batch(db, telemetry_data)
+        return await sink.write(db, telemetry_data)
+    
+    async def _resolve_entities(
         self,
         tenant_id: int,
         organization_id: int,
         workspace_id: int,
-        item: Dict[str, Any],
+        equipment_map: Dict[str, Dict[str, Any]],
         db: AsyncSession,
-    ) -> Equipment:
-        """Busca ou cria um equipamento."""
-        equip_uuid = item.get("equip_uuid")
-        
-        # Buscar equipamento existente
-        equipment = await Equipment.get_by_uuid_scoped(
-            db,
-            equip_uuid,
-            tenant_id,
-            organization_id,
-            workspace_id,
-        )
+        errors: List[str],
+    ) -> Tuple[Dict[str, CachedEquipment], Dict[str, CachedSensor]]:
+        """
+        Resolve equipamentos e sensores do payload (cache -> banco).
         
-        if equipment:
-            if equipment.tenant_id != tenant_id:
-                raise ValueError(f"Equipamento {equip_uuid} não pertence ao tenant")
-            if equipment.organization_id != organization_id:
-                raise ValueError(f"Equipamento {equip_uuid} não pertence à organização")
-            if equipment.workspace_id != workspace_id:
-                raise ValueError(f"Equipamento {equip_uuid} não pertence ao workspace")
-            return equipment
-        
-        # Criar novo equipamento
-        equipment = Equipment(
-            uuid=equip_uuid,
-            name=item.get("equip_nome", f"Equipamento {equip_uuid[:8]}"),
-            status=self._normalize_status(item.get("equip_status")),
-            collection_interval=item.get("equip_intervalo_coleta", 60),
-            siren_active=item.get("equip_sirene_ativa", "NÃO") == "SIM",
-            siren_time=item.get("equip_sirete_tempo", 120),
-            tenant_id=tenant_id,
-            organization_id=organization_id,
-            workspace_id=workspace_id,
+        Os ausentes no cache são buscados com uma consulta por tabela e os que
+        não existem são criados em um único INSERT ... ON CONFLICT DO NOTHING;
+        linhas criadas em paralelo por outra réplica são relidas em seguida.
+        As resoluções só entram no cache depois do commit.
+        
+        Metadados (ENTITY_METADATA_REFRESH_ENABLED): cada entidade resolvida
+        carrega o fingerprint dos campos estáticos do payload já refletidos no
+        banco. Quando o payload muda (nome, firmware, unidade...), os campos
+        enviados são atualizados com um UPDATE em lote por tabela; em regime,
+        o custo é só o hash dos campos. O UPDATE roda em um SAVEPOINT: se
+        falhar (ex.: firmware maior que a coluna), só gera log e a ingestão
+        segue com as entidades já resolvidas.
+        """
+        use_cache = settings.ENTITY_CACHE_ENABLED
+        refresh = settings.ENTITY_METADATA_REFRESH_ENABLED
+        resolved: Dict[tuple, Any] = {}
+        
+        equipments: Dict[str, CachedEquipment] = {}
+        missing_equipments: Dict[str, Dict[str, Any]] = {}
+        for equip_uuid, data in equipment_map.items():
+            cached = None
+            if use_cache:
+                cached = entity_cache.get(
+                    entity_key(KIND_EQUIPMENT, equip_uuid, tenant_id, organization_id, workspace_id)
+                )
+            if cached is not None:
+                equipments[equip_uuid] = cached
+            else:
+                missing_equipments[equip_uuid] = data["item"]
+        
+        if missing_equipments:
+            found = await self._bulk_resolve_equipments(
+                tenant_id,
+                organization_id,
+                workspace_id,
+                missing_equipments,
+                db,
+            )
+            for equip_uuid, equipment in found.items():
+                equipments[equip_uuid] = equipment
+                resolved[
+                    entity_key(KIND_EQUIPMENT, equip_uuid, tenant_id, organization_id, workspace_id)
+                ] = equipment
+            for equip_uuid in missing_equipments.keys() - found.keys():
+                errors.append(f"Equipamento {equip_uuid} não pôde ser resolvido")
+        
+        if refresh:
+            stale_equipments: Dict[int, Tuple] = {}
+            for equip_uuid, equipment in equipments.items():
+                fields = self._equipment_metadata(equipment_map[equip_uuid]["item"])
+                fingerprint = self._fingerprint(fields)
+                if equipment.fingerprint == fingerprint:
+                    continue
+                stale_equipments[equipment.id] = fields
+                equipment = replace(equipment, fingerprint=fingerprint)
+                equipments[equip_uuid] = equipment
+                resolved[
+                    entity_key(KIND_EQUIPMENT, equip_uuid, tenant_id, organization_id, workspace_id)
+                ] = equipment
+            if stale_equipments:
+                await self._refresh_metadata(self._update_equipments, stale_equipments, db)
+        
+        sensors: Dict[str, CachedSensor] = {}
+        sensor_data_by_uuid: Dict[str, Dict[str, Any]] = {}
+        missing_sensors: Dict[str, Tuple[CachedEquipment, Dict[str, Any]]] = {}
+        for equip_uuid, data in equipment_map.items():
+            equipment = equipments.get(equip_uuid)
+            if equipment is None:
+                continue
+            for sensor_uuid, sensor_data in data["sensors"].items():
+                if sensor_uuid in sensors or sensor_uuid in missing_sensors:
+                    continue
+                sensor_data_by_uuid[sensor_uuid] = sensor_data
+                cached = None
+                if use_cache:
+                    cached = entity_cache.get(
+                        entity_key(KIND_SENSOR, sensor_uuid, tenant_id, organization_id, workspace_id)
+                    )
+                if cached is not None:
+                    sensors[sensor_uuid] = cached
+                else:
+                    missing_sensors[sensor_uuid] = (equipment, sensor_data)
+        
+        if missing_sensors:
+            found = await self._bulk_resolve_sensors(
+                tenant_id,
+                organization_id,
+                workspace_id,
+                missing_sensors,
+                db,
+            )
+            for sensor_uuid, sensor in found.items():
+                sensors[sensor_uuid] = sensor
+                resolved[
+                    entity_key(KIND_SENSOR, sensor_uuid, tenant_id, organization_id, workspace_id)
+                ] = sensor
+            for sensor_uuid in missing_sensors.keys() - found.keys():
+                # uuid de sensor é único globalmente: existe em outro escopo
+                errors.append(f"Sensor {sensor_uuid} não pertence ao escopo")
+        
+        if refresh:
+            stale_sensors: Dict[int, Tuple] = {}
+            for sensor_uuid, sensor in sensors.items():
+                fields = self._sensor_metadata(sensor_data_by_uuid[sensor_uuid])
+                fingerprint = self._fingerprint(fields)
+                if sensor.fingerprint == fingerprint:
+                    continue
+                stale_sensors[sensor.id] = fields
+                sensor = replace(sensor, fingerprint=fingerprint)
+                sensors[sensor_uuid] = sensor
+                resolved[
+                    entity_key(KIND_SENSOR, sensor_uuid, tenant_id, organization_id, workspace_id)
+                ] = sensor
+            if stale_sensors:
+                await self._refresh_metadata(self._update_sensors, stale_sensors, db)
+        
+        if resolved:
+            await db.commit()
+            if use_cache:
+                for key, value in resolved.items():
+                    entity_cache.put(key, value)
+        
+        return equipments, sensors
+    
+    # Campos estáticos do payload (None = não enviado, não altera o banco)
+    EQUIPMENT_METADATA_COLUMNS = ("name", "status", "collection_interval", "siren_active", "siren_time")
+    SENSOR_METADATA_COLUMNS = (
+        "name", "type", "unit", "status", "manufacturer", "model", "firmware", "hardware_id", "via_hub",
+    )
+    
+    def _equipment_metadata(self, item: Dict[str, Any]) -> Tuple:
+        """Campos do equipamento no payload, na ordem de EQUIPMENT_METADATA_COLUMNS."""
+        interval = item.get("equip_intervalo_coleta")
+        siren_active = item.get("equip_sirene_ativa")
+        siren_time = item.get("equip_sirete_tempo")
+        return (
+            self._to_str(item.get("equip_nome") or None),
+            self._normalize_status(item["equip_status"]) if item.get("equip_status") else None,
+            None if interval is None else self._to_int(interval, 60),
+            None if siren_active is None else siren_active == "SIM",
+            None if siren_time is None else self._to_int(siren_time, 120),
+        )
+    
+    def _sensor_metadata(self, data: Dict[str, Any]) -> Tuple:
+        """Campos do sensor no payload, na ordem de SENSOR_METADATA_COLUMNS."""
+        via_hub = data.get("sensor_via_hub")
+        return (
+            self._to_str(data.get("sensor_nome") or None),
+            self._to_str(data.get("sensor_tipo") or data.get("tipo") or None),
+            self._to_str(data.get("sensor_unidade")),
+            self._normalize_status(data["sensor_status"]) if data.get("sensor_status") else None,
+            self._to_str(data.get("sensor_fabricante")),
+            self._to_str(data.get("sensor_modelo")),
+            self._to_str(data.get("sensor_firmware")),
+            self._to_str(data.get("sensor_id_hardware")),
+            None if via_hub is None else bool(via_hub),
         )
+    
+    @staticmethod
+    def _fingerprint(fields: Tuple) -> bytes:
+        return hashlib.blake2b(repr(fields).encode(), digest_size=8).digest()
+    
+    def _stored_fingerprint(self, fields: Tuple, row, columns: Tuple[str, ...]) -> Optional[bytes]:
+        """
+        Fingerprint do payload se o banco já tem os campos enviados; None
+        (desatualizado) caso contrário.
+        """
+        if not settings.ENTITY_METADATA_REFRESH_ENABLED:
+            return None
+        for value, column in zip(fields, columns):
+            if value is not None and value != getattr(row, column):
+                return None
+        return self._fingerprint(fields)
+    
+    async def _refresh_metadata(self, update, stale: Dict[int, Tuple], db: AsyncSession) -> None:
+        """
+        Aplica o UPDATE de metadados em um SAVEPOINT.
+        
+        A transação é marcada com a origem deste processo (migration 038):
+        o NOTIFY de invalidação chega aos demais processos, e este o ignora.
+        
+        Em caso de erro o fingerprint novo entra no cache mesmo assim, para a
+        atualização não ser repetida (e falhar) a cada payload; ela volta a
+        ser tentada quando a entrada expira ou o payload muda de novo.
+        """
+        try:
+            async with db.begin_nested():
+                await db.execute(
+                    text("SELECT set_config(:name, :origin, true)"),
+                    {"name": NOTIFY_ORIGIN_SETTING, "origin": entity_cache.origin},
+                )
+                await update(stale, db)
+                # Só este UPDATE leva a origem; o resto da transação notifica normalmente
+                await db.execute(
+                    text("SELECT set_config(:name, '', true)"),
+                    {"name": NOTIFY_ORIGIN_SETTING},
+                )
+        except Exception as e:
+            logger.warn(
+                "Erro ao atualizar metadados, seguindo com a ingestão",
+                update=update.__name__,
+                count=len(stale),
+                error=str(e),
+            )
+    
+    async def _update_equipments(self, stale: Dict[int, Tuple], db: AsyncSession) -> None:
+        """Atualiza em lote os campos enviados dos equipamentos (id -> campos)."""
+        ids = list(stale)
+        columns = list(zip(*(stale[equipment_id] for equipment_id in ids)))
+        await db.execute(text("""
+            UPDATE equipments e SET
+                name = COALESCE(u.name, e.name),
+                status = COALESCE(CAST(u.status AS entity_status), e.status),
+                collection_interval = COALESCE(u.collection_interval, e.collection_interval),
+                siren_active = COALESCE(u.siren_active, e.siren_active),
+                siren_time = COALESCE(u.siren_time, e.siren_time),
+                updated_at = timezone('utc', now())
+            FROM unnest(
+                CAST(:ids AS INTEGER[]),
+                CAST(:names AS VARCHAR[]),
+                CAST(:statuses AS VARCHAR[]),
+                CAST(:intervals AS INTEGER[]),
+                CAST(:siren_active AS BOOLEAN[]),
+                CAST(:siren_time AS INTEGER[])
+            ) AS u(id, name, status, collection_interval, siren_active, siren_time)
+            WHERE e.id = u.id
+        """), {
+            "ids": ids,
+            "names": list(columns[0]),
+            "statuses": list(columns[1]),
+            "intervals": list(columns[2]),
+            "siren_active": list(columns[3]),
+            "siren_time": list(columns[4]),
+        })
+        logger.info("Metadados de equipamentos atualizados", count=len(ids))
+    
+    async def _update_sensors(self, stale: Dict[int, Tuple], db: AsyncSession) -> None:
+        """Atualiza em lote os campos enviados dos sensores (id -> campos)."""
+        ids = list(stale)
+        columns = list(zip(*(stale[sensor_id] for sensor_id in ids)))
+        await db.execute(text("""
+            UPDATE sensors s SET
+                name = COALESCE(u.name, s.name),
+                type = COALESCE(u.type, s.type),
+                unit = COALESCE(u.unit, s.unit),
+                status = COALESCE(CAST(u.status AS entity_status), s.status),
+                manufacturer = COALESCE(u.manufacturer, s.manufacturer),
+                model = COALESCE(u.model, s.model),
+                firmware = COALESCE(u.firmware, s.firmware),
+                hardware_id = COALESCE(u.hardware_id, s.hardware_id),
+                via_hub = COALESCE(u.via_hub, s.via_hub),
+                updated_at = timezone('utc', now())
+            FROM unnest(
+                CAST(:ids AS INTEGER[]),
+                CAST(:names AS VARCHAR[]),
+                CAST(:types AS VARCHAR[]),
+                CAST(:units AS VARCHAR[]),
+                CAST(:statuses AS VARCHAR[]),
+                CAST(:manufacturers AS VARCHAR[]),
+                CAST(:models AS VARCHAR[]),
+                CAST(:firmwares AS VARCHAR[]),
+                CAST(:hardware_ids AS VARCHAR[]),
+                CAST(:via_hub AS BOOLEAN[])
+            ) AS u(id, name, type, unit, status, manufacturer, model, firmware, hardware_id, via_hub)
+            WHERE s.id = u.id
+        """), {
+            "ids": ids,
+            "names": list(columns[0]),
+            "types": list(columns[1]),
+            "units": list(columns[2]),
+            "statuses": list(columns[3]),
+            "manufacturers": list(columns[4]),
+            "models": list(columns[5]),
+            "firmwares": list(columns[6]),
+            "hardware_ids": list(columns[7]),
+            "via_hub": list(columns[8]),
+        })
+        logger.info("Metadados de sensores atualizados", count=len(ids))
+    
+    async def _bulk_resolve_equipments(
+        self,
+        tenant_id: int,
+        organization_id: int,
+        workspace_id: int,
+        items: Dict[str, Dict[str, Any]],
+        db: AsyncSession,
+    ) -> Dict[str, CachedEquipment]:
+        """Busca/cria equipamentos em lote (equip_uuid -> primeiro item)."""
+        scope = {
+            "tenant_id": tenant_id,
+            "organization_id": organization_id,
+            "workspace_id": workspace_id,
+        }
+        
+        def _to_cached(rows) -> Dict[str, CachedEquipment]:
+            return {
+                row.uuid: CachedEquipment(
+                    id=row.id,
+                    tenant_id=tenant_id,
+                    organization_id=organization_id,
+                    workspace_id=workspace_id,
+                    fingerprint=self._stored_fingerprint(
+                        self._equipment_metadata(items[row.uuid]),
+                        row,
+                        self.EQUIPMENT_METADATA_COLUMNS,
+                    ),
+                )
+                for row in rows
+            }
+        
+        select_sql = text("""
+            SELECT id, uuid, name, CAST(status AS TEXT) AS status,
+                   collection_interval, siren_active, siren_time
+            FROM equipments
+            WHERE uuid = ANY(:uuids)
+              AND tenant_id = :tenant_id
+              AND organization_id = :organization_id
+              AND workspace_id = :workspace_id
+        """)
+        result = await db.execute(select_sql, {"uuids": list(items), **scope})
+        found = _to_cached(result.fetchall())
         
-        db.add(equipment)
-        await db.flush()
+        to_create = [uuid for uuid in items if uuid not in found]
+        if not to_create:
+            return found
         
-        logger.info("Equipamento criado", uuid=equipment.uuid, name=equipment.name)
+        result = await db.execute(text("""
+            INSERT INTO equipments (
+                uuid, name, status, collection_interval, siren_active, siren_time,
+                tenant_id, organization_id, workspace_id, created_at, updated_at
+            )
+            SELECT
+                u.uuid, u.name, CAST(u.status AS entity_status), u.collection_interval,
+                u.siren_active, u.siren_time,
+                :tenant_id, :organization_id, :workspace_id,
+                timezone('utc', now()), timezone('utc', now())
+            FROM unnest(
+                CAST(:uuids AS VARCHAR[]),
+                CAST(:names AS VARCHAR[]),
+                CAST(:statuses AS VARCHAR[]),
+                CAST(:intervals AS INTEGER[]),
+                CAST(:siren_active AS BOOLEAN[]),
+                CAST(:siren_time AS INTEGER[])
+            ) AS u(uuid, name, status, collection_interval, siren_active, siren_time)
+            ON CONFLICT ON CONSTRAINT equipments_uuid_tenant_org_ws_key DO NOTHING
+            RETURNING id, uuid, name, CAST(status AS TEXT) AS status,
+                      collection_interval, siren_active, siren_time
+        """), {
+            "uuids": to_create,
+            "names": [
+                items[uuid].get("equip_nome") or f"Equipamento {uuid[:8]}"
+                for uuid in to_create
+            ],
+            "statuses": [
+                self._normalize_status(items[uuid].get("equip_status"))
+                for uuid in to_create
+            ],
+            "intervals": [
+                self._to_int(items[uuid].get("equip_intervalo_coleta"), 60)
+                for uuid in to_create
+            ],
+            "siren_active": [
+                items[uuid].get("equip_sirene_ativa", "NÃO") == "SIM"
+                for uuid in to_create
+            ],
+            "siren_time": [
+                self._to_int(items[uuid].get("equip_sirete_tempo"), 120)
+                for uuid in to_create
+            ],
+            **scope,
+        })
+        created = _to_cached(result.fetchall())
+        found.update(created)
+        if created:
+            logger.info("Equipamentos criados", count=len(created), workspace_id=workspace_id)
         
-        return equipment
+        # Criados por outra réplica entre o SELECT e o INSERT
+        raced = [uuid for uuid in to_create if uuid not in created]
+        if raced:
+            result = await db.execute(select_sql, {"uuids": raced, **scope})
+            found.update(_to_cached(result.fetchall()))
+        
+        return found
     
-    async def _get_or_create_sensor(
+    async def _bulk_resolve_sensors(
         self,
-        equipment: Equipment,
-        sensor_data: Dict[str, Any],
-        item: Dict[str, Any],
+        tenant_id: int,
+        organization_id: int,
+        workspace_id: int,
+        sensors: Dict[str, Tuple[CachedEquipment, Dict[str, Any]]],
         db: AsyncSession,
-    ) -> Sensor:
-        """Busca ou cria um sensor."""
-        sensor_uuid = sensor_data.get("sensor_uuid")
-        if not sensor_uuid:
-            raise ValueError("sensor_uuid não encontrado")
-        
-        # Buscar sensor existente
-        sensor = await Sensor.get_by_uuid_scoped(
-            db,
-            sensor_uuid,
-            equipment.tenant_id,
-            equipment.organization_id,
-            equipment.workspace_id,
-        )
+    ) -> Dict[str, CachedSensor]:
+        """Busca/cria sensores em lote (sensor_uuid -> (equipamento, primeiro sensor_data))."""
+        scope = {
+            "tenant_id": tenant_id,
+            "organization_id": organization_id,
+            "workspace_id": workspace_id,
+        }
         
-        if sensor:
-            if sensor.equipment_id != equipment.id:
-                raise ValueError(f"Sensor {sensor_uuid} não pertence ao equipamento")
-            return sensor
-        
-        # Criar novo sensor
-        sensor = Sensor(
-            uuid=sensor_uuid,
-            name=sensor_data.get("sensor_nome", f"Sensor {sensor_uuid[:8]}"),
-            type=sensor_data.get("sensor_tipo") or sensor_data.get("tipo", "desconhecido"),
-            unit=sensor_data.get("sensor_unidade"),
-            status=self._normalize_status(sensor_data.get("sensor_status")),
-            equipment_id=equipment.id,
-            tenant_id=equipment.tenant_id,
-            organization_id=equipment.organization_id,
-            workspace_id=equipment.workspace_id,
-            manufacturer=sensor_data.get("sensor_fabricante"),
-            model=sensor_data.get("sensor_modelo"),
-            firmware=sensor_data.get("sensor_firmware"),
-            hardware_id=sensor_data.get("sensor_id_hardware"),
-            via_hub=sensor_data.get("sensor_via_hub", False),
-        )
+        def _to_cached(rows) -> Dict[str, CachedSensor]:
+            return {
+                row.uuid: CachedSensor(
+                    id=row.id,
+                    equipment_id=row.equipment_id,
+                    fingerprint=self._stored_fingerprint(
+                        self._sensor_metadata(sensors[row.uuid][1]),
+                        row,
+                        self.SENSOR_METADATA_COLUMNS,
+                    ),
+                )
+                for row in rows
+            }
+        
+        select_sql = text("""
+            SELECT id, uuid, equipment_id, name, type, unit, CAST(status AS TEXT) AS status,
+                   manufacturer, model, firmware, hardware_id, via_hub
+            FROM sensors
+            WHERE uuid = ANY(:uuids)
+              AND tenant_id = :tenant_id
+              AND organization_id = :organization_id
+              AND workspace_id = :workspace_id
+        """)
+        result = await db.execute(select_sql, {"uuids": list(sensors), **scope})
+        found = _to_cached(result.fetchall())
+        
+        to_create = [uuid for uuid in sensors if uuid not in found]
+        if not to_create:
+            return found
+        
+        def _column(getter):
+            return [getter(sensors[uuid][1]) for uuid in to_create]
         
-        db.add(sensor)
-        await db.flush()
+        result = await db.execute(text("""
+            INSERT INTO sensors (
+                uuid, name, type, unit, status, equipment_id,
+                tenant_id, organization_id, workspace_id,
+                manufacturer, model, firmware, hardware_id, via_hub,
+                created_at, updated_at
+            )
+            SELECT
+                u.uuid, u.name, u.type, u.unit, CAST(u.status AS entity_status), u.equipment_id,
+                :tenant_id, :organization_id, :workspace_id,
+                u.manufacturer, u.model, u.firmware, u.hardware_id, u.via_hub,
+                timezone('utc', now()), timezone('utc', now())
+            FROM unnest(
+                CAST(:uuids AS VARCHAR[]),
+                CAST(:names AS VARCHAR[]),
+                CAST(:types AS VARCHAR[]),
+                CAST(:units AS VARCHAR[]),
+                CAST(:statuses AS VARCHAR[]),
+                CAST(:equipment_ids AS INTEGER[]),
+                CAST(:manufacturers AS VARCHAR[]),
+                CAST(:models AS VARCHAR[]),
+                CAST(:firmwares AS VARCHAR[]),
+                CAST(:hardware_ids AS VARCHAR[]),
+                CAST(:via_hub AS BOOLEAN[])
+            ) AS u(
+                uuid, name, type, unit, status, equipment_id,
+                manufacturer, model, firmware, hardware_id, via_hub
+            )
+            ON CONFLICT (uuid) DO NOTHING
+            RETURNING id, uuid, equipment_id, name, type, unit, CAST(status AS TEXT) AS status,
+                      manufacturer, model, firmware, hardware_id, via_hub
+        """), {
+            "uuids": to_create,
+            "names": [
+                sensors[uuid][1].get("sensor_nome") or f"Sensor {uuid[:8]}"
+                for uuid in to_create
+            ],
+            "types": _column(
+                lambda data: data.get("sensor_tipo") or data.get("tipo") or "desconhecido"
+            ),
+            "units": _column(lambda data: self._to_str(data.get("sensor_unidade"))),
+            "statuses": _column(lambda data: self._normalize_status(data.get("sensor_status"))),
+            "equipment_ids": [sensors[uuid][0].id for uuid in to_create],
+            "manufacturers": _column(lambda data: self._to_str(data.get("sensor_fabricante"))),
+            "models": _column(lambda data: self._to_str(data.get("sensor_modelo"))),
+            "firmwares": _column(lambda data: self._to_str(data.get("sensor_firmware"))),
+            "hardware_ids": _column(lambda data: self._to_str(data.get("sensor_id_hardware"))),
+            "via_hub": _column(lambda data: bool(data.get("sensor_via_hub", False))),
+            **scope,
+        })
+        created = _to_cached(result.fetchall())
+        found.update(created)
+        if created:
+            logger.info("Sensores criados", count=len(created), workspace_id=workspace_id)
         
-        logger.info("Sensor criado", uuid=sensor.uuid, name=sensor.name, type=sensor.type)
+        # Conflito: criado por outra réplica (relido) ou uuid de outro escopo (fica de fora)
+        raced = [uuid for uuid in to_create if uuid not in created]
+        if raced:
+            result = await db.execute(select_sql, {"uuids": raced, **scope})
+            found.update(_to_cached(result.fetchall()))
         
-        return sensor
+        return found
     
     def _prepare_telemetry_data(
         self,
         sensor_id: int,
-        equipment: Equipment,
+        equipment: CachedEquipment,
         sensor_data: Dict[str, Any],
     ) -> Dict[str, Any]:
         """Prepara dados de telemetria para inserção."""
@@ -308,3 +1004,14 @@ class TelemetryProcessor:
         if normalized in ("bloqueado", "blocked"):
             return "blocked"
         return "active"
+
+    @staticmethod
+    def _to_int(value: Any, default: int) -> int:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return default
+
+    @staticmethod
+    def _to_str(value: Any) -> Optional[str]:
+        return None if value is None else str(value)
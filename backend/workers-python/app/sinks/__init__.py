@@ -0,0 +1,36 @@
+"""Destinos (sinks) da telemetria processada"""
+
+from app.core.config import settings
+from app.sinks.base import TelemetrySink
+from app.sinks.file_sink import FileSink
+from app.sinks.null_sink import NullSink
+from app.sinks.postgres_sink import PostgresSink
+
+SINKS = {
+    PostgresSink.name: PostgresSink,
+    FileSink.name: FileSink,
+    NullSink.name: NullSink,
+}
+
+
+def create_sink(name: str) -> TelemetrySink:
+    """Instancia um sink pelo nome (postgres, file, null)."""
+    try:
+        return SINKS[name.strip().lower()]()
+    except KeyError:
+        raise ValueError(f"Sink de telemetria não suportado: {name}")
+
+
+def get_sink() -> TelemetrySink:
+    """Sink principal configurado em TELEMETRY_SINK."""
+    return create_sink(settings.TELEMETRY_SINK)
+
+
+__all__ = [
+    "TelemetrySink",
+    "PostgresSink",
+    "FileSink",
+    "NullSink",
+    "create_sink",
+    "get_sink",
+]
@@ -0,0 +1,47 @@
+"""
+Interface de destino (sink) da telemetria processada.
+
+O TelemetryProcessor resolve equipamentos/sensores e monta os registros;
+o sink decide onde eles vão parar (TimescaleDB, arquivos, lugar nenhum).
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class TelemetrySink(ABC):
+    """Destino dos registros de telemetria (formato de TelemetryData)."""
+
+    name = "base"
+    # Gravações participam da transação da sessão (podem ser desfeitas por SAVEPOINT)
+    transactional = False
+
+    @abstractmethod
+    async def write(self, db: AsyncSession, records: List[Dict[str, Any]]) -> int:
+        """
+        Grava os registros de um equipamento.
+
+        Args:
+            db: Sessão do processador (o commit continua com o processador)
+            records: Registros no formato de _prepare_telemetry_data
+
+        Returns:
+            Quantidade de registros gravados
+        """
+
+    async def write_batch(self, db: AsyncSession, batch) -> int:
+        """
+        Grava um TelemetryBatch (app.processors.columnar).
+
+        Padrão: converte para registros e usa write(); sinks que consomem
+        colunas direto sobrescrevem.
+        """
+        return await self.write(db, batch.to_dicts())
+
+    async def close(self) -> None:
+        """Descarrega buffers e libera recursos."""
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores do sink."""
+        return {}
@@ -0,0 +1,153 @@
+"""
+Sink em arquivos locais: segmentos CSV ou Parquet.
+
+Cada processo grava seus próprios segmentos em TELEMETRY_FILE_SINK_PATH
+(telemetry-<pid>-<início>-<seq>.<ext>), rotacionados a cada
+TELEMETRY_FILE_SINK_SEGMENT_ROWS registros. Parquet exige pyarrow; sem
+ele o formato cai para CSV. A escrita roda em thread para não bloquear o
+event loop.
+"""
+import asyncio
+import csv
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import structlog
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.sinks.base import TelemetrySink
+
+logger = structlog.get_logger(__name__)
+
+COLUMNS = (
+    "sensor_id",
+    "equipment_id",
+    "tenant_id",
+    "organization_id",
+    "workspace_id",
+    "value",
+    "status",
+    "timestamp",
+    "metadata",
+)
+
+
+def _row(record: Dict[str, Any]) -> tuple:
+    timestamp = record["timestamp"]
+    metadata = record.get("extra_metadata")
+    return (
+        record["sensor_id"],
+        record["equipment_id"],
+        record["tenant_id"],
+        record["organization_id"],
+        record["workspace_id"],
+        record.get("value"),
+        record.get("status"),
+        timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp,
+        json.dumps(metadata) if metadata else None,
+    )
+
+
+class FileSink(TelemetrySink):
+    """Grava registros em segmentos CSV/Parquet rotacionados por quantidade."""
+
+    name = "file"
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        file_format: Optional[str] = None,
+        segment_rows: Optional[int] = None,
+    ):
+        self.path = path or settings.TELEMETRY_FILE_SINK_PATH
+        self.format = (file_format or settings.TELEMETRY_FILE_SINK_FORMAT).lower()
+        self.segment_rows = max(1, segment_rows or settings.TELEMETRY_FILE_SINK_SEGMENT_ROWS)
+        if self.format == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                logger.warn("pyarrow não instalado, sink de arquivo usando CSV")
+                self.format = "csv"
+        elif self.format != "csv":
+            raise ValueError(f"Formato de sink de arquivo não suportado: {self.format}")
+
+        os.makedirs(self.path, exist_ok=True)
+        self._prefix = f"telemetry-{os.getpid()}-{int(time.time())}"
+        self._sequence = 0
+        self._rows: List[tuple] = []  # Parquet: segmento acumulado em memória
+        self._csv_file = None
+        self._csv_writer = None
+        self._segment_count = 0  # Linhas no segmento CSV aberto
+        self._lock = asyncio.Lock()
+        self.records = 0
+        self.segments = 0
+
+    async def write(self, db: AsyncSession, records: List[Dict[str, Any]]) -> int:
+        if not records:
+            return 0
+        rows = [_row(record) for record in records]
+        async with self._lock:
+            await asyncio.to_thread(self._append, rows)
+        self.records += len(rows)
+        return len(rows)
+
+    async def close(self) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._finish_segment)
+
+    def stats(self) -> Dict[str, int]:
+        return {"sink_records": self.records, "sink_segments": self.segments}
+
+    def _segment_path(self) -> str:
+        self._sequence += 1
+        return os.path.join(self.path, f"{self._prefix}-{self._sequence:06d}.{self.format}")
+
+    def _append(self, rows: List[tuple]) -> None:
+        while rows:
+            if self.format == "parquet":
+                room = self.segment_rows - len(self._rows)
+                self._rows.extend(rows[:room])
+                rows = rows[room:]
+                if len(self._rows) >= self.segment_rows:
+                    self._finish_segment()
+                continue
+
+            if self._csv_file is None:
+                self._csv_file = open(self._segment_path(), "w", newline="")
+                self._csv_writer = csv.writer(self._csv_file)
+                self._csv_writer.writerow(COLUMNS)
+                self._segment_count = 0
+            room = self.segment_rows - self._segment_count
+            self._csv_writer.writerows(rows[:room])
+            self._segment_count += len(rows[:room])
+            rows = rows[room:]
+            if self._segment_count >= self.segment_rows:
+                self._finish_segment()
+            else:
+                self._csv_file.flush()
+
+    def _finish_segment(self) -> None:
+        if self.format == "parquet":
+            if not self._rows:
+                return
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            columns = list(zip(*self._rows))
+            table = pa.table({name: list(values) for name, values in zip(COLUMNS, columns)})
+            path = self._segment_path()
+            pq.write_table(table, path)
+            self._rows = []
+        else:
+            if self._csv_file is None:
+                return
+            path = self._csv_file.name
+            self._csv_file.close()
+            self._csv_file = None
+            self._csv_writer = None
+        self.segments += 1
+        logger.debug("Segmento de telemetria gravado", path=path)
@@ -0,0 +1,33 @@
+"""
+Sink nulo: descarta os registros e só conta.
+
+Útil para medir parsing/processamento isolados do banco de telemetria.
+"""
+from typing import Any, Dict, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.sinks.base import TelemetrySink
+
+
+class NullSink(TelemetrySink):
+    """Conta registros e lotes sem gravar nada."""
+
+    name = "null"
+
+    def __init__(self):
+        self.records = 0
+        self.batches = 0
+
+    async def write(self, db: AsyncSession, records: List[Dict[str, Any]]) -> int:
+        self.records += len(records)
+        self.batches += 1
+        return len(records)
+
+    async def write_batch(self, db: AsyncSession, batch) -> int:
+        self.records += len(batch)
+        self.batches += 1
+        return len(batch)
+
+    def stats(self) -> Dict[str, int]:
+        return {"sink_records": self.records, "sink_batches": self.batches}
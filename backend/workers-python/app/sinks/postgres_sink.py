@@ -0,0 +1,37 @@
+"""
+Sink TimescaleDB: grava em telemetry_data na sessão do processador.
+"""
+from typing import Any, Dict, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.telemetry_data import TelemetryData
+from app.sinks.base import TelemetrySink
+
+
+class PostgresSink(TelemetrySink):
+    """COPY (asyncpg) com fallback para o insert via ORM."""
+
+    name = "postgres"
+    transactional = True
+
+    async def write(self, db: AsyncSession, records: List[Dict[str, Any]]) -> int:
+        if not records:
+            return 0
+        if settings.TELEMETRY_COPY_ENABLED:
+            # COPY em um único envio (ORM fica como fallback)
+            return await TelemetryData.copy_insert(db, records, settings.TELEMETRY_UNIQUE_READINGS)
+
+        # Dividir em batches para otimizar
+        inserted = 0
+        batch_size = settings.BULK_INSERT_BATCH_SIZE
+        for i in range(0, len(records), batch_size):
+            batch = records[i:i + batch_size]
+            inserted += await TelemetryData.bulk_insert(db, batch, settings.TELEMETRY_UNIQUE_READINGS)
+        return inserted
+
+    async def write_batch(self, db: AsyncSession, batch) -> int:
+        if settings.TELEMETRY_COPY_ENABLED:
+            return await TelemetryData.copy_batch(db, batch, settings.TELEMETRY_UNIQUE_READINGS)
+        return await self.write(db, batch.to_dicts())
@@ -0,0 +1,251 @@
+"""
+Remoção adiada e em lote dos claim checks processados.
+
+Em vez de um remove_object por mensagem no caminho crítico, as chaves
+entram em uma fila e são removidas com remove_objects a cada
+STORAGE_DELETE_INTERVAL_SECONDS ou STORAGE_DELETE_BATCH_SIZE chaves.
+
+As chaves pendentes ficam em um journal append-only (+chave ao enfileirar,
+-chave ao remover) em STORAGE_DELETE_JOURNAL_DIR, um arquivo por processo
+protegido por flock. Após cada flush o journal é reescrito só com as chaves
+ainda pendentes (arquivo temporário + rename), então ele não cresce sob
+carga contínua nem com chaves que falham sempre. Ao iniciar, journals
+órfãos (processos que caíram) são assumidos e suas chaves voltam para a
+fila, então uma queda não deixa objetos para trás. O diretório precisa
+sobreviver ao restart do container (volume montado).
+"""
+import asyncio
+import fcntl
+import os
+import time
+import uuid
+from typing import Dict, List, Optional, TextIO
+
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger(__name__)
+
+JOURNAL_SUFFIX = ".journal"
+
+
+def _read_journal(f: TextIO) -> List[str]:
+    """Chaves ainda pendentes em um journal (+ sem - correspondente)."""
+    pending: Dict[str, None] = {}
+    f.seek(0)
+    for line in f:
+        line = line.rstrip("\n")
+        if len(line) < 2:
+            continue
+        if line[0] == "+":
+            pending[line[1:]] = None
+        elif line[0] == "-":
+            pending.pop(line[1:], None)
+    return list(pending)
+
+
+def _lock_orphan(path: str) -> Optional[TextIO]:
+    """
+    Abre e trava (flock) um journal sem dono.
+
+    A compactação troca o arquivo por rename: o flock pode ter sido obtido
+    no inode antigo, já liberado, enquanto o caminho aponta para o journal
+    novo (vivo). Depois do lock o caminho é conferido de novo e, se o inode
+    mudou, a tentativa recomeça.
+
+    Returns:
+        Arquivo travado, ou None se o journal tem dono vivo ou sumiu
+    """
+    while True:
+        try:
+            f = open(path, "r")
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            current = os.stat(path)
+        except (BlockingIOError, FileNotFoundError):
+            f.close()
+            return None
+        opened = os.fstat(f.fileno())
+        if (current.st_dev, current.st_ino) == (opened.st_dev, opened.st_ino):
+            return f
+        f.close()
+
+
+class DeferredDeleter:
+    """Fila de remoção com flush periódico/por volume e journal em disco."""
+
+    def __init__(
+        self,
+        storage,
+        journal_dir: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        interval_seconds: Optional[float] = None,
+    ):
+        """
+        Args:
+            storage: StorageClient (usa delete_files)
+            journal_dir: Diretório dos journals
+            batch_size: Chaves que disparam um flush imediato
+            interval_seconds: Intervalo máximo entre flushes
+        """
+        self.storage = storage
+        self.journal_dir = journal_dir or settings.STORAGE_DELETE_JOURNAL_DIR
+        self.batch_size = max(1, batch_size or settings.STORAGE_DELETE_BATCH_SIZE)
+        self.interval = interval_seconds or settings.STORAGE_DELETE_INTERVAL_SECONDS
+        self._pending: Dict[str, None] = {}
+        self._journal: Optional[TextIO] = None
+        self._journal_path: Optional[str] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.deleted = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        """Abre o journal, recupera órfãos e inicia o flush em background."""
+        os.makedirs(self.journal_dir, exist_ok=True)
+        path = os.path.join(
+            self.journal_dir,
+            f"deletes-{os.getpid()}-{uuid.uuid4().hex[:8]}{JOURNAL_SUFFIX}",
+        )
+        self._journal_path = path
+        self._journal = open(path, "a+")
+        fcntl.flock(self._journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._recover_orphans()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Para o loop e faz o último flush; o que falhar fica no journal."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._journal is not None:
+            path = self._journal_path
+            remaining = bool(self._pending)
+            self._journal.close()
+            self._journal = None
+            if not remaining:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    @property
+    def pending(self) -> int:
+        """Chaves aguardando remoção."""
+        return len(self._pending)
+
+    def enqueue(self, file_path: str) -> None:
+        """Agenda a remoção (registrada no journal antes de retornar)."""
+        if file_path in self._pending:
+            return
+        self._pending[file_path] = None
+        self._append("+", [file_path])
+        if len(self._pending) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        """Remove em lote tudo o que está pendente."""
+        if self._flush_lock is None:
+            return
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            keys = list(self._pending)
+            started = time.monotonic()
+            try:
+                failed = set(await self.storage.delete_files(keys))
+            except Exception as e:
+                logger.warn("Erro na remoção em lote de claim checks", keys=len(keys), error=str(e))
+                return
+            removed = [key for key in keys if key not in failed]
+            for key in removed:
+                self._pending.pop(key, None)
+            self._append("-", removed)
+            self.deleted += len(removed)
+            self.failed += len(failed)
+            # Chaves enfileiradas durante o remove_objects seguem no _pending
+            self._compact()
+            logger.debug(
+                "Claim checks removidos em lote",
+                removed=len(removed),
+                failed=len(failed),
+                duration_ms=int((time.monotonic() - started) * 1000),
+            )
+
+    def _append(self, op: str, keys: List[str]) -> None:
+        if self._journal is None or not keys:
+            return
+        self._journal.write("".join(f"{op}{key}\n" for key in keys))
+        self._journal.flush()
+
+    def _compact(self) -> None:
+        """Reescreve o journal só com as chaves pendentes (troca atômica)."""
+        if self._journal is None:
+            return
+        path = self._journal_path
+        # Sem o sufixo .journal: nunca é assumido como órfão por outro processo
+        tmp_path = f"{path}.tmp"
+        try:
+            journal = open(tmp_path, "w+")
+        except OSError as e:
+            logger.warn("Erro ao compactar journal de remoções", error=str(e))
+            return
+        try:
+            fcntl.flock(journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            journal.write("".join(f"+{key}\n" for key in self._pending))
+            journal.flush()
+            os.replace(tmp_path, path)
+        except OSError as e:
+            journal.close()
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            logger.warn("Erro ao compactar journal de remoções", error=str(e))
+            return
+        self._journal.close()
+        self._journal = journal
+
+    def _recover_orphans(self) -> None:
+        """Assume journals de processos que não estão mais vivos (sem flock)."""
+        own = os.path.abspath(self._journal_path)
+        recovered = 0
+        for entry in os.scandir(self.journal_dir):
+            if not entry.name.endswith(JOURNAL_SUFFIX) or os.path.abspath(entry.path) == own:
+                continue
+            f = _lock_orphan(entry.path)
+            if f is None:
+                continue  # Processo vivo (ou já assumido por outro)
+            try:
+                keys = _read_journal(f)
+                for key in keys:
+                    if key not in self._pending:
+                        self._pending[key] = None
+                # Copia para o próprio journal antes de apagar o órfão
+                self._append("+", keys)
+                os.unlink(entry.path)
+                recovered += len(keys)
+            finally:
+                f.close()
+        if recovered:
+            logger.info("Remoções pendentes recuperadas de journals órfãos", keys=recovered)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
@@ -0,0 +1,128 @@
+"""
+Parser incremental de arrays JSON.
+
+Lê o stream em blocos e entrega cada elemento do array de topo assim que
+ele termina, sem materializar o documento inteiro: a memória depende do
+tamanho do maior item, não do arquivo. O scanner só para nos bytes que
+importam (aspas, escapes, chaves, colchetes e vírgulas); o parsing de cada
+elemento fica com orjson (ou json, se indisponível).
+"""
+import json
+import re
+from typing import Any, BinaryIO, Iterator, List
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover - orjson está no requirements
+    def _loads(data: bytes) -> Any:
+        return json.loads(data.decode("utf-8"))
+
+_STRUCTURAL = re.compile(rb'["\[\]{},]')
+_IN_STRING = re.compile(rb'["\\]')
+_WHITESPACE = b" \t\r\n"
+
+DEFAULT_READ_SIZE = 256 * 1024
+
+
+class JsonArrayStream:
+    """
+    Itera os elementos do array JSON de topo de um stream binário.
+
+    Se o documento não for um array (ex.: {"data": [...]}), ele é lido
+    inteiro e entregue como um único valor; is_array fica False.
+    """
+
+    def __init__(self, stream: BinaryIO, read_size: int = DEFAULT_READ_SIZE):
+        self.stream = stream
+        self.read_size = read_size
+        self.is_array = True
+
+    def __iter__(self) -> Iterator[Any]:
+        buf = b""
+        while True:
+            buf = buf.lstrip(_WHITESPACE)
+            if buf:
+                break
+            block = self.stream.read(self.read_size)
+            if not block:
+                return
+            buf = block
+
+        if buf[:1] != b"[":
+            self.is_array = False
+            rest = [buf]
+            while True:
+                block = self.stream.read(self.read_size)
+                if not block:
+                    break
+                rest.append(block)
+            yield _loads(b"".join(rest))
+            return
+
+        depth = 0
+        in_string = False
+        start = 1  # Início do elemento corrente (após '[' ou ',')
+        pos = 0
+        eof = False
+        while True:
+            if in_string:
+                match = _IN_STRING.search(buf, pos)
+                if match is None or (match.group() == b"\\" and match.end() >= len(buf)):
+                    # Precisa de mais dados (escape pode cair na fronteira do bloco)
+                    match = None
+                elif match.group() == b"\\":
+                    pos = match.end() + 1
+                    continue
+                else:
+                    in_string = False
+                    pos = match.end()
+                    continue
+            else:
+                match = _STRUCTURAL.search(buf, pos)
+                if match is not None:
+                    token = match.group()
+                    pos = match.end()
+                    if token == b'"':
+                        in_string = True
+                    elif token in (b"{", b"["):
+                        depth += 1
+                    elif token == b"}":
+                        depth -= 1
+                    elif token == b"]":
+                        depth -= 1
+                        if depth == 0:
+                            element = buf[start:pos - 1].strip(_WHITESPACE)
+                            if element:
+                                yield _loads(element)
+                            return
+                    elif depth == 1:  # vírgula entre elementos do topo
+                        yield _loads(buf[start:pos - 1])
+                        start = pos
+                    continue
+
+            if eof:
+                raise ValueError("JSON truncado: array de topo não foi fechado")
+            # Descarta o que já foi entregue antes de ler o próximo bloco
+            if start > 0:
+                buf = buf[start:]
+                pos -= start
+                start = 0
+            block = self.stream.read(self.read_size)
+            if not block:
+                eof = True
+            else:
+                buf += block
+
+
+def iter_chunks(items: Iterator[Any], size: int) -> Iterator[List[Any]]:
+    """Agrupa um iterador em listas de até size elementos."""
+    chunk: List[Any] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
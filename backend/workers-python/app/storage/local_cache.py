@@ -0,0 +1,218 @@
+"""
+Cache local (em disco) de claim checks já descomprimidos.
+
+Retries e replays (DELETE_FILE_AFTER_PROCESSING=false) voltariam a baixar
+o mesmo objeto do storage; com o cache, o JSON descomprimido fica em
+STORAGE_CACHE_DIR endereçado por conteúdo (hash de caminho + ETag) e é
+lido via mmap. O nome do arquivo começa pelo hash do caminho, então dá
+para saber se há alguma versão em cache sem consultar o storage (contains):
+o ETag só é conferido quando há o que reaproveitar. Gravar uma versão nova
+remove as anteriores do mesmo caminho. O tamanho total é limitado por
+STORAGE_CACHE_MAX_BYTES com remoção LRU (mtime atualizado a cada leitura).
+O diretório pode ser compartilhado pelos processos do supervisor: gravações
+são atômicas (arquivo temporário + rename) e a remoção varre o diretório.
+Claim checks lidos em streaming entram no cache via writer(), em partes.
+"""
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+from typing import Optional
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+SUFFIX = ".json"
+
+
+class ClaimCheckCache:
+    """Cache LRU em disco, chaveado por (caminho, ETag)."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max(0, max_bytes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._total_bytes = self._scan_total()
+
+    @staticmethod
+    def _path_digest(file_path: str) -> str:
+        return hashlib.blake2b(file_path.encode(), digest_size=16).hexdigest()
+
+    def _path(self, file_path: str, etag: str) -> str:
+        path_digest = self._path_digest(file_path)
+        etag_digest = hashlib.blake2b(etag.encode(), digest_size=8).hexdigest()
+        return os.path.join(self.directory, path_digest[:2], f"{path_digest}-{etag_digest}{SUFFIX}")
+
+    def contains(self, file_path: str) -> bool:
+        """Indica se alguma versão (qualquer ETag) do caminho está em cache."""
+        path_digest = self._path_digest(file_path)
+        try:
+            with os.scandir(os.path.join(self.directory, path_digest[:2])) as entries:
+                return any(
+                    entry.name.startswith(path_digest) and entry.name.endswith(SUFFIX)
+                    for entry in entries
+                )
+        except FileNotFoundError:
+            return False
+
+    def get(self, file_path: str, etag: str) -> Optional[mmap.mmap]:
+        """Retorna o conteúdo mapeado em memória (fechar após o uso) ou None."""
+        path = self._path(file_path, etag)
+        try:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    self.misses += 1
+                    return None
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        try:
+            # LRU: leitura conta como uso recente
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return mapped
+
+    def put(self, file_path: str, etag: str, data: bytes) -> None:
+        """Grava o conteúdo descomprimido (atômico) e aplica o limite de tamanho."""
+        if not self.max_bytes or len(data) > self.max_bytes:
+            return
+        writer = CacheWriter(self, file_path, etag)
+        writer.write(data)
+        writer.commit()
+
+    def writer(self, file_path: str, etag: str) -> Optional["CacheWriter"]:
+        """Writer para gravar o conteúdo em partes (None se o cache está desligado)."""
+        if not self.max_bytes:
+            return None
+        return CacheWriter(self, file_path, etag)
+
+    def _install(self, tmp_path: str, file_path: str, etag: str, size: int) -> None:
+        """Publica um arquivo temporário como a versão atual do caminho."""
+        path = self._path(file_path, etag)
+        with self._lock:
+            # Versões anteriores (e a mesma, se regravada) saem da conta
+            freed = self._remove_versions(file_path)
+            os.replace(tmp_path, path)
+            self._total_bytes = max(0, self._total_bytes - freed) + size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _remove_versions(self, file_path: str) -> int:
+        """Remove todas as versões em cache do caminho; retorna os bytes liberados."""
+        path_digest = self._path_digest(file_path)
+        freed = 0
+        try:
+            with os.scandir(os.path.join(self.directory, path_digest[:2])) as entries:
+                for entry in entries:
+                    if not (entry.name.startswith(path_digest) and entry.name.endswith(SUFFIX)):
+                        continue
+                    try:
+                        size = entry.stat().st_size
+                        os.unlink(entry.path)
+                    except FileNotFoundError:
+                        continue
+                    freed += size
+        except FileNotFoundError:
+            pass
+        return freed
+
+    def _entries(self):
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(SUFFIX):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def _scan_total(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self) -> None:
+        """Remove os menos usados até ficar em 90% do limite."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        self._total_bytes = total
+        if removed:
+            logger.debug("Cache de claim checks reduzido", removed=removed, total_bytes=total)
+
+
+class CacheWriter:
+    """
+    Grava uma entrada do cache em partes (arquivo temporário).
+
+    A entrada só aparece no cache no commit(); se passar de max_bytes ou a
+    gravação falhar, o writer desiste em silêncio e o arquivo é descartado.
+    """
+
+    def __init__(self, cache: ClaimCheckCache, file_path: str, etag: str):
+        self._cache = cache
+        self._file_path = file_path
+        self._etag = etag
+        self.size = 0
+        directory = os.path.dirname(cache._path(file_path, etag))
+        os.makedirs(directory, exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes) -> None:
+        if self._file is None:
+            return
+        self.size += len(data)
+        if self.size > self._cache.max_bytes:
+            self.discard()
+            return
+        try:
+            self._file.write(data)
+        except OSError as e:
+            logger.warn("Erro ao gravar claim check no cache", error=str(e))
+            self.discard()
+
+    def commit(self) -> None:
+        """Publica o conteúdo gravado como a versão (caminho, ETag) em cache."""
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+            self._file = None
+            self._cache._install(self._tmp_path, self._file_path, self._etag, self.size)
+        except Exception:
+            self._file = None
+            self._unlink_tmp()
+            raise
+
+    def discard(self) -> None:
+        """Abandona a gravação."""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        self._unlink_tmp()
+
+    def _unlink_tmp(self) -> None:
+        try:
+            os.unlink(self._tmp_path)
+        except OSError:
+            pass
@@ -0,0 +1,75 @@
+"""
+Leitura sequencial de um objeto por byte-ranges paralelos.
+
+Usado no streaming de claim checks grandes: o gunzip incremental lê o
+objeto em ordem, enquanto os próximos ranges já estão sendo baixados em
+paralelo. A memória fica limitada a prefetch * part_size, não ao tamanho
+do arquivo.
+"""
+import io
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Callable, Deque, Optional
+
+
+class RangedStream(io.RawIOBase):
+    """Stream binário somente leitura montado a partir de ranges baixados em paralelo."""
+
+    def __init__(
+        self,
+        fetch_range: Callable[[int, int], bytes],
+        size: int,
+        part_size: int,
+        prefetch: int,
+        executor: Executor,
+    ):
+        """
+        Args:
+            fetch_range: Baixa (offset, tamanho) do objeto (bloqueante)
+            size: Tamanho total do objeto
+            part_size: Tamanho de cada range
+            prefetch: Ranges em andamento/prontos à frente da leitura
+            executor: Pool que baixa os ranges (não pode ser o mesmo da
+                thread leitora, senão ela pode esperar por si mesma)
+        """
+        super().__init__()
+        self._fetch_range = fetch_range
+        self._size = size
+        self._part_size = max(1, part_size)
+        self._prefetch = max(1, prefetch)
+        self._executor = executor
+        self._next_offset = 0
+        self._parts: Deque[Future] = deque()
+        self._current: Optional[memoryview] = None
+        self._position = 0
+        self._fill()
+
+    def _fill(self) -> None:
+        while len(self._parts) < self._prefetch and self._next_offset < self._size:
+            length = min(self._part_size, self._size - self._next_offset)
+            self._parts.append(
+                self._executor.submit(self._fetch_range, self._next_offset, length)
+            )
+            self._next_offset += length
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._current is None or self._position >= len(self._current):
+            if not self._parts:
+                return 0
+            self._current = memoryview(self._parts.popleft().result())
+            self._position = 0
+            self._fill()
+        count = min(len(buffer), len(self._current) - self._position)
+        buffer[:count] = self._current[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def close(self) -> None:
+        for part in self._parts:
+            part.cancel()
+        self._parts.clear()
+        self._current = None
+        super().close()
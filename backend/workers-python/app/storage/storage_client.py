@@ -2,17 +2,49 @@
 Storage Client - Claim Check Pattern
 
 Gerencia download de arquivos do Object Storage (MinIO/S3).
+
+O SDK do MinIO é bloqueante: toda chamada de I/O roda em um pool de
+threads dedicado (STORAGE_MAX_CONCURRENCY), com um pool urllib3 do mesmo
+tamanho e timeouts/retries configuráveis, para não travar o event loop.
+
+Objetos a partir de STORAGE_RANGED_GET_MIN_BYTES são baixados em
+byte-ranges paralelos, tanto no download inteiro (fetch_file) quanto no
+streaming (open_stream, via RangedStream).
 """
+import asyncio
+import functools
 import gzip
 import json
-from typing import Dict, Any, Optional
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, BinaryIO, Dict, Any, List, Optional, Tuple
 from pathlib import Path
 import structlog
 
 from app.core.config import settings
+from app.storage.json_stream import JsonArrayStream, iter_chunks
+from app.storage.local_cache import CacheWriter, ClaimCheckCache
+from app.storage.ranged_stream import RangedStream
 
 logger = structlog.get_logger(__name__)
 
+# Limite de chaves por requisição DeleteObjects (S3/MinIO)
+DELETE_BATCH_MAX_KEYS = 1000
+
+
+class _CacheTee:
+    """Repassa as leituras do stream descomprimido para um CacheWriter."""
+    
+    def __init__(self, stream: BinaryIO, writer: CacheWriter):
+        self._stream = stream
+        self._writer = writer
+    
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        if data:
+            self._writer.write(data)
+        return data
+
 
 class StorageClient:
     """Cliente para Object Storage (MinIO/S3)."""
@@ -20,9 +52,46 @@ class StorageClient:
     def __init__(self):
         """Inicializa cliente de storage."""
         self.client = None
-        self.storage_type = settings.STORAGE_TYPE or 'minio'
+        self.storage_type = (settings.STORAGE_TYPE or 'minio').lower()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.STORAGE_MAX_CONCURRENCY),
+            thread_name_prefix="storage",
+        )
+        # Ranges do streaming: a thread leitora roda no pool acima e espera
+        # pelos ranges, então eles precisam de um pool próprio
+        self._range_executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.STORAGE_MAX_CONCURRENCY),
+            thread_name_prefix="storage-range",
+        )
+        self.cache = None
+        if settings.STORAGE_CACHE_DIR:
+            self.cache = ClaimCheckCache(settings.STORAGE_CACHE_DIR, settings.STORAGE_CACHE_MAX_BYTES)
         self._init_client()
     
+    @property
+    def is_object_store(self) -> bool:
+        """MinIO ou S3 (mesmo SDK)."""
+        return self.storage_type in ('minio', 's3')
+    
+    def _http_client(self):
+        """Pool urllib3 dimensionado para a concorrência do storage."""
+        import urllib3
+        
+        return urllib3.PoolManager(
+            maxsize=max(1, settings.STORAGE_MAX_CONCURRENCY),
+            # Sem bloquear: streams abertos seguram conexões fora das threads do pool
+            block=False,
+            timeout=urllib3.Timeout(
+                connect=settings.STORAGE_CONNECT_TIMEOUT,
+                read=settings.STORAGE_READ_TIMEOUT,
+            ),
+            retries=urllib3.Retry(
+                total=settings.STORAGE_MAX_RETRIES,
+                backoff_factor=0.2,
+                status_forcelist=[500, 502, 503, 504],
+            ),
+        )
+    
     def _init_client(self):
         """Inicializa cliente baseado no tipo de storage."""
         if self.storage_type == 'minio':
@@ -36,20 +105,48 @@ class StorageClient:
                     parts = endpoint.split(':')
                     endpoint = parts[0]
                     port = int(parts[1]) if len(parts) > 1 else None
+                port = port or int(settings.MINIO_PORT or '9000')
                 
                 self.client = Minio(
-                    endpoint,
-                    port=port or int(settings.MINIO_PORT or '9000'),
+                    f"{endpoint}:{port}",
                     access_key=settings.MINIO_ACCESS_KEY,
                     secret_key=settings.MINIO_SECRET_KEY,
                     secure=settings.MINIO_USE_SSL == 'true',
+                    region=settings.MINIO_REGION or None,
+                    http_client=self._http_client(),
                 )
                 
                 logger.info(
                     "Cliente MinIO inicializado",
                     endpoint=endpoint,
-                    port=port or settings.MINIO_PORT,
+                    port=port,
                     bucket=settings.MINIO_BUCKET,
+                    max_concurrency=settings.STORAGE_MAX_CONCURRENCY,
+                )
+            except ImportError:
+                logger.error("Biblioteca minio não instalada")
+                raise
+        
+        elif self.storage_type == 's3':
+            try:
+                from minio import Minio
+                
+                # S3 (AWS ou compatível) pelo mesmo SDK; credenciais/bucket de MINIO_*
+                self.client = Minio(
+                    settings.S3_ENDPOINT,
+                    access_key=settings.MINIO_ACCESS_KEY,
+                    secret_key=settings.MINIO_SECRET_KEY,
+                    secure=True,
+                    region=settings.MINIO_REGION or None,
+                    http_client=self._http_client(),
+                )
+                
+                logger.info(
+                    "Cliente S3 inicializado",
+                    endpoint=settings.S3_ENDPOINT,
+                    region=settings.MINIO_REGION,
+                    bucket=settings.MINIO_BUCKET,
+                    max_concurrency=settings.STORAGE_MAX_CONCURRENCY,
                 )
             except ImportError:
                 logger.error("Biblioteca minio não instalada")
@@ -64,18 +161,143 @@ class StorageClient:
         else:
             raise ValueError(f"Tipo de storage não suportado: {self.storage_type}")
     
-    async def download_file(self, file_path: str) -> list:
+    async def _run(self, fn, *args, **kwargs):
+        """Executa uma chamada bloqueante no pool de threads do storage."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(fn, *args, **kwargs),
+        )
+    
+    def close(self) -> None:
+        """Encerra os pools de threads do storage."""
+        self._executor.shutdown(wait=True)
+        self._range_executor.shutdown(wait=True)
+    
+    async def download_file(self, file_path: str, size_hint: Optional[int] = None) -> list:
         """
         Baixa arquivo do storage e descomprime.
         
         Args:
             file_path: Caminho do arquivo (claim check)
+            size_hint: Tamanho informado na mensagem (habilita GET por ranges)
             
         Returns:
             Dados descomprimidos (dict ou list)
         """
+        cached, etag = await self.lookup_cache(file_path)
+        if cached is not None:
+            return cached
+        
+        compressed_data, etag = await self.fetch_file(file_path, size_hint)
+        try:
+            return await asyncio.to_thread(self.decode_payload, compressed_data, file_path, etag)
+        except Exception as e:
+            logger.error(
+                "Erro ao descomprimir arquivo do storage",
+                file_path=file_path,
+                error=str(e),
+                exc_info=True,
+            )
+            raise
+    
+    async def fetch_file(
+        self,
+        file_path: str,
+        size_hint: Optional[int] = None,
+    ) -> Tuple[bytes, Optional[str]]:
+        """
+        Baixa o arquivo do storage sem descomprimir.
+        
+        Args:
+            file_path: Caminho do arquivo (claim check)
+            size_hint: Tamanho informado na mensagem; a partir de
+                STORAGE_RANGED_GET_MIN_BYTES o download é feito em ranges paralelos
+            
+        Returns:
+            (conteúdo comprimido (GZIP), ETag da resposta) — o ETag serve
+            para gravar no cache local sem um stat_object extra
+        """
+        if self._use_ranged(size_hint):
+            return await self._fetch_ranged(file_path)
+        return await self._run(self._fetch_file_sync, file_path)
+    
+    def _use_ranged(self, size_hint: Optional[int]) -> bool:
+        """Objeto grande em MinIO/S3: baixar em ranges paralelos."""
+        return bool(
+            self.is_object_store
+            and settings.STORAGE_RANGED_GET_ENABLED
+            and size_hint
+            and size_hint >= settings.STORAGE_RANGED_GET_MIN_BYTES
+        )
+    
+    async def _fetch_ranged(self, file_path: str) -> Tuple[bytearray, Optional[str]]:
+        """
+        Baixa um objeto grande em byte-ranges paralelos.
+        
+        Cada range é lido (readinto) direto na fatia correspondente de um
+        único buffer pré-alocado, sem cópias intermediárias. O paralelismo
+        por arquivo é limitado por STORAGE_RANGED_GET_CONCURRENCY.
+        """
+        stat = await self._run(self.client.stat_object, settings.MINIO_BUCKET, file_path)
+        size = stat.size
+        part_size = max(1, settings.STORAGE_RANGED_GET_PART_SIZE)
+        if size <= part_size:
+            return await self._run(self._fetch_file_sync, file_path)
+        
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        semaphore = asyncio.Semaphore(max(1, settings.STORAGE_RANGED_GET_CONCURRENCY))
+        
+        async def fetch_part(offset: int):
+            async with semaphore:
+                await self._run(
+                    self._read_range,
+                    file_path,
+                    view[offset:offset + part_size],
+                    offset,
+                )
+        
+        await asyncio.gather(*(fetch_part(offset) for offset in range(0, size, part_size)))
+        
+        logger.debug(
+            "Arquivo baixado em ranges",
+            file_path=file_path,
+            size=size,
+            parts=(size + part_size - 1) // part_size,
+        )
+        return buffer, stat.etag
+    
+    def _read_range(self, file_path: str, target: memoryview, offset: int) -> None:
+        """Lê um byte-range do objeto direto no buffer de destino."""
+        response = self.client.get_object(
+            settings.MINIO_BUCKET,
+            file_path,
+            offset=offset,
+            length=len(target),
+        )
+        try:
+            filled = 0
+            while filled < len(target):
+                read = response.readinto(target[filled:])
+                if not read:
+                    raise IOError(
+                        f"Range incompleto de {file_path}: {filled}/{len(target)} bytes (offset {offset})"
+                    )
+                filled += read
+        finally:
+            response.close()
+            response.release_conn()
+    
+    def _read_range_bytes(self, file_path: str, offset: int, length: int) -> bytearray:
+        """Lê um byte-range do objeto em um buffer novo."""
+        buffer = bytearray(length)
+        self._read_range(file_path, memoryview(buffer), offset)
+        return buffer
+    
+    def _fetch_file_sync(self, file_path: str) -> Tuple[bytes, Optional[str]]:
         try:
-            if self.storage_type == 'minio':
+            if self.is_object_store:
                 # Baixar do MinIO
                 from minio.error import S3Error
                 
@@ -86,9 +308,13 @@ class StorageClient:
                     )
                     
                     # Ler dados comprimidos
-                    compressed_data = response.read()
-                    response.close()
-                    response.release_conn()
+                    try:
+                        compressed_data = response.read()
+                        # Mesmo formato do stat_object (sem aspas)
+                        etag = (response.headers.get('ETag') or '').strip('"') or None
+                    finally:
+                        response.close()
+                        response.release_conn()
                     
                 except S3Error as e:
                     logger.error(
@@ -108,39 +334,12 @@ class StorageClient:
                 
                 with open(full_path, 'rb') as f:
                     compressed_data = f.read()
+                    etag = self._local_etag(os.fstat(f.fileno()))
             
             else:
                 raise ValueError(f"Tipo de storage não suportado: {self.storage_type}")
             
-            # Descomprimir GZIP
-            decompressed_data = gzip.decompress(compressed_data)
-            
-            # Deserializar JSON
-            # Usar orjson se disponível (mais rápido)
-            try:
-                import orjson
-                data = orjson.loads(decompressed_data)
-            except ImportError:
-                data = json.loads(decompressed_data.decode('utf-8'))
-            
-            logger.info(
-                "Arquivo baixado e descomprimido",
-                file_path=file_path,
-                compressed_size=len(compressed_data),
-                decompressed_size=len(decompressed_data),
-            )
-            
-            # Garantir que retorna lista (formato esperado)
-            if isinstance(data, list):
-                return data
-            elif isinstance(data, dict):
-                # Se for dict com 'data', extrair
-                if 'data' in data:
-                    return data['data'] if isinstance(data['data'], list) else [data['data']]
-                else:
-                    return [data]
-            else:
-                return [data]
+            return compressed_data, etag
         
         except Exception as e:
             logger.error(
@@ -151,6 +350,221 @@ class StorageClient:
             )
             raise
     
+    async def lookup_cache(self, file_path: str):
+        """
+        Procura o claim check no cache local (STORAGE_CACHE_DIR).
+        
+        O ETag atual (stat_object) só é consultado se o caminho já tem alguma
+        versão em cache (retry/replay); no primeiro download de um claim
+        check não há ida extra ao storage e o ETag vem da resposta do GET.
+        
+        Returns:
+            (itens ou None, etag) — o etag serve para gravar no cache após o download
+        """
+        mapped, etag = await self._lookup_mapped(file_path)
+        if mapped is None:
+            return None, etag
+        try:
+            # A view precisa ser liberada antes de fechar o mmap
+            with memoryview(mapped) as view:
+                data = await asyncio.to_thread(self._parse_json, view)
+        finally:
+            mapped.close()
+        logger.debug("Claim check lido do cache local", file_path=file_path)
+        return self.normalize_payload(data), etag
+    
+    async def _lookup_mapped(self, file_path: str):
+        """(mmap do JSON em cache ou None, etag) — ver lookup_cache."""
+        if self.cache is None:
+            return None, None
+        if not await self._run(self.cache.contains, file_path):
+            return None, None
+        try:
+            etag = await self._run(self._etag, file_path)
+        except Exception as e:
+            logger.warn("Erro ao obter ETag para o cache", file_path=file_path, error=str(e))
+            return None, None
+        mapped = await self._run(self.cache.get, file_path, etag)
+        return mapped, etag
+    
+    def _etag(self, file_path: str) -> str:
+        """ETag do objeto (storage local: mtime + tamanho)."""
+        if self.is_object_store:
+            return self.client.stat_object(settings.MINIO_BUCKET, file_path).etag
+        storage_path = Path(settings.STORAGE_LOCAL_PATH or '/app/storage')
+        return self._local_etag((storage_path / file_path).stat())
+    
+    @staticmethod
+    def _local_etag(stat: os.stat_result) -> str:
+        """ETag do storage local: mtime + tamanho."""
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+    
+    @staticmethod
+    def _parse_json(raw) -> Any:
+        # Usar orjson se disponível (mais rápido)
+        try:
+            import orjson
+            return orjson.loads(raw)
+        except ImportError:
+            return json.loads(bytes(raw).decode('utf-8'))
+    
+    def decode_payload(
+        self,
+        compressed_data: bytes,
+        file_path: Optional[str] = None,
+        etag: Optional[str] = None,
+    ) -> list:
+        """
+        Descomprime (GZIP) e desserializa (JSON) o conteúdo de um claim check.
+        
+        Síncrono: pode rodar em thread para não segurar o event loop. Com
+        etag e cache ativo, o conteúdo descomprimido é gravado no cache local.
+        
+        Returns:
+            Lista de itens de telemetria
+        """
+        # Descomprimir GZIP
+        decompressed_data = gzip.decompress(compressed_data)
+        
+        if self.cache is not None and file_path and etag:
+            try:
+                self.cache.put(file_path, etag, decompressed_data)
+            except OSError as e:
+                logger.warn("Erro ao gravar claim check no cache", file_path=file_path, error=str(e))
+        
+        # Deserializar JSON
+        data = self._parse_json(decompressed_data)
+        
+        logger.info(
+            "Arquivo baixado e descomprimido",
+            file_path=file_path,
+            compressed_size=len(compressed_data),
+            decompressed_size=len(decompressed_data),
+        )
+        
+        return StorageClient.normalize_payload(data)
+    
+    @staticmethod
+    def normalize_payload(data: Any) -> list:
+        """Garante o formato de lista de itens (aceita {"data": [...]} e item único)."""
+        # Garantir que retorna lista (formato esperado)
+        if isinstance(data, list):
+            return data
+        elif isinstance(data, dict):
+            # Se for dict com 'data', extrair
+            if 'data' in data:
+                return data['data'] if isinstance(data['data'], list) else [data['data']]
+            else:
+                return [data]
+        else:
+            return [data]
+    
+    def open_stream(
+        self,
+        file_path: str,
+        size_hint: Optional[int] = None,
+    ) -> Tuple[BinaryIO, Optional[str]]:
+        """
+        Abre o arquivo comprimido para leitura incremental (bloqueante).
+        
+        MinIO: resposta HTTP lida sob demanda (sem carregar o objeto inteiro);
+        a partir de STORAGE_RANGED_GET_MIN_BYTES (size_hint), os próximos
+        ranges são baixados em paralelo enquanto o atual é lido.
+        Fechar com close_stream.
+        
+        Returns:
+            (stream, ETag do objeto) — o ETag serve para gravar no cache local
+        """
+        if self._use_ranged(size_hint):
+            stat = self.client.stat_object(settings.MINIO_BUCKET, file_path)
+            stream = RangedStream(
+                functools.partial(self._read_range_bytes, file_path),
+                stat.size,
+                settings.STORAGE_RANGED_GET_PART_SIZE,
+                settings.STORAGE_RANGED_GET_CONCURRENCY,
+                self._range_executor,
+            )
+            return stream, stat.etag
+        if self.is_object_store:
+            response = self.client.get_object(settings.MINIO_BUCKET, file_path)
+            return response, (response.headers.get('ETag') or '').strip('"') or None
+        if self.storage_type == 'local':
+            storage_path = Path(settings.STORAGE_LOCAL_PATH or '/app/storage')
+            full_path = storage_path / file_path
+            if not full_path.exists():
+                raise FileNotFoundError(f"Arquivo não encontrado: {full_path}")
+            f = open(full_path, 'rb')
+            return f, self._local_etag(os.fstat(f.fileno()))
+        raise ValueError(f"Tipo de storage não suportado: {self.storage_type}")
+    
+    @staticmethod
+    def close_stream(stream: BinaryIO) -> None:
+        """Fecha o stream (e devolve a conexão ao pool, no caso do MinIO)."""
+        stream.close()
+        release_conn = getattr(stream, 'release_conn', None)
+        if release_conn is not None:
+            release_conn()
+    
+    async def iter_payload_chunks(
+        self,
+        file_path: str,
+        chunk_items: int,
+        size_hint: Optional[int] = None,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Entrega os itens de um claim check em blocos, sem descomprimir/parsear tudo.
+        
+        gunzip incremental direto do stream + parser incremental do array JSON;
+        leitura e parsing rodam em thread. O pico de memória depende de
+        chunk_items (e dos ranges em prefetch), não do tamanho do arquivo.
+        
+        Com cache local, uma versão já em cache é lida do disco (mmap) sem
+        download; senão o JSON descomprimido é gravado no cache enquanto é
+        lido e só entra nele se o arquivo for lido até o fim.
+        """
+        mapped, etag = await self._lookup_mapped(file_path)
+        writer = None
+        if mapped is not None:
+            stream = mapped
+            source = mapped
+        else:
+            stream, etag = await self._run(self.open_stream, file_path, size_hint)
+            source = gzip.GzipFile(fileobj=stream, mode='rb')
+            if self.cache is not None and etag:
+                try:
+                    writer = await self._run(self.cache.writer, file_path, etag)
+                except OSError as e:
+                    logger.warn("Erro ao gravar claim check no cache", file_path=file_path, error=str(e))
+                if writer is not None:
+                    source = _CacheTee(source, writer)
+        try:
+            parser = JsonArrayStream(source)
+            chunks = iter_chunks(iter(parser), max(1, chunk_items))
+            count = 0
+            while True:
+                chunk = await self._run(next, chunks, None)
+                if chunk is None:
+                    break
+                if not parser.is_array:
+                    chunk = self.normalize_payload(chunk[0])
+                count += len(chunk)
+                yield chunk
+            if writer is not None:
+                try:
+                    await self._run(writer.commit)
+                except OSError as e:
+                    logger.warn("Erro ao gravar claim check no cache", file_path=file_path, error=str(e))
+            logger.info(
+                "Arquivo lido em streaming",
+                file_path=file_path,
+                items=count,
+                cached=mapped is not None,
+            )
+        finally:
+            if writer is not None:
+                await self._run(writer.discard)
+            await self._run(self.close_stream, stream)
+    
     async def delete_file(self, file_path: str) -> None:
         """
         Remove arquivo do storage após processamento.
@@ -159,19 +573,7 @@ class StorageClient:
             file_path: Caminho do arquivo
         """
         try:
-            if self.storage_type == 'minio':
-                self.client.remove_object(
-                    settings.MINIO_BUCKET,
-                    file_path,
-                )
-            
-            elif self.storage_type == 'local':
-                storage_path = Path(settings.STORAGE_LOCAL_PATH or '/app/storage')
-                full_path = storage_path / file_path
-                
-                if full_path.exists():
-                    full_path.unlink()
-            
+            await self._run(self._delete_file_sync, file_path)
             logger.debug("Arquivo removido do storage", file_path=file_path)
         
         except Exception as e:
@@ -181,6 +583,120 @@ class StorageClient:
                 error=str(e),
             )
             # Não falhar se não conseguir remover
+    
+    def _delete_file_sync(self, file_path: str) -> None:
+        if self.is_object_store:
+            self.client.remove_object(
+                settings.MINIO_BUCKET,
+                file_path,
+            )
+        
+        elif self.storage_type == 'local':
+            storage_path = Path(settings.STORAGE_LOCAL_PATH or '/app/storage')
+            full_path = storage_path / file_path
+            
+            if full_path.exists():
+                full_path.unlink()
+
+    
+    async def delete_files(self, file_paths: List[str]) -> List[str]:
+        """
+        Remove vários arquivos (remove_objects em lotes de até 1000 chaves).
+        
+        Args:
+            file_paths: Caminhos dos arquivos
+            
+        Returns:
+            Caminhos que não puderam ser removidos
+        """
+        failed: List[str] = []
+        for start in range(0, len(file_paths), DELETE_BATCH_MAX_KEYS):
+            batch = file_paths[start:start + DELETE_BATCH_MAX_KEYS]
+            failed.extend(await self._run(self._delete_files_sync, batch))
+        return failed
+    
+    def _delete_files_sync(self, file_paths: List[str]) -> List[str]:
+        failed: List[str] = []
+        if self.is_object_store:
+            from minio.deleteobjects import DeleteObject
+            
+            # remove_objects é lazy: os erros só são enviados ao iterar
+            errors = self.client.remove_objects(
+                settings.MINIO_BUCKET,
+                [DeleteObject(path) for path in file_paths],
+            )
+            for error in errors:
+                if error.code == 'NoSuchKey':
+                    continue
+                failed.append(error.name)
+                logger.warn(
+                    "Erro ao remover arquivo do storage",
+                    file_path=error.name,
+                    error=error.message,
+                )
+        
+        elif self.storage_type == 'local':
+            storage_path = Path(settings.STORAGE_LOCAL_PATH or '/app/storage')
+            for file_path in file_paths:
+                try:
+                    (storage_path / file_path).unlink()
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    failed.append(file_path)
+                    logger.warn(
+                        "Erro ao remover arquivo do storage",
+                        file_path=file_path,
+                        error=str(e),
+                    )
+        return failed
+
+    
+    async def first_key(self, prefix: str) -> Optional[str]:
+        """
+        Primeiro nome (objeto ou subprefixo) sob o prefixo, em ordem lexicográfica.
+        
+        Só para MinIO/S3: a listagem não recursiva devolve um nível por vez,
+        então basta a primeira entrada.
+        """
+        def first() -> Optional[str]:
+            for obj in self.client.list_objects(settings.MINIO_BUCKET, prefix=prefix, recursive=False):
+                return obj.object_name
+            return None
+        
+        return await self._run(first)
+    
+    async def delete_prefix(self, prefix: str, end_before: Optional[str] = None) -> Tuple[int, int]:
+        """
+        Remove em lote os objetos sob o prefixo (MinIO/S3).
+        
+        Args:
+            prefix: Prefixo dos objetos
+            end_before: Para na primeira chave >= end_before (listagem é ordenada)
+            
+        Returns:
+            (removidos, falhas)
+        """
+        return await self._run(self._delete_prefix_sync, prefix, end_before)
+    
+    def _delete_prefix_sync(self, prefix: str, end_before: Optional[str]) -> Tuple[int, int]:
+        deleted = failed = 0
+        batch: List[str] = []
+        objects = self.client.list_objects(settings.MINIO_BUCKET, prefix=prefix, recursive=True)
+        for obj in objects:
+            if end_before is not None and obj.object_name >= end_before:
+                break
+            batch.append(obj.object_name)
+            if len(batch) >= DELETE_BATCH_MAX_KEYS:
+                errors = len(self._delete_files_sync(batch))
+                deleted += len(batch) - errors
+                failed += errors
+                batch = []
+        if batch:
+            errors = len(self._delete_files_sync(batch))
+            deleted += len(batch) - errors
+            failed += errors
+        return deleted, failed
 
 
 # Instância global
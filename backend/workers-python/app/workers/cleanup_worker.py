@@ -2,10 +2,20 @@
 Worker de limpeza de arquivos antigos do storage.
 
 Remove arquivos processados após período de retenção.
+
+Os claim checks são gravados pelo gateway em
+telemetry/<timestamp ISO com ':' e '.' trocados por '-'>/<uuid>.json.gz,
+então a ordem lexicográfica das chaves é a ordem cronológica. A limpeza
+parte da chave mais antiga e remove prefixos de dia inteiros (em paralelo,
+com remove_objects) até o dia do corte, que é percorrido só até a chave de
+corte: o custo acompanha o volume expirado, não o tamanho do bucket.
+Chaves fora desse layout não são consideradas.
 """
 import asyncio
-from datetime import datetime, timedelta
+import os
+from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
+from typing import Tuple
 import structlog
 
 from app.core.config import settings
@@ -13,6 +23,104 @@ from app.storage.storage_client import storage_client
 
 logger = structlog.get_logger(__name__)
 
+TELEMETRY_PREFIX = 'telemetry/'
+
+
+def _key_timestamp(moment: datetime) -> str:
+    """Timestamp no formato do caminho do claim check (ex.: 2024-01-31T12-00-00-000Z)."""
+    return f"{moment:%Y-%m-%dT%H-%M-%S}-{moment.microsecond // 1000:03d}Z"
+
+
+def _days_between(start: date, end: date):
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+async def _cleanup_object_store(cutoff_date: datetime) -> Tuple[int, int]:
+    """Remove prefixos de dia expirados do bucket. Retorna (removidos, falhas)."""
+    cutoff_key = TELEMETRY_PREFIX + _key_timestamp(cutoff_date)
+    oldest = await storage_client.first_key(TELEMETRY_PREFIX)
+    if oldest is None or oldest >= cutoff_key:
+        return 0, 0
+    try:
+        start_day = date.fromisoformat(oldest[len(TELEMETRY_PREFIX):len(TELEMETRY_PREFIX) + 10])
+    except ValueError:
+        logger.warn("Chave fora do layout de data, limpeza ignorada", key=oldest)
+        return 0, 0
+    
+    semaphore = asyncio.Semaphore(max(1, settings.CLEANUP_CONCURRENCY))
+    
+    async def purge_day(day: date) -> Tuple[int, int]:
+        prefix = TELEMETRY_PREFIX + day.isoformat()
+        # Só o dia do corte é parcial; os anteriores expiraram por inteiro
+        end_before = cutoff_key if day == cutoff_date.date() else None
+        async with semaphore:
+            deleted, failed = await storage_client.delete_prefix(prefix, end_before)
+        if deleted or failed:
+            logger.debug("Prefixo de dia limpo", prefix=prefix, deleted=deleted, failed=failed)
+        return deleted, failed
+    
+    results = await asyncio.gather(
+        *(purge_day(day) for day in _days_between(start_day, cutoff_date.date()))
+    )
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
+
+def _remove_tree(path: str) -> Tuple[int, int]:
+    """Remove um diretório de claim check (arquivos + diretório) via scandir."""
+    deleted = failed = 0
+    try:
+        if not os.path.isdir(path):
+            os.unlink(path)
+            return 1, 0
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        sub_deleted, sub_failed = _remove_tree(entry.path)
+                        deleted += sub_deleted
+                        failed += sub_failed
+                    else:
+                        os.unlink(entry.path)
+                        deleted += 1
+                except OSError as e:
+                    failed += 1
+                    logger.warn("Erro ao remover arquivo", file=entry.path, error=str(e))
+        os.rmdir(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warn("Erro ao remover diretório", path=path, error=str(e))
+    return deleted, failed
+
+
+async def _cleanup_local(cutoff_date: datetime) -> Tuple[int, int]:
+    """Remove diretórios de timestamp expirados do storage local em paralelo."""
+    storage_path = Path(settings.STORAGE_LOCAL_PATH or '/app/storage')
+    telemetry_path = storage_path / 'telemetry'
+    cutoff_name = _key_timestamp(cutoff_date)
+    
+    def expired_entries():
+        if not telemetry_path.exists():
+            return []
+        with os.scandir(telemetry_path) as entries:
+            return [
+                entry.path for entry in entries
+                if entry.name[:1].isdigit() and entry.name < cutoff_name
+            ]
+    
+    paths = await asyncio.to_thread(expired_entries)
+    semaphore = asyncio.Semaphore(max(1, settings.CLEANUP_CONCURRENCY))
+    
+    async def purge(path: str) -> Tuple[int, int]:
+        async with semaphore:
+            return await asyncio.to_thread(_remove_tree, path)
+    
+    results = await asyncio.gather(*(purge(path) for path in paths))
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
 
 async def cleanup_old_files():
     """
@@ -21,7 +129,8 @@ async def cleanup_old_files():
     Executa limpeza baseada em FILE_RETENTION_DAYS.
     """
     retention_days = settings.FILE_RETENTION_DAYS
-    cutoff_date = datetime.utcnow() - timedelta(days=retention_days)
+    # UTC com timezone: mesmo relógio das chaves geradas pelo gateway
+    cutoff_date = datetime.now(timezone.utc) - timedelta(days=retention_days)
     
     logger.info(
         "Iniciando limpeza de arquivos antigos",
@@ -30,52 +139,14 @@ async def cleanup_old_files():
     )
     
     try:
-        if storage_client.storage_type == 'minio':
-            # Listar objetos no bucket
-            objects = storage_client.client.list_objects(
-                settings.MINIO_BUCKET,
-                prefix='telemetry/',
-                recursive=True,
-            )
-            
-            deleted_count = 0
-            for obj in objects:
-                # Verificar data do objeto
-                if obj.last_modified < cutoff_date:
-                    try:
-                        storage_client.client.remove_object(
-                            settings.MINIO_BUCKET,
-                            obj.object_name,
-                        )
-                        deleted_count += 1
-                        logger.debug("Arquivo antigo removido", file=obj.object_name)
-                    except Exception as e:
-                        logger.warn("Erro ao remover arquivo", file=obj.object_name, error=str(e))
-            
-            logger.info("Limpeza concluída", deleted_count=deleted_count)
-        
+        if storage_client.is_object_store:
+            deleted_count, failed_count = await _cleanup_object_store(cutoff_date)
         elif storage_client.storage_type == 'local':
-            # Limpeza de arquivos locais
-            storage_path = Path(settings.STORAGE_LOCAL_PATH or '/app/storage')
-            telemetry_path = storage_path / 'telemetry'
-            
-            if not telemetry_path.exists():
-                return
-            
-            deleted_count = 0
-            for file_path in telemetry_path.rglob('*.json.gz'):
-                try:
-                    file_stat = file_path.stat()
-                    file_time = datetime.fromtimestamp(file_stat.st_mtime)
-                    
-                    if file_time < cutoff_date:
-                        file_path.unlink()
-                        deleted_count += 1
-                        logger.debug("Arquivo antigo removido", file=str(file_path))
-                except Exception as e:
-                    logger.warn("Erro ao remover arquivo", file=str(file_path), error=str(e))
-            
-            logger.info("Limpeza concluída", deleted_count=deleted_count)
+            deleted_count, failed_count = await _cleanup_local(cutoff_date)
+        else:
+            return
+        
+        logger.info("Limpeza concluída", deleted_count=deleted_count, failed_count=failed_count)
     
     except Exception as e:
         logger.error("Erro na limpeza de arquivos", exc_info=e)
@@ -0,0 +1,82 @@
+"""
+CLI da dead-letter queue de telemetria.
+
+Uso:
+    python -m app.workers.dlq_redrive list [--limit 50] [--error-type FileNotFoundError]
+    python -m app.workers.dlq_redrive redrive --all [--error-type S3Error] [--limit 500]
+    python -m app.workers.dlq_redrive redrive --id 10 --id 11
+
+As entradas re-enfileiradas voltam com tentativas zeradas e são
+reprocessadas pelo loop de retry dos consumidores em execução.
+"""
+import argparse
+import asyncio
+import sys
+
+from app.consumers import retry_store
+from app.core.database import AsyncSessionLocal, close_db
+
+
+async def _list(args) -> None:
+    async with AsyncSessionLocal() as db:
+        entries = await retry_store.list_dead(db, limit=args.limit, error_type=args.error_type)
+
+    if not entries:
+        print("✅ DLQ vazia")
+        return
+
+    for entry in entries:
+        print(
+            f"#{entry['id']} {entry['topic']}[{entry['partition']}]@{entry['offset']} "
+            f"tenant={entry['tenant_id']} tentativas={entry['attempts']} "
+            f"{entry['error_type']}: {(entry['last_error'] or '')[:120]}"
+        )
+        if entry['claim_check']:
+            print(f"    claim_check={entry['claim_check']}")
+    print(f"\n📦 {len(entries)} entradas listadas")
+
+
+async def _redrive(args) -> None:
+    if not args.all and not args.id:
+        print("Informe --all ou ao menos um --id")
+        sys.exit(1)
+
+    async with AsyncSessionLocal() as db:
+        count = await retry_store.redrive(
+            db,
+            ids=args.id or None,
+            error_type=args.error_type,
+            limit=args.limit,
+        )
+    print(f"✅ {count} entradas devolvidas para a fila de retry")
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Dead-letter queue de telemetria")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = sub.add_parser("list", help="Lista entradas da DLQ")
+    list_parser.add_argument("--limit", type=int, default=50)
+    list_parser.add_argument("--error-type", default=None)
+
+    redrive_parser = sub.add_parser("redrive", help="Re-enfileira entradas da DLQ")
+    redrive_parser.add_argument("--all", action="store_true", help="Todas as entradas (respeita filtros)")
+    redrive_parser.add_argument("--id", type=int, action="append", help="ID da entrada (repetível)")
+    redrive_parser.add_argument("--error-type", default=None)
+    redrive_parser.add_argument("--limit", type=int, default=None)
+    return parser
+
+
+async def main(argv=None) -> None:
+    args = _build_parser().parse_args(argv)
+    try:
+        if args.command == "list":
+            await _list(args)
+        else:
+            await _redrive(args)
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -54,6 +54,11 @@ async def run_migrations(command):
         "031_add_workspace_description",
         "032_users_name_backfill",
         "033_super_admin_flag",
+        "034_telemetry_retry_queue",
+        "035_telemetry_upload_dedup",
+        "036_entity_cache_notify",
+        "037_telemetry_unique_reading",
+        "038_entity_cache_notify_origin",
     ]
     migrations = [(name, *_load_migration(name)) for name in migration_names]
     
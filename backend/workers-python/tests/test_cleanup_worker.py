@@ -0,0 +1,127 @@
+import asyncio
+import importlib
+import os
+import tempfile
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from app.core.config import settings
+from app.storage.storage_client import StorageClient
+from app.workers import cleanup_worker
+from app.workers.cleanup_worker import TELEMETRY_PREFIX, _key_timestamp
+
+
+CUTOFF = datetime(2024, 3, 3, 12, 0, 0, 500000, tzinfo=timezone.utc)
+
+KEYS = sorted(
+    f"{TELEMETRY_PREFIX}{timestamp}/{name}.json.gz"
+    for timestamp, name in [
+        ("2024-03-01T08-00-00-000Z", "a"),
+        ("2024-03-02T23-59-59-999Z", "b"),
+        ("2024-03-03T11-59-59-999Z", "c"),
+        ("2024-03-03T12-00-00-500Z", "d"),
+        ("2024-03-03T18-00-00-000Z", "e"),
+        ("2024-03-04T00-00-00-000Z", "f"),
+    ]
+)
+
+
+class FakeBucketStorage:
+    """storage_client com listagem ordenada sobre uma lista de chaves."""
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.prefixes = []
+
+    async def first_key(self, prefix):
+        names = sorted(
+            prefix + key[len(prefix):].split("/", 1)[0] + "/"
+            for key in self.keys if key.startswith(prefix)
+        )
+        return names[0] if names else None
+
+    async def delete_prefix(self, prefix, end_before=None):
+        self.prefixes.append((prefix, end_before))
+        expired = [
+            key for key in self.keys
+            if key.startswith(prefix) and (end_before is None or key < end_before)
+        ]
+        self.keys = [key for key in self.keys if key not in expired]
+        return len(expired), 0
+
+
+def test_key_timestamp_matches_gateway_layout():
+    assert _key_timestamp(CUTOFF) == "2024-03-03T12-00-00-500Z"
+
+
+def test_object_store_cleanup_removes_expired_days_up_to_the_cutoff(monkeypatch):
+    fake = FakeBucketStorage(KEYS)
+    monkeypatch.setattr(cleanup_worker, "storage_client", fake)
+
+    deleted, failed = asyncio.run(cleanup_worker._cleanup_object_store(CUTOFF))
+
+    assert (deleted, failed) == (3, 0)
+    assert [key.rsplit("/", 1)[1] for key in fake.keys] == ["d.json.gz", "e.json.gz", "f.json.gz"]
+    # Dias inteiros antes do corte; só o dia do corte é limitado pela chave
+    assert sorted(fake.prefixes) == [
+        (TELEMETRY_PREFIX + "2024-03-01", None),
+        (TELEMETRY_PREFIX + "2024-03-02", None),
+        (TELEMETRY_PREFIX + "2024-03-03", TELEMETRY_PREFIX + "2024-03-03T12-00-00-500Z"),
+    ]
+
+
+def test_object_store_cleanup_skips_when_nothing_expired(monkeypatch):
+    fake = FakeBucketStorage([key for key in KEYS if key >= TELEMETRY_PREFIX + "2024-03-04"])
+    monkeypatch.setattr(cleanup_worker, "storage_client", fake)
+
+    assert asyncio.run(cleanup_worker._cleanup_object_store(CUTOFF)) == (0, 0)
+    assert fake.prefixes == []
+
+
+def test_local_cleanup_removes_expired_directories(monkeypatch):
+    root = tempfile.mkdtemp()
+    telemetry = os.path.join(root, "telemetry")
+    for key in KEYS:
+        path = os.path.join(root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "wb").close()
+    os.makedirs(os.path.join(telemetry, "not-a-date"))
+    monkeypatch.setattr(settings, "STORAGE_LOCAL_PATH", root)
+
+    deleted, failed = asyncio.run(cleanup_worker._cleanup_local(CUTOFF))
+
+    assert (deleted, failed) == (3, 0)
+    assert sorted(os.listdir(telemetry)) == [
+        "2024-03-03T12-00-00-500Z",
+        "2024-03-03T18-00-00-000Z",
+        "2024-03-04T00-00-00-000Z",
+        "not-a-date",
+    ]
+
+
+def test_delete_prefix_stops_at_end_before_and_batches(monkeypatch):
+    client = StorageClient()
+    client.client = SimpleNamespace(
+        list_objects=lambda bucket, prefix, recursive: (
+            SimpleNamespace(object_name=key) for key in KEYS if key.startswith(prefix)
+        )
+    )
+    batches = []
+
+    def delete_files(keys):
+        batches.append(list(keys))
+        return keys[:1] if len(batches) == 1 else []
+
+    monkeypatch.setattr(client, "_delete_files_sync", delete_files)
+    monkeypatch.setattr(importlib.import_module("app.storage.storage_client"), "DELETE_BATCH_MAX_KEYS", 2)
+
+    try:
+        deleted, failed = client._delete_prefix_sync(
+            TELEMETRY_PREFIX + "2024-03",
+            TELEMETRY_PREFIX + "2024-03-03T12-00-00-500Z",
+        )
+    finally:
+        client.close()
+
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert (deleted, failed) == (2, 1)
@@ -0,0 +1,97 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from app.processors import columnar
+from app.processors.columnar import TelemetryBatch
+from app.processors.entity_cache import CachedEquipment
+
+
+EQUIPMENT = CachedEquipment(id=10, tenant_id=1, organization_id=2, workspace_id=3)
+CREATED_AT = datetime(2024, 1, 1)
+
+
+@pytest.fixture(params=["numpy", "pure"])
+def backend(request, monkeypatch):
+    if request.param == "pure":
+        monkeypatch.setattr(columnar, "np", None)
+    return request.param
+
+
+def _readings():
+    return [
+        {
+            "sensor_datahora_coleta": "2024-03-01T12:00:05Z",
+            "valor": "21.5",
+            "sensor_bateria_pct": 87,
+            "sensor_sinal_rssi": "-70",
+        },
+        {
+            "timestamp": "2024-03-01T09:00:00-03:00",
+            "sensor_telemetria": "on",
+        },
+        {
+            "sensor_datahora_coleta": "2024-03-01T11:59:00",
+            "sensor_telemetria": 3,
+            "status": "ok",
+        },
+    ]
+
+
+def test_build_parses_timestamps_values_and_status(backend):
+    batch = TelemetryBatch.build(EQUIPMENT, [1, 2, 3], _readings())
+    records = batch.to_dicts()
+
+    assert len(batch) == 3
+    assert [record["timestamp"] for record in records] == [
+        datetime(2024, 3, 1, 12, 0, 5),
+        datetime(2024, 3, 1, 12, 0, 0),
+        datetime(2024, 3, 1, 11, 59, 0),
+    ]
+    assert [record["value"] for record in records] == [21.5, None, 3.0]
+    assert [record["status"] for record in records] == [None, "on", "ok"]
+    assert records[0]["equipment_id"] == 10
+    assert records[0]["workspace_id"] == 3
+
+
+def test_metadata_keeps_raw_payload_values(backend):
+    records = TelemetryBatch.build(EQUIPMENT, [1, 2, 3], _readings()).to_dicts()
+
+    assert records[0]["extra_metadata"] == {"battery": 87, "rssi": "-70"}
+    assert records[1]["extra_metadata"] is None
+
+
+def test_invalid_timestamp_falls_back_to_now(backend):
+    before = datetime.utcnow()
+    batch = TelemetryBatch.build(EQUIPMENT, [1, 2], [
+        {"sensor_datahora_coleta": "not a date", "valor": 1},
+        {"sensor_datahora_coleta": "2024-03-01T12:00:00", "valor": 2},
+    ])
+    timestamps = batch.to_dicts()
+
+    assert timestamps[0]["timestamp"] >= before.replace(microsecond=0)
+    assert timestamps[1]["timestamp"] == datetime(2024, 3, 1, 12, 0, 0)
+
+
+def test_dedupe_keeps_first_reading_per_sensor_and_timestamp(backend):
+    batch = TelemetryBatch.build(EQUIPMENT, [1, 1, 2], [
+        {"sensor_datahora_coleta": "2024-03-01T12:00:00Z", "valor": 1},
+        {"sensor_datahora_coleta": "2024-03-01T12:00:00", "valor": 2},
+        {"sensor_datahora_coleta": "2024-03-01T12:00:00Z", "valor": 3},
+    ])
+
+    assert batch.dedupe() == 1
+    assert [record["value"] for record in batch.to_dicts()] == [1.0, 3.0]
+
+
+def test_records_are_ordered_by_timestamp_for_copy(backend):
+    batch = TelemetryBatch.build(EQUIPMENT, [1, 2, 3], _readings())
+    rows = list(batch.records(CREATED_AT))
+
+    assert [row[0] for row in rows] == [3, 2, 1]
+    sensor_id, equipment_id, tenant_id, org_id, workspace_id, value, status, timestamp, metadata, created = rows[-1]
+    assert (equipment_id, tenant_id, org_id, workspace_id) == (10, 1, 2, 3)
+    assert value == 21.5
+    assert json.loads(metadata) == {"battery": 87, "rssi": "-70"}
+    assert created == CREATED_AT
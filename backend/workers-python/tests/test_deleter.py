@@ -0,0 +1,127 @@
+import asyncio
+import os
+import tempfile
+
+from app.storage import deleter as deleter_module
+from app.storage.deleter import JOURNAL_SUFFIX, DeferredDeleter, _read_journal
+
+
+class FakeStorage:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.deleted = []
+
+    async def delete_files(self, keys):
+        self.deleted.extend(key for key in keys if key not in self.failing)
+        return [key for key in keys if key in self.failing]
+
+
+def _deleter(journal_dir, storage=None):
+    return DeferredDeleter(
+        storage or FakeStorage(),
+        journal_dir=journal_dir,
+        batch_size=1000,
+        interval_seconds=3600,
+    )
+
+
+def _journal_keys(path):
+    with open(path) as f:
+        return _read_journal(f)
+
+
+def test_flush_compacts_journal_to_failed_keys():
+    journal_dir = tempfile.mkdtemp()
+    storage = FakeStorage(failing={"b"})
+
+    async def run():
+        deleter = _deleter(journal_dir, storage)
+        deleter.start()
+        for key in ("a", "b", "c"):
+            deleter.enqueue(key)
+        await deleter.flush()
+        with open(deleter._journal_path) as f:
+            lines = f.read().splitlines()
+        path = deleter._journal_path
+        await deleter.stop()
+        return deleter, lines, path
+
+    deleter, lines, path = asyncio.run(run())
+
+    assert sorted(storage.deleted) == ["a", "c"]
+    assert lines == ["+b"]
+    assert deleter.pending == 1
+    # Pendências sobrevivem ao stop para o próximo processo
+    assert _journal_keys(path) == ["b"]
+
+
+def test_stop_without_pending_removes_the_journal():
+    journal_dir = tempfile.mkdtemp()
+
+    async def run():
+        deleter = _deleter(journal_dir)
+        deleter.start()
+        deleter.enqueue("a")
+        await deleter.stop()
+
+    asyncio.run(run())
+
+    assert os.listdir(journal_dir) == []
+
+
+def test_orphan_journal_is_recovered_and_removed():
+    journal_dir = tempfile.mkdtemp()
+    orphan = os.path.join(journal_dir, f"deletes-1-dead{JOURNAL_SUFFIX}")
+    with open(orphan, "w") as f:
+        f.write("+a\n+b\n-a\n+c\n")
+    storage = FakeStorage()
+
+    async def run():
+        deleter = _deleter(journal_dir, storage)
+        deleter.start()
+        recovered = deleter.pending
+        await deleter.stop()
+        return recovered
+
+    assert asyncio.run(run()) == 2
+    assert sorted(storage.deleted) == ["b", "c"]
+    assert not os.path.exists(orphan)
+
+
+def test_recovery_does_not_take_a_journal_swapped_by_compaction(monkeypatch):
+    journal_dir = tempfile.mkdtemp()
+
+    async def run():
+        live = _deleter(journal_dir, FakeStorage(failing={"pending"}))
+        live.start()
+        live.enqueue("pending")
+        live_path = live._journal_path
+        live_inode = os.stat(live_path).st_ino
+        real_flock = deleter_module.fcntl.flock
+        raced = []
+
+        def racing_flock(fd, operation):
+            # O outro processo abriu o journal vivo; ele é compactado antes do flock
+            if not raced and os.fstat(fd).st_ino == live_inode:
+                raced.append(True)
+                live._compact()
+            return real_flock(fd, operation)
+
+        monkeypatch.setattr(deleter_module.fcntl, "flock", racing_flock)
+        other = _deleter(journal_dir)
+        other.start()
+        monkeypatch.setattr(deleter_module.fcntl, "flock", real_flock)
+
+        recovered = other.pending
+        exists = os.path.exists(live_path)
+        keys = _journal_keys(live_path) if exists else []
+        await other.stop()
+        await live.stop()
+        return raced, recovered, exists, keys
+
+    raced, recovered, exists, keys = asyncio.run(run())
+
+    assert raced
+    assert recovered == 0
+    assert exists
+    assert keys == ["pending"]
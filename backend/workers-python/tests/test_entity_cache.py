@@ -0,0 +1,100 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+from app.processors.entity_cache import (
+    KIND_EQUIPMENT,
+    NOTIFY_ORIGIN_SETTING,
+    EntityCache,
+    entity_cache,
+    entity_key,
+)
+from app.processors.telemetry_processor import TelemetryProcessor
+from app.sinks import NullSink
+
+
+KEY = entity_key(KIND_EQUIPMENT, "equip-1", 1, 2, 3)
+
+
+def _notification(origin=None):
+    payload = {
+        "table": KIND_EQUIPMENT,
+        "uuid": "equip-1",
+        "tenant_id": 1,
+        "organization_id": 2,
+        "workspace_id": 3,
+    }
+    if origin is not None:
+        payload["origin"] = origin
+    return json.dumps(payload)
+
+
+def _cache():
+    cache = EntityCache(max_size=10, ttl_seconds=60)
+    cache.put(KEY, "cached")
+    return cache
+
+
+def test_notification_from_another_process_invalidates():
+    cache = _cache()
+
+    cache.handle_notification(_notification(origin="other-host:1"))
+
+    assert cache.get(KEY) is None
+    assert cache.invalidations == 1
+
+
+def test_notification_without_origin_invalidates():
+    cache = _cache()
+
+    cache.handle_notification(_notification())
+
+    assert cache.get(KEY) is None
+
+
+def test_own_notification_is_ignored():
+    cache = _cache()
+
+    cache.handle_notification(_notification(origin=cache.origin))
+
+    assert cache.get(KEY) == "cached"
+    assert cache.invalidations == 0
+
+
+def test_invalid_notification_clears_the_cache():
+    cache = _cache()
+
+    cache.handle_notification("not json")
+
+    assert len(cache) == 0
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        yield
+
+    async def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+
+
+def test_metadata_refresh_is_tagged_with_this_process_only():
+    db = RecordingSession()
+    updated = []
+
+    async def update(stale, session):
+        updated.append(stale)
+        await session.execute("UPDATE equipments", None)
+
+    processor = TelemetryProcessor(sink=NullSink())
+    asyncio.run(processor._refresh_metadata(update, {10: ("name",)}, db))
+
+    assert updated == [{10: ("name",)}]
+    (set_sql, set_params), (update_sql, _), (reset_sql, reset_params) = db.statements
+    assert set_params == {"name": NOTIFY_ORIGIN_SETTING, "origin": entity_cache.origin}
+    assert update_sql == "UPDATE equipments"
+    assert reset_params == {"name": NOTIFY_ORIGIN_SETTING}
+    assert "''" in reset_sql
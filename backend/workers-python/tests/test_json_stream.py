@@ -0,0 +1,51 @@
+import io
+import json
+
+import pytest
+
+from app.storage.json_stream import JsonArrayStream, iter_chunks
+
+
+ITEMS = [
+    {"equip_uuid": "a", "sensor": [{"sensor_uuid": "s1", "valor": 1.5}]},
+    {"equip_uuid": "b, [x]", "name": "quote \" and {brace}", "path": "C:\\dir\\"},
+    [1, [2, [3]], {}],
+    "text",
+    42,
+    None,
+]
+
+
+def _stream(document, read_size):
+    return JsonArrayStream(io.BytesIO(document), read_size=read_size)
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_yields_each_top_level_element_across_block_boundaries(read_size):
+    document = json.dumps(ITEMS, indent=2).encode()
+    stream = _stream(document, read_size)
+
+    assert list(stream) == ITEMS
+    assert stream.is_array
+
+
+def test_empty_array_and_empty_document():
+    assert list(_stream(b"  [ ]  ", 1)) == []
+    assert list(_stream(b"", 1)) == []
+
+
+def test_non_array_document_is_yielded_whole():
+    stream = _stream(b'\n {"data": [1, 2]}', 4)
+
+    assert list(stream) == [{"data": [1, 2]}]
+    assert not stream.is_array
+
+
+def test_truncated_array_raises():
+    with pytest.raises(ValueError):
+        list(_stream(b'[{"a": 1}, {"b": ', 4))
+
+
+def test_iter_chunks_groups_items():
+    assert list(iter_chunks(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(iter_chunks(iter([]), 2)) == []
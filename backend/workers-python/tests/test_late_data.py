@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app.processors.late_data import (
+    CAGG_DAILY,
+    CAGG_HOURLY,
+    LateDataTracker,
+    _refresh_plan,
+)
+
+
+def _tracker(retention=None):
+    return LateDataTracker(
+        hourly_horizon=timedelta(hours=72),
+        daily_horizon=timedelta(days=7),
+        retention=retention,
+    )
+
+
+def _days_ago(days, hour=12):
+    now = datetime.utcnow()
+    return datetime(now.year, now.month, now.day, hour) - timedelta(days=days)
+
+
+@pytest.fixture(params=["list", "numpy"])
+def as_column(request):
+    if request.param == "numpy":
+        return lambda values: np.array(values, dtype="datetime64[us]")
+    return list
+
+
+def test_recent_batch_is_not_recorded(as_column):
+    tracker = _tracker()
+
+    tracker.record(as_column([datetime.utcnow() - timedelta(hours=1), datetime.utcnow()]))
+    tracker.record(as_column([]))
+
+    assert len(tracker) == 0
+
+
+def test_late_readings_are_recorded_as_min_max_per_day(as_column):
+    tracker = _tracker()
+    day_a = _days_ago(10)
+    day_b = _days_ago(5)
+    tracker.record(as_column([
+        day_b + timedelta(hours=3),
+        day_a,
+        datetime.utcnow(),
+        day_a + timedelta(hours=2),
+        day_b,
+        day_a - timedelta(hours=1),
+    ]))
+
+    assert len(tracker) == 2
+    assert tracker._chunks[day_a.date()] == (day_a - timedelta(hours=1), day_a + timedelta(hours=2))
+    assert tracker._chunks[day_b.date()] == (day_b, day_b + timedelta(hours=3))
+
+
+def test_aware_timestamps_are_converted_to_utc():
+    tracker = _tracker()
+    local = (_days_ago(10) + timedelta(hours=3)).replace(tzinfo=timezone(timedelta(hours=-3)))
+
+    tracker.record([local])
+
+    utc = local.astimezone(timezone.utc).replace(tzinfo=None)
+    assert tracker._chunks[utc.date()] == (utc, utc)
+
+
+def test_drain_merges_contiguous_days():
+    tracker = _tracker()
+    tracker.record([_days_ago(12), _days_ago(11, hour=20), _days_ago(9)])
+
+    windows = tracker.drain()
+
+    assert windows == [(_days_ago(12), _days_ago(11, hour=20)), (_days_ago(9), _days_ago(9))]
+    assert len(tracker) == 0
+
+
+def test_restore_splits_windows_back_into_days():
+    tracker = _tracker()
+    start, end = _days_ago(12), _days_ago(11, hour=20)
+
+    tracker.restore([(start, end)])
+
+    assert len(tracker) == 2
+    assert tracker.drain() == [(start, end)]
+
+
+def test_refresh_plan_skips_windows_covered_by_policies():
+    tracker = _tracker()
+    recent = _days_ago(5)
+
+    plan = _refresh_plan(tracker, [(recent, recent + timedelta(minutes=30))])
+
+    # Fora da política horária (3 dias), dentro da diária (7 dias)
+    assert plan == [(CAGG_HOURLY, recent, recent + timedelta(hours=1))]
+
+
+def test_refresh_plan_aligns_to_buckets():
+    tracker = _tracker()
+    start = _days_ago(10) + timedelta(minutes=15)
+    end = _days_ago(9) + timedelta(minutes=45)
+
+    plan = _refresh_plan(tracker, [(start, end)])
+
+    assert plan == [
+        (CAGG_HOURLY, _days_ago(10), _days_ago(9) + timedelta(hours=1)),
+        (CAGG_DAILY, _days_ago(10, hour=0), _days_ago(8, hour=0)),
+    ]
+
+
+def test_refresh_plan_is_clamped_to_retention():
+    tracker = _tracker(retention=timedelta(days=30))
+    expired = _days_ago(40)
+    straddling = _days_ago(31)
+
+    assert _refresh_plan(tracker, [(expired, expired + timedelta(hours=1))]) == []
+
+    plan = _refresh_plan(tracker, [(straddling, _days_ago(28))])
+    oldest = datetime.utcnow() - timedelta(days=30)
+    for cagg, first, last in plan:
+        assert first >= oldest
+        assert last == (_days_ago(28) + timedelta(hours=1) if cagg == CAGG_HOURLY else _days_ago(27, hour=0))
@@ -0,0 +1,80 @@
+import os
+import tempfile
+
+from app.storage.local_cache import ClaimCheckCache
+
+
+def _cache(max_bytes=1000):
+    return ClaimCheckCache(tempfile.mkdtemp(), max_bytes)
+
+
+def _read(cache, file_path, etag):
+    mapped = cache.get(file_path, etag)
+    if mapped is None:
+        return None
+    try:
+        return bytes(mapped)
+    finally:
+        mapped.close()
+
+
+def _files(cache):
+    return sorted(path for path, _, _ in cache._entries())
+
+
+def test_overwriting_a_key_does_not_double_count_its_size():
+    cache = _cache()
+    cache.put("claim.json.gz", "etag-1", b"x" * 100)
+    cache.put("claim.json.gz", "etag-1", b"y" * 60)
+
+    assert cache._total_bytes == 60
+    assert _read(cache, "claim.json.gz", "etag-1") == b"y" * 60
+
+
+def test_new_etag_replaces_older_versions_of_the_path():
+    cache = _cache()
+    cache.put("claim.json.gz", "etag-1", b"x" * 100)
+    cache.put("other.json.gz", "etag-1", b"z" * 10)
+    cache.put("claim.json.gz", "etag-2", b"y" * 50)
+
+    assert _read(cache, "claim.json.gz", "etag-1") is None
+    assert _read(cache, "claim.json.gz", "etag-2") == b"y" * 50
+    assert _read(cache, "other.json.gz", "etag-1") == b"z" * 10
+    assert len(_files(cache)) == 2
+    assert cache._total_bytes == 60
+
+
+def test_eviction_removes_least_recently_used_entries():
+    cache = _cache(max_bytes=250)
+    for index in range(3):
+        cache.put(f"claim-{index}.json.gz", "etag", b"x" * 100)
+        path = cache._path(f"claim-{index}.json.gz", "etag")
+        os.utime(path, (index, index))
+
+    assert _read(cache, "claim-0.json.gz", "etag") is None
+    assert cache.contains("claim-2.json.gz")
+    assert cache._total_bytes <= 250
+
+
+def test_writer_over_the_limit_is_discarded():
+    cache = _cache(max_bytes=100)
+    writer = cache.writer("claim.json.gz", "etag")
+    writer.write(b"x" * 60)
+    writer.write(b"x" * 60)
+    writer.commit()
+
+    assert not cache.contains("claim.json.gz")
+    assert cache._total_bytes == 0
+    assert os.listdir(os.path.dirname(cache._path("claim.json.gz", "etag"))) == []
+
+
+def test_writer_publishes_parts_on_commit():
+    cache = _cache()
+    writer = cache.writer("claim.json.gz", "etag")
+    writer.write(b"[1,")
+    assert not cache.contains("claim.json.gz")
+    writer.write(b"2]")
+    writer.commit()
+
+    assert _read(cache, "claim.json.gz", "etag") == b"[1,2]"
+    assert cache._total_bytes == 5
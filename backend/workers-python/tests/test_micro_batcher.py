@@ -0,0 +1,98 @@
+import asyncio
+
+from app.consumers.micro_batcher import MicroBatcher
+
+
+SCOPE = (1, 2, 3)
+
+
+def _ctx(offset):
+    return {'offset': offset}
+
+
+def _offsets(entries):
+    return [ctx['offset'] for ctx, _ in entries]
+
+
+def test_flushes_scope_when_max_items_is_reached():
+    flushed = []
+
+    async def handler(scope, entries):
+        flushed.append((scope, _offsets(entries)))
+
+    async def run():
+        batcher = MicroBatcher(handler, max_items=3, max_wait_ms=60000)
+        await batcher.add(SCOPE, _ctx(0), [{}, {}])
+        assert flushed == []
+        await batcher.add(SCOPE, _ctx(1), [{}])
+        assert batcher.pending_messages == 0
+
+    asyncio.run(run())
+    assert flushed == [(SCOPE, [0, 1])]
+
+
+def test_stop_waits_for_the_flush_in_progress():
+    flushed = []
+    started = None
+
+    async def handler(scope, entries):
+        started.set()
+        await asyncio.sleep(0.2)
+        flushed.append(_offsets(entries))
+
+    async def run():
+        nonlocal started
+        started = asyncio.Event()
+        batcher = MicroBatcher(handler, max_items=100, max_wait_ms=50)
+        batcher.start()
+        await batcher.add(SCOPE, _ctx(0), [{}])
+        await started.wait()
+        await batcher.add(SCOPE, _ctx(1), [{}])
+        await batcher.stop()
+        assert batcher.pending_messages == 0
+
+    asyncio.run(run())
+    assert flushed == [[0], [1]]
+
+
+def test_failed_flush_returns_entries_to_the_buffer():
+    calls = []
+
+    async def handler(scope, entries):
+        calls.append(_offsets(entries))
+        if len(calls) == 1:
+            raise ConnectionError("db down")
+
+    async def run():
+        batcher = MicroBatcher(handler, max_items=2, max_wait_ms=60000)
+        await batcher.add(SCOPE, _ctx(0), [{}])
+        await batcher.add(SCOPE, _ctx(1), [{}])
+        assert batcher.pending_messages == 2
+
+        await batcher.add(SCOPE, _ctx(2), [{}])
+        assert batcher.pending_messages == 0
+
+    asyncio.run(run())
+    assert calls == [[0, 1], [0, 1, 2]]
+
+
+def test_cancelled_flush_returns_entries_to_the_buffer():
+    async def handler(scope, entries):
+        await asyncio.sleep(10)
+
+    async def run():
+        batcher = MicroBatcher(handler, max_items=100, max_wait_ms=60000)
+        await batcher.add(SCOPE, _ctx(0), [{}])
+        task = asyncio.create_task(batcher.flush(SCOPE))
+        await asyncio.sleep(0)
+        await batcher.add(SCOPE, _ctx(1), [{}])
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return batcher._buffers[SCOPE]
+
+    buffer = asyncio.run(run())
+    assert _offsets(buffer["entries"]) == [0, 1]
+    assert buffer["items"] == 2
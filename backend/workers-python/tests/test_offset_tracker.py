@@ -0,0 +1,95 @@
+from kafka import TopicPartition
+
+from app.consumers.offset_tracker import OffsetTracker
+
+
+TP = TopicPartition("telemetry", 0)
+
+
+def _track(tracker, offsets, tp=TP):
+    generation = None
+    for offset in offsets:
+        generation = tracker.track(tp, offset)
+    return generation
+
+
+def _committed(tracker):
+    return {tp: meta.offset for tp, meta in tracker.committable().items()}
+
+
+def test_out_of_order_completion_commits_only_contiguous_prefix():
+    tracker = OffsetTracker()
+    generation = _track(tracker, [10, 11, 12, 13])
+
+    tracker.mark_done(TP, 12, generation)
+    tracker.mark_done(TP, 11, generation)
+    assert _committed(tracker) == {}
+
+    tracker.mark_done(TP, 10, generation)
+    assert _committed(tracker) == {TP: 13}
+    assert tracker.pending_count == 1
+
+    tracker.mark_done(TP, 13, generation)
+    assert _committed(tracker) == {TP: 14}
+    assert tracker.pending_count == 0
+
+
+def test_gap_holds_commit_of_its_partition_only():
+    other = TopicPartition("telemetry", 1)
+    tracker = OffsetTracker()
+    generation = _track(tracker, [0, 1, 2])
+    other_generation = _track(tracker, [5, 6], other)
+
+    tracker.mark_done(TP, 1, generation)
+    tracker.mark_done(TP, 2, generation)
+    tracker.mark_done(other, 5, other_generation)
+    tracker.mark_done(other, 6, other_generation)
+
+    assert _committed(tracker) == {other: 7}
+    assert tracker.done_since_commit == 0
+
+    tracker.mark_done(TP, 0, generation)
+    assert tracker.done_since_commit == 1
+    assert _committed(tracker) == {TP: 3}
+
+
+def test_mark_done_after_revoke_is_ignored():
+    tracker = OffsetTracker()
+    generation = _track(tracker, [0, 1])
+    tracker.forget([TP])
+
+    tracker.mark_done(TP, 0, generation)
+
+    assert tracker.generation(TP) is None
+    assert tracker.done_since_commit == 0
+    assert _committed(tracker) == {}
+
+
+def test_late_completion_from_previous_assignment_after_reassign():
+    tracker = OffsetTracker()
+    old_generation = _track(tracker, [0, 1, 2])
+    tracker.mark_done(TP, 0, old_generation)
+    assert _committed(tracker) == {TP: 1}
+
+    # Rebalance: 1 e 2 ainda estavam em processamento e são reentregues
+    tracker.forget([TP])
+    new_generation = _track(tracker, [1, 2])
+    assert new_generation != old_generation
+
+    tracker.mark_done(TP, 1, old_generation)
+    tracker.mark_done(TP, 2, old_generation)
+    assert _committed(tracker) == {}
+    assert tracker.pending_count == 2
+
+    tracker.mark_done(TP, 2, new_generation)
+    tracker.mark_done(TP, 1, new_generation)
+    assert _committed(tracker) == {TP: 3}
+
+
+def test_completion_without_partition_is_ignored():
+    tracker = OffsetTracker()
+    _track(tracker, [0])
+
+    tracker.mark_done(None, 0, None)
+
+    assert tracker.done_since_commit == 0
@@ -0,0 +1,98 @@
+import asyncio
+import gzip
+from types import SimpleNamespace
+
+from app.consumers import retry_store
+from app.core.config import settings
+
+
+class FakeSession:
+    """Sessão que só registra os parâmetros executados."""
+
+    def __init__(self, rows=()):
+        self.executed = []
+        self.commits = 0
+        self.rows = rows
+
+    async def execute(self, statement, params=None):
+        self.executed.append(params)
+        return SimpleNamespace(fetchall=lambda: list(self.rows))
+
+    async def commit(self):
+        self.commits += 1
+
+
+def _ctx():
+    return {
+        'topic': 'telemetry',
+        'partition': 0,
+        'offset': 42,
+        'key': b'key',
+        'value': {'file_path': 'claim.json.gz'},
+        'claim_check': 'claim.json.gz',
+        'tenant_id': '',
+    }
+
+
+def test_permanent_errors():
+    assert retry_store.is_permanent_error(FileNotFoundError("claim.json.gz"))
+    assert retry_store.is_permanent_error(gzip.BadGzipFile("corrupted"))
+    assert retry_store.is_permanent_error(ValueError("invalid payload"))
+    assert not retry_store.is_permanent_error(ConnectionError("db down"))
+    assert not retry_store.is_permanent_error(TimeoutError())
+
+
+def test_backoff_doubles_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(settings, "RETRY_DELAY", 5)
+    monkeypatch.setattr(settings, "RETRY_MAX_DELAY", 60)
+
+    delays = [retry_store.backoff_seconds(attempts) for attempts in range(1, 7)]
+
+    assert delays == [5, 10, 20, 40, 60, 60]
+
+
+def test_first_failure_is_scheduled_for_retry(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_RETRIES", 3)
+    db = FakeSession()
+
+    status = asyncio.run(retry_store.schedule_retry(db, _ctx(), ConnectionError("db down")))
+
+    assert status == retry_store.STATUS_RETRY
+    params = db.executed[0]
+    assert params['status'] == retry_store.STATUS_RETRY
+    assert params['error_type'] == 'ConnectionError'
+    assert params['tenant_id'] is None
+    assert params['delay'] == float(retry_store.backoff_seconds(1))
+    assert db.commits == 1
+
+
+def test_permanent_first_failure_goes_straight_to_dlq(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_RETRIES", 3)
+    db = FakeSession()
+
+    status = asyncio.run(retry_store.schedule_retry(db, _ctx(), FileNotFoundError("claim.json.gz")))
+
+    assert status == retry_store.STATUS_DEAD
+
+
+def test_failure_dead_letters_after_max_retries(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_RETRIES", 3)
+    db = FakeSession()
+
+    status = asyncio.run(retry_store.record_failure(db, {'id': 7, 'attempts': 1}, ConnectionError()))
+    assert status == retry_store.STATUS_RETRY
+    assert db.executed[-1]['attempts'] == 2
+    assert db.executed[-1]['delay'] == float(retry_store.backoff_seconds(2))
+
+    status = asyncio.run(retry_store.record_failure(db, {'id': 7, 'attempts': 2}, ConnectionError()))
+    assert status == retry_store.STATUS_DEAD
+    assert db.executed[-1]['status'] == retry_store.STATUS_DEAD
+
+
+def test_redrive_counts_requeued_entries():
+    db = FakeSession(rows=[(1,), (2,)])
+
+    count = asyncio.run(retry_store.redrive(db, ids=[1, 2], error_type='ConnectionError'))
+
+    assert count == 2
+    assert db.executed[0] == {'ids': [1, 2], 'error_type': 'ConnectionError'}
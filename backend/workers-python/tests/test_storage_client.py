@@ -0,0 +1,154 @@
+import asyncio
+import gzip
+import io
+import json
+import os
+import tempfile
+from types import SimpleNamespace
+
+from app.consumers.kafka_consumer import TelemetryKafkaConsumer
+from app.core.config import settings
+from app.storage.local_cache import ClaimCheckCache
+from app.storage.storage_client import StorageClient
+
+
+class FakeObjectStore:
+    """Bucket em memória com a interface do SDK do MinIO usada pelo StorageClient."""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.ranges = []
+        self.stats = 0
+
+    def stat_object(self, bucket, path):
+        self.stats += 1
+        return SimpleNamespace(size=len(self.objects[path]), etag="etag")
+
+    def get_object(self, bucket, path, offset=0, length=None):
+        data = self.objects[path]
+        if length is not None:
+            self.ranges.append((offset, length))
+            data = data[offset:offset + length]
+        response = io.BytesIO(data)
+        response.headers = {"ETag": '"etag"'}
+        response.release_conn = lambda: None
+        return response
+
+
+def _large_claim_check():
+    items = [
+        {"equip_uuid": f"equip-{index}", "sensor": [{"sensor_uuid": os.urandom(64).hex()}]}
+        for index in range(60000)
+    ]
+    return items, gzip.compress(json.dumps(items).encode())
+
+
+def test_large_claim_check_streams_through_ranged_gets(monkeypatch):
+    monkeypatch.setattr(settings, "STORAGE_STREAMING_ENABLED", True)
+    items, compressed = _large_claim_check()
+    assert len(compressed) >= settings.STORAGE_STREAMING_MIN_BYTES
+    assert len(compressed) >= settings.STORAGE_RANGED_GET_MIN_BYTES
+
+    ctx = {"is_claim_check": True, "file_size": len(compressed)}
+    assert TelemetryKafkaConsumer._use_streaming(ctx)
+
+    client = StorageClient()
+    store = FakeObjectStore({"claim.json.gz": compressed})
+    client.client = store
+
+    async def read_all():
+        received = []
+        async for chunk in client.iter_payload_chunks(
+            "claim.json.gz",
+            settings.STORAGE_STREAM_CHUNK_ITEMS,
+            ctx["file_size"],
+        ):
+            received.extend(chunk)
+        return received
+
+    try:
+        received = asyncio.run(read_all())
+    finally:
+        client.close()
+
+    assert received == items
+    part_size = settings.STORAGE_RANGED_GET_PART_SIZE
+    assert len(store.ranges) == (len(compressed) + part_size - 1) // part_size
+    assert sorted(store.ranges)[0] == (0, part_size)
+
+
+def test_cache_only_stats_objects_already_cached():
+    items = [{"equip_uuid": "equip-1", "sensor": []}]
+    client = StorageClient()
+    store = FakeObjectStore({"claim.json.gz": gzip.compress(json.dumps(items).encode())})
+    client.client = store
+    client.cache = ClaimCheckCache(tempfile.mkdtemp(), 1024 * 1024)
+
+    async def download_twice():
+        first = await client.download_file("claim.json.gz", 100)
+        stats_after_first = store.stats
+        second = await client.download_file("claim.json.gz", 100)
+        return first, stats_after_first, second
+
+    try:
+        first, stats_after_first, second = asyncio.run(download_twice())
+    finally:
+        client.close()
+
+    # Primeiro download: ETag vem do GET, sem stat_object
+    assert stats_after_first == 0
+    # Replay: confere o ETag e lê do cache local
+    assert store.stats == 1
+    assert client.cache.hits == 1
+    assert first == second == items
+
+
+def _stream_all(client, path, size_hint):
+    async def read_all():
+        received = []
+        async for chunk in client.iter_payload_chunks(path, 2, size_hint):
+            received.extend(chunk)
+        return received
+
+    return asyncio.run(read_all())
+
+
+def test_streamed_claim_check_is_cached_for_replays():
+    items = [{"equip_uuid": f"equip-{index}", "sensor": []} for index in range(5)]
+    client = StorageClient()
+    store = FakeObjectStore({"claim.json.gz": gzip.compress(json.dumps(items).encode())})
+    client.client = store
+    client.cache = ClaimCheckCache(tempfile.mkdtemp(), 1024 * 1024)
+
+    try:
+        first = _stream_all(client, "claim.json.gz", 100)
+        store.objects["claim.json.gz"] = b"not downloaded again"
+        second = _stream_all(client, "claim.json.gz", 100)
+    finally:
+        client.close()
+
+    assert first == second == items
+    assert client.cache.hits == 1
+    assert store.stats == 1
+
+
+def test_interrupted_stream_is_not_cached():
+    items = [{"equip_uuid": f"equip-{index}", "sensor": []} for index in range(5)]
+    client = StorageClient()
+    store = FakeObjectStore({"claim.json.gz": gzip.compress(json.dumps(items).encode())})
+    client.client = store
+    client.cache = ClaimCheckCache(tempfile.mkdtemp(), 1024 * 1024)
+
+    async def read_first_chunk():
+        chunks = client.iter_payload_chunks("claim.json.gz", 2, 100)
+        first = await chunks.__anext__()
+        await chunks.aclose()
+        return first
+
+    try:
+        asyncio.run(read_first_chunk())
+    finally:
+        client.close()
+
+    assert not client.cache.contains("claim.json.gz")
+    assert client.cache._total_bytes == 0
@@ -0,0 +1,87 @@
+from app.consumers import supervisor as supervisor_module
+from app.consumers.supervisor import WorkerSupervisor
+
+
+class FakeProcess:
+    def __init__(self, pid, alive=True):
+        self.pid = pid
+        self.alive = alive
+        self.exitcode = None if alive else 1
+
+    def is_alive(self):
+        return self.alive
+
+    def kill(self):
+        self.alive = False
+        self.exitcode = -9
+
+    def join(self, timeout=None):
+        pass
+
+
+class RecordingLogger:
+    def __init__(self):
+        self.messages = []
+
+    def _record(self, message, **kwargs):
+        self.messages.append(message)
+
+    info = warn = error = _record
+
+
+def _supervisor(monkeypatch, clock):
+    logger = RecordingLogger()
+    monkeypatch.setattr(supervisor_module, "logger", logger)
+    monkeypatch.setattr(supervisor_module.time, "time", lambda: clock[0])
+    supervisor = WorkerSupervisor(processes=1)
+    started = []
+
+    def start_child(index):
+        process = FakeProcess(pid=100 + len(started))
+        started.append(process)
+        supervisor.children[index] = process
+        supervisor.last_heartbeat[index] = clock[0]
+        supervisor.last_start[index] = clock[0]
+
+    monkeypatch.setattr(supervisor, "_start_child", start_child)
+    supervisor._start_child(0)
+    return supervisor, logger, started
+
+
+def test_dead_child_is_reported_once_during_restart_backoff(monkeypatch):
+    clock = [1000.0]
+    supervisor, logger, started = _supervisor(monkeypatch, clock)
+    started[0].alive = False
+
+    for _ in range(supervisor_module.RESTART_BACKOFF_SECONDS - 1):
+        clock[0] += 1
+        supervisor._check_children()
+
+    assert logger.messages.count("Consumidor encerrado inesperadamente") == 1
+    assert len(started) == 1
+
+    clock[0] += supervisor_module.RESTART_BACKOFF_SECONDS
+    supervisor._check_children()
+    assert len(started) == 2
+    assert supervisor.restarts == 1
+
+    # O novo filho também é reportado ao morrer
+    started[1].alive = False
+    clock[0] += 1
+    supervisor._check_children()
+    assert logger.messages.count("Consumidor encerrado inesperadamente") == 2
+
+
+def test_child_killed_for_missing_heartbeat_is_not_reported_as_crash(monkeypatch):
+    clock = [1000.0]
+    supervisor, logger, started = _supervisor(monkeypatch, clock)
+    monkeypatch.setattr(supervisor_module.settings, "WORKER_HEARTBEAT_TIMEOUT", 2)
+
+    clock[0] += 3
+    supervisor._check_children()
+    clock[0] += 1
+    supervisor._check_children()
+
+    assert logger.messages.count("Consumidor sem heartbeat, reiniciando") == 1
+    assert "Consumidor encerrado inesperadamente" not in logger.messages
+    assert len(started) == 1
@@ -0,0 +1,145 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.core.config import settings
+from app.processors.telemetry_processor import TelemetryProcessor
+from app.sinks import NullSink, PostgresSink
+from app.sinks.base import TelemetrySink
+
+
+class FakeSession:
+    """Sessão que registra commits/rollbacks e SAVEPOINTs."""
+
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+        self.savepoints = 0
+        self.savepoint_rollbacks = 0
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        self.savepoints += 1
+        try:
+            yield
+        except Exception:
+            self.savepoint_rollbacks += 1
+            raise
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+class RecordingSink(TelemetrySink):
+    """Sink transacional em memória; falha nos registros marcados com 'bad'."""
+
+    name = "recording"
+    transactional = True
+
+    def __init__(self):
+        self.writes = []
+
+    async def write(self, db, records):
+        if any(record.get("bad") for record in records):
+            raise ValueError("invalid reading\nDETAIL: ...")
+        self.writes.append(list(records))
+        # Leituras já existentes: ON CONFLICT DO NOTHING não as conta
+        return sum(1 for record in records if not record.get("duplicate"))
+
+
+def _written(*groups):
+    return [(f"equip-{index}", records, len(records)) for index, records in enumerate(groups)]
+
+
+def test_transactional_shadow_is_committed_after_primary():
+    shadow = RecordingSink()
+    processor = TelemetryProcessor(sink=NullSink(), shadow_sink=shadow)
+    db = FakeSession()
+
+    asyncio.run(processor._write_shadow(_written([{"value": 1}], [{"value": 2}]), db))
+
+    assert shadow.writes == [[{"value": 1}], [{"value": 2}]]
+    assert db.savepoints == 2
+    assert db.commits == 1
+
+
+def test_shadow_failure_is_isolated_to_its_equipment():
+    shadow = RecordingSink()
+    processor = TelemetryProcessor(sink=NullSink(), shadow_sink=shadow)
+    db = FakeSession()
+
+    asyncio.run(processor._write_shadow(_written([{"bad": True}], [{"value": 2}]), db))
+
+    assert shadow.writes == [[{"value": 2}]]
+    assert db.savepoint_rollbacks == 1
+    assert db.commits == 1
+
+
+def test_non_transactional_shadow_does_not_touch_the_session():
+    shadow = NullSink()
+    processor = TelemetryProcessor(sink=RecordingSink(), shadow_sink=shadow)
+    db = FakeSession()
+
+    asyncio.run(processor._write_shadow(_written([{"value": 1}]), db))
+
+    assert shadow.records == 1
+    assert db.savepoints == 0
+    assert db.commits == 0
+
+
+def test_shadow_equal_to_primary_is_rejected():
+    with pytest.raises(ValueError):
+        TelemetryProcessor(sink=PostgresSink(), shadow_sink=PostgresSink())
+
+
+def _records(*flags):
+    return [{"sensor_id": index, "timestamp": index, **flag} for index, flag in enumerate(flags)]
+
+
+def test_bisect_isolates_bad_readings_and_counts_inserted_rows():
+    sink = RecordingSink()
+    processor = TelemetryProcessor(sink=sink)
+    records = _records({}, {"bad": True}, {"duplicate": True}, {}, {}, {"bad": True}, {})
+    errors = []
+
+    good, inserted = asyncio.run(processor._recover_failed_write(
+        FakeSession(), "equip-1", records, ValueError("batch failed"), errors,
+    ))
+
+    assert [record["sensor_id"] for record in good] == [0, 2, 3, 4, 6]
+    assert inserted == 4
+    assert len(errors) == 2
+    assert errors[0].endswith("invalid reading")
+    assert "sensor_id=1" in errors[0]
+
+
+def test_bisect_gives_up_after_too_many_failures(monkeypatch):
+    monkeypatch.setattr(settings, "TELEMETRY_BISECT_MAX_FAILED", 2)
+    processor = TelemetryProcessor(sink=RecordingSink())
+    records = _records({"bad": True}, {"bad": True}, {}, {"bad": True})
+    errors = []
+
+    recovered = asyncio.run(processor._recover_failed_write(
+        FakeSession(), "equip-1", records, ValueError("batch failed"), errors,
+    ))
+
+    assert recovered is None
+    assert errors == ["Erro ao inserir telemetria para equip-1: batch failed"]
+
+
+def test_payload_commit_reports_rows_inserted_after_bisect():
+    processor = TelemetryProcessor(sink=RecordingSink())
+    equipment_map = {
+        "equip-1": {"telemetry_data": _records({}, {"bad": True}, {"duplicate": True})},
+        "equip-2": {"telemetry_data": _records({}, {})},
+    }
+    db = FakeSession()
+
+    written = asyncio.run(processor._write_payload(equipment_map, db, []))
+
+    assert [(equip_uuid, count) for equip_uuid, _, count in written] == [("equip-1", 1), ("equip-2", 2)]
+    assert db.commits == 1